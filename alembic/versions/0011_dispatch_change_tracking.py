@@ -0,0 +1,32 @@
+"""updated_at change tracking for incremental dispatch snapshots
+
+Revision ID: 0011_dispatch_change_tracking
+Revises: 0010_building_cache
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011_dispatch_change_tracking"
+down_revision = "0010_building_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False))
+    op.add_column("delivery_tasks", sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False))
+
+    # Delta queries in the worker snapshot store: WHERE updated_at > :watermark
+    op.create_index("ix_drivers_updated_at", "drivers", ["updated_at"], unique=False)
+    op.create_index("ix_orders_updated_at", "orders", ["updated_at"], unique=False)
+    op.create_index("ix_delivery_tasks_updated_at", "delivery_tasks", ["updated_at"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_delivery_tasks_updated_at", table_name="delivery_tasks")
+    op.drop_index("ix_orders_updated_at", table_name="orders")
+    op.drop_index("ix_drivers_updated_at", table_name="drivers")
+    op.drop_column("delivery_tasks", "updated_at")
+    op.drop_column("orders", "updated_at")
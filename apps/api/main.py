@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -8,6 +9,14 @@ from apps.api.middleware.rate_limit import RateLimitMiddleware
 from apps.api.routers import health, orders, dossier, tasks, drivers, internal_expire
 from apps.api.routers import profile, vehicles, merchant, stores, customers
 from apps.api.routers import support, admin, auth, onboarding, buildings
+from packages.router.osrm_async import close_shared_async_osrm
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_shared_async_osrm()
+
 
 app = FastAPI(
     title="CloudRun Marketplace API",
@@ -15,6 +24,7 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -1,8 +1,11 @@
 from __future__ import annotations
+import time
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from packages.db.session import get_db
 from packages.db.models import Driver, DeliveryTask, Order, Store, CustomerAddress
+from packages.dispatch.snapshot import _driver_dict
+from packages.geo.h3_index import shared_driver_index
 
 router = APIRouter(prefix="/v1", tags=["drivers"])
 
@@ -23,6 +26,12 @@ def upsert_driver(driver_id: str, body: dict, db: Session = Depends(get_db)):
     d.metrics_json = body.get("metrics", d.metrics_json) or {}
     db.add(d)
     db.commit()
+    # Keep this process's spatial index current without waiting for the next snapshot delta.
+    row = _driver_dict(d, now_ms=int(time.time() * 1000))
+    if row is None:
+        shared_driver_index().remove(d.id)
+    else:
+        shared_driver_index().upsert(row)
     return {"driver_id": d.id}
 
 @router.get("/drivers")
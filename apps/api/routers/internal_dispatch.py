@@ -1,14 +1,29 @@
 from __future__ import annotations
 import os
+import threading
 from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.orm import Session
 
 from packages.db.session import get_db
-from packages.dispatch.snapshot import build_dispatch_snapshot
+from packages.dispatch.snapshot_store import SnapshotStore
 from packages.dispatch.loops import run_fast_tick
 
 router = APIRouter(prefix="/internal", tags=["internal"])
 
+# One long-lived snapshot per region; driver pings handled by this process
+# reach the shared spatial index before the next delta refresh.  The sync
+# endpoint runs in the threadpool, so each region's refresh + tick holds
+# that region's lock.
+_snapshots: dict[str, tuple[SnapshotStore, threading.Lock]] = {}
+_snapshots_lock = threading.Lock()
+
+def _region_store(region_id: str) -> tuple[SnapshotStore, threading.Lock]:
+    with _snapshots_lock:
+        entry = _snapshots.get(region_id)
+        if entry is None:
+            entry = _snapshots[region_id] = (SnapshotStore(region_id=region_id), threading.Lock())
+        return entry
+
 def _require_token(x_internal_token: str | None) -> None:
     expected = os.getenv("INTERNAL_API_TOKEN")
     if expected and x_internal_token != expected:
@@ -21,6 +36,8 @@ def dispatch_tick(
     x_internal_token: str | None = Header(default=None, alias="X-Internal-Token"),
 ):
     _require_token(x_internal_token)
-    snap = build_dispatch_snapshot(db, region_id=region_id)
-    out = run_fast_tick(snap)
-    return {"region_id": region_id, "snapshot_counts": {"drivers": len(snap["drivers"]), "jobs": len(snap["jobs"]), "tasks": len(snap["tasks"])}, "result": out}
+    store, lock = _region_store(region_id)
+    with lock:
+        snap = store.refresh(db)
+        out = run_fast_tick(snap)
+    return {"region_id": region_id, "snapshot_counts": {"drivers": len(snap["drivers"]), "jobs": len(snap["jobs"]), "tasks": len(snap["tasks"])}, "snapshot_stats": snap.get("stats"), "result": out}
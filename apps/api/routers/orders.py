@@ -1,6 +1,8 @@
 from __future__ import annotations
+import asyncio
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from packages.db.session import get_db
@@ -11,6 +13,8 @@ from packages.dossier.writer import emit_order_event
 from packages.verification.orchestrator import verify_age_checkout, verify_id_doorstep
 from packages.payments.processor_fake import authorize as pay_authorize
 from packages.common.idempotency import get_or_set as idem_get_or_set
+from packages.router.osrm_async import shared_async_osrm
+from packages.router.store_tables import store_travel_times
 
 from apps.api.schemas import CreateOrderIn, VerifyAgeIn, AuthorizePaymentIn, DoorstepSubmitIn, DeliverConfirmIn, RefuseIn
 
@@ -331,7 +335,13 @@ def get_order(order_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/orders/{order_id}/tracking")
-def get_order_tracking(order_id: str, db: Session = Depends(get_db)):
+async def get_order_tracking(order_id: str, db: Session = Depends(get_db)):
+    view = await run_in_threadpool(_tracking_view, db, order_id)
+    await _fill_road_etas(view)
+    return view
+
+
+def _tracking_view(db: Session, order_id: str) -> dict:
     order = db.get(Order, order_id)
     if not order:
         raise HTTPException(404, "order not found")
@@ -358,6 +368,18 @@ def get_order_tracking(order_id: str, db: Session = Depends(get_db)):
                 "lng": float(driver.lng) if driver.lng else None,
             }
 
+    # Leg ETAs from the precomputed store tables (None when not covered;
+    # ``_fill_road_etas`` routes those legs).
+    eta = None
+    if store and store.lat and store.lng:
+        tables = store_travel_times()
+        slat, slng = float(store.lat), float(store.lng)
+        eta = {"driver_to_store_s": None, "store_to_drop_s": None}
+        if driver_info and driver_info["lat"] is not None and driver_info["lng"] is not None:
+            eta["driver_to_store_s"] = tables.lookup(store.id, slat, slng, driver_info["lat"], driver_info["lng"])
+        if address and address.lat and address.lng:
+            eta["store_to_drop_s"] = tables.lookup(store.id, slat, slng, float(address.lat), float(address.lng))
+
     return {
         "order_id": order.id,
         "status": order.status,
@@ -374,7 +396,29 @@ def get_order_tracking(order_id: str, db: Session = Depends(get_db)):
             "lng": float(address.lng) if address and address.lng else None,
         } if address else None,
         "driver": driver_info,
+        "eta": eta,
         "task_status": task.status if task else None,
         "total_cents": order.total_cents,
         "created_at": order.created_at.isoformat() if order.created_at else None,
     }
+
+
+async def _fill_road_etas(view: dict) -> None:
+    """Route the ETA legs the store tables missed through the shared async OSRM client."""
+    eta = view["eta"]
+    if eta is None:
+        return
+    store_pt = (view["store"]["lat"], view["store"]["lng"])
+    legs = []
+    driver = view["driver"]
+    if eta["driver_to_store_s"] is None and driver and driver["lat"] is not None and driver["lng"] is not None:
+        legs.append(("driver_to_store_s", (driver["lat"], driver["lng"]), store_pt))
+    drop = view["delivery"]
+    if eta["store_to_drop_s"] is None and drop and drop["lat"] is not None and drop["lng"] is not None:
+        legs.append(("store_to_drop_s", store_pt, (drop["lat"], drop["lng"])))
+    if not legs:
+        return
+    osrm = shared_async_osrm()
+    times = await asyncio.gather(*(osrm.route_time_latlng(a, b) for _, a, b in legs))
+    for (name, _, _), t in zip(legs, times):
+        eta[name] = t
@@ -118,6 +118,7 @@ def reject_task(task_id: str, driver_id: str, db: Session = Depends(get_db)):
     task.status = "UNASSIGNED"
     task.offered_to_driver_id = None
     task.offer_expires_at = None
+    _set_offer_outcome(db, task_id=task.id, outcome="REJECTED")
     db.add(task)
     emit_order_event(db, order_id=task.order_id, actor_type="driver", actor_id=driver_id, event_type="TASK_REJECTED", payload={"task_id": task.id})
     db.commit()
@@ -1,25 +1,78 @@
 import os
 import logging
+import threading
 from celery import Celery
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import worker_init
 
 from packages.db.session import SessionLocal
 from packages.dispatch.snapshot import build_dispatch_snapshot
+from packages.dispatch.snapshot_store import SnapshotStore
 from packages.dispatch.loops import run_fast_tick
 from packages.dispatch.expire import expire_offers
-from packages.dispatch.batch_loop import run_batch_tick
+from packages.dispatch.batch_loop import BATCH_WORKERS, run_batch_tick
+from packages.dispatch.eta import route_cache_stats
+from packages.router.store_tables import build_store_tables, tables_stale
+from packages.router.speed_model import learn_speed_profiles
+from packages.predictions.acceptance_model import train_acceptance_model
 
 logger = logging.getLogger(__name__)
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 celery = Celery("vape_mvp", broker=REDIS_URL, backend=REDIS_URL)
 
+# FAST-loop snapshot source: INCREMENTAL keeps a per-process SnapshotStore
+# that applies deltas between ticks; FULL rebuilds from Postgres every tick.
+SNAPSHOT_MODE = os.getenv("DISPATCH_SNAPSHOT_MODE", "INCREMENTAL").upper()
+# BATCH ticks go to their own queue so a --pool threads/solo worker can run
+# them: DISPATCH_BATCH_WORKERS solver processes cannot start under prefork.
+BATCH_QUEUE = os.getenv("DISPATCH_BATCH_QUEUE", "batch")
+DISPATCH_TICK_S = float(os.getenv("DISPATCH_TICK_S", "3.0"))
+STORE_TT_REFRESH_S = float(os.getenv("STORE_TT_REFRESH_S", "3600"))
+# How often the worker checks whether the store tables need a rebuild
+# (age, or a new hour-of-week bucket for haversine-built tables).
+STORE_TT_CHECK_S = float(os.getenv("STORE_TT_CHECK_S", "60"))
+SPEED_PROFILE_REFRESH_S = float(os.getenv("SPEED_PROFILE_REFRESH_S", "86400"))
+ACCEPTANCE_TRAIN_S = float(os.getenv("ACCEPTANCE_TRAIN_S", "86400"))
+_fast_snapshots = SnapshotStore(
+    region_id="tx-dfw",
+    reconcile_s=float(os.getenv("DISPATCH_RECONCILE_S", "60")),
+)
+# Threaded / gevent pools (and an overrunning tick meeting the next beat)
+# can run two dispatch_ticks in one process: refresh + tick hold this lock,
+# like the internal API's per-region stores.
+_fast_snapshots_lock = threading.Lock()
+
+celery.conf.task_routes = {
+    "apps.worker.celery_app.dispatch_batch_tick": {"queue": BATCH_QUEUE},
+}
+
+
+@worker_init.connect
+def _warn_batch_workers_ignored(sender=None, **_):
+    """Say so at start-up when DISPATCH_BATCH_WORKERS > 1 cannot take effect.
+
+    Prefork children are daemonic and may not start the solver pool, so a
+    prefork worker consuming the BATCH queue solves every cluster inline.
+    """
+    if BATCH_WORKERS <= 1 or BATCH_QUEUE not in sender.app.amqp.queues.consume_from:
+        return
+    if issubclass(get_implementation(sender.pool_cls), PreforkPool):
+        logger.warning(
+            "DISPATCH_BATCH_WORKERS=%d is ignored: queue %r runs on a prefork pool; "
+            "start its worker with --pool threads or --pool solo (make batch-worker)",
+            BATCH_WORKERS, BATCH_QUEUE,
+        )
+
+
 # ---------------------------------------------------------------------------
 # Periodic beat schedule
 # ---------------------------------------------------------------------------
 celery.conf.beat_schedule = {
     "dispatch_tick": {
         "task": "apps.worker.celery_app.dispatch_tick",
-        "schedule": 3.0,
+        "schedule": DISPATCH_TICK_S,
     },
     "expire_stale_offers": {
         "task": "apps.worker.celery_app.expire_stale_offers",
@@ -29,6 +82,18 @@ celery.conf.beat_schedule = {
         "task": "apps.worker.celery_app.dispatch_batch_tick",
         "schedule": 30.0,
     },
+    "refresh_store_travel_tables": {
+        "task": "apps.worker.celery_app.refresh_store_travel_tables",
+        "schedule": STORE_TT_CHECK_S,
+    },
+    "refresh_speed_profiles": {
+        "task": "apps.worker.celery_app.refresh_speed_profiles",
+        "schedule": SPEED_PROFILE_REFRESH_S,
+    },
+    "train_acceptance_model": {
+        "task": "apps.worker.celery_app.train_acceptance_model_task",
+        "schedule": ACCEPTANCE_TRAIN_S,
+    },
 }
 
 
@@ -39,20 +104,28 @@ def ping():
 
 @celery.task(bind=True, max_retries=2, default_retry_delay=5)
 def dispatch_tick(self):
-    """FAST dispatch loop -- runs every ~3 s.
+    """FAST dispatch loop -- runs every ~3 s (``DISPATCH_TICK_S``).
 
-    Builds a DB snapshot for the default region and runs the min-cost-flow
-    matching pipeline (candidate generation -> ETA refinement -> cost
-    scoring -> MCF solver -> offer creation).
+    Refreshes the DB snapshot for the default region and runs the
+    min-cost-flow matching pipeline (candidate generation -> ETA refinement
+    -> cost scoring -> MCF solver -> offer creation).
     """
     db = SessionLocal()
     try:
-        snapshot = build_dispatch_snapshot(db, region_id="tx-dfw")
-        result = run_fast_tick(snapshot)
+        with _fast_snapshots_lock:
+            if SNAPSHOT_MODE == "FULL":
+                snapshot = build_dispatch_snapshot(db, region_id="tx-dfw")
+            else:
+                snapshot = _fast_snapshots.refresh(db)
+            logger.info("dispatch_tick snapshot: %s", snapshot.get("stats"))
+            result = run_fast_tick(snapshot)
         logger.info("dispatch_tick completed: %s", result)
+        logger.info("dispatch_tick route cache: %s", route_cache_stats())
         return result
     except Exception as exc:
         logger.exception("dispatch_tick failed")
+        with _fast_snapshots_lock:
+            _fast_snapshots.invalidate()
         raise self.retry(exc=exc)
     finally:
         db.close()
@@ -99,3 +172,64 @@ def dispatch_batch_tick(self):
         raise self.retry(exc=exc)
     finally:
         db.close()
+
+
+@celery.task(bind=True, max_retries=1, default_retry_delay=60)
+def refresh_store_travel_tables(self):
+    """Rebuild the store -> area travel-time tables when they are stale.
+
+    Runs every ``STORE_TT_CHECK_S``; rebuilds once the tables are older
+    than ``STORE_TT_REFRESH_S`` or, for haversine-built tables, the
+    hour-of-week speed bucket has changed.  Writes a new memory-mapped
+    version to ``STORE_TT_DIR`` and swaps the pointer; API and worker
+    readers pick it up on their next check.
+    """
+    if not tables_stale(max_age_s=STORE_TT_REFRESH_S):
+        return {"skipped": True}
+    db = SessionLocal()
+    try:
+        result = build_store_tables(db)
+        logger.info("refresh_store_travel_tables completed: %s", result)
+        return result
+    except Exception as exc:
+        logger.exception("refresh_store_travel_tables failed")
+        raise self.retry(exc=exc)
+    finally:
+        db.close()
+
+
+@celery.task(bind=True, max_retries=1, default_retry_delay=300)
+def refresh_speed_profiles(self):
+    """Re-learn zone x hour-of-week speeds from completed deliveries.
+
+    Writes ``SPEED_PROFILE_PATH``; processes reload it on their next check.
+    """
+    db = SessionLocal()
+    try:
+        result = learn_speed_profiles(db)
+        logger.info("refresh_speed_profiles completed: %s", result)
+        return result
+    except Exception as exc:
+        logger.exception("refresh_speed_profiles failed")
+        raise self.retry(exc=exc)
+    finally:
+        db.close()
+
+
+@celery.task(bind=True, max_retries=1, default_retry_delay=300)
+def train_acceptance_model_task(self):
+    """Re-fit the offer-acceptance model from labelled ``OfferLog`` rows.
+
+    Publishes a new version to ``ACCEPTANCE_MODEL_DIR`` only when it beats
+    the heuristic on held-out offers; dispatch picks it up without a restart.
+    """
+    db = SessionLocal()
+    try:
+        result = train_acceptance_model(db)
+        logger.info("train_acceptance_model completed: %s", result)
+        return result
+    except Exception as exc:
+        logger.exception("train_acceptance_model failed")
+        raise self.retry(exc=exc)
+    finally:
+        db.close()
@@ -114,6 +114,7 @@ class Order(Base):
     items_json = Column(JSON, nullable=True)
     payment_status = Column(String, nullable=False, default="UNPAID")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now(), nullable=False)
 
 class DeliveryTask(Base):
     __tablename__ = "delivery_tasks"
@@ -125,6 +126,7 @@ class DeliveryTask(Base):
     offer_expires_at = Column(DateTime(timezone=True), nullable=True)
     route_json = Column(JSON, nullable=False, default=dict)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now(), nullable=False)
 
 class IdempotencyKey(Base):
     __tablename__ = "idempotency_keys"
@@ -0,0 +1,192 @@
+"""Sparse min-cost bipartite assignment without OR-Tools.
+
+Jonker-Volgenant style shortest augmenting paths over a CSR edge list:
+
+  1. two passes of augmenting row reduction: a free row takes its cheapest
+     column in reduced terms and lowers that column's price to its
+     second-best, displacing the previous holder;
+  2. for every row still free, a Dijkstra over reduced costs
+     ``c_ij - u_i - v_j`` that stops at the first free column, then a
+     potential update and a flip of the augmenting path.
+
+Reduced costs stay non-negative and free columns keep ``v = 0``, so each
+augmentation is a true shortest path.  Every row also gets a private
+"unassigned" column priced above any real matching, so all rows can be
+matched and the optimum is exactly what ``solve_max_flow_with_min_cost``
+returns: maximum cardinality first, then minimum cost.  Rows are the
+smaller side (the problem is transposed if needed).
+
+Dijkstra only touches the neighbourhood of conflicting rows.  On top-K
+candidate graphs (``scripts/bench_assignment.py``) 1,000 jobs x 3,000
+drivers solves in 10-15 ms; a fully balanced 1,000 x 1,000 takes
+50-100 ms at K=10 and 130-290 ms at K=20.  There the last ~60 augmenting
+paths each settle most of the 1,000 columns: that tail is the cost of an
+exact answer.  An epsilon-auction finish for those rows was 2-30% off the
+optimum before it got any faster, so it is not used.
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Sequence, Tuple
+
+import numpy as np
+
+_INF = float("inf")
+# Row-reduction steps per free row and pass (see step 1).
+_ARR_BUDGET = 2
+
+
+def solve_sparse_assignment(
+    n_rows: int,
+    n_cols: int,
+    rows: Sequence[int],
+    cols: Sequence[int],
+    costs: Sequence[float],
+) -> Tuple[np.ndarray, float]:
+    """Min-cost maximum matching on the sparse bipartite graph (rows, cols, costs).
+
+    Returns (row_to_col, total_cost); ``row_to_col[i] == -1`` for unmatched rows.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    costs = np.asarray(costs)
+    if n_rows > n_cols:
+        col_to_row, total = solve_sparse_assignment(n_cols, n_rows, cols, rows, costs)
+        row_to_col = np.full(n_rows, -1, dtype=np.int64)
+        hit = col_to_row >= 0
+        row_to_col[col_to_row[hit]] = np.flatnonzero(hit)
+        return row_to_col, total
+
+    if len(rows) == 0:
+        return np.full(n_rows, -1, dtype=np.int64), 0
+
+    # One private "unassigned" column per row, priced above any possible
+    # difference in real matching cost: every row can then be matched, and
+    # the optimum uses as few of them as it can -- i.e. maximum cardinality,
+    # then minimum cost, in one pass.
+    live_rows = np.unique(rows)
+    big = (costs.max() - min(costs.min(), 0) + 1) * (len(live_rows) + 1)
+    all_rows = np.concatenate([rows, live_rows])
+    all_cols = np.concatenate([cols, n_cols + live_rows])
+    all_costs = np.concatenate([costs, np.full(len(live_rows), big, dtype=costs.dtype)])
+    n_real = n_cols
+    n_cols += n_rows
+
+    # CSR by row with each row's edges sorted by cost (first = row minimum).
+    order = np.lexsort((all_costs, all_rows))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(all_rows, minlength=n_rows), out=indptr[1:])
+    ip = indptr.tolist()
+    adj = all_cols[order].tolist()
+    cost = all_costs[order].tolist()
+    out_edges = [list(zip(adj[ip[i]:ip[i + 1]], cost[ip[i]:ip[i + 1]])) for i in range(n_rows)]
+
+    row_col = [-1] * n_rows
+    u = [0] * n_rows
+    v = [0] * n_cols
+    col_row = [-1] * n_cols
+
+    # 1. Augmenting row reduction (two passes).  Each free row takes its
+    #    cheapest column in reduced terms and lowers that column's price to
+    #    its second-best, so a displaced row can move on cheaply.  Keeps
+    #    ``c_ij - u_i - v_j >= 0`` with matched edges tight.  Near-equal
+    #    costs make rows bounce for a long time, so each pass gets a budget
+    #    and whatever is left over goes to the augmenting phase.
+    free = [i for i in range(n_rows) if out_edges[i]]
+    for _ in range(2):
+        unassigned = []
+        k = 0
+        budget = _ARR_BUDGET * len(free)
+        while k < len(free) and budget:
+            budget -= 1
+            i = free[k]
+            k += 1
+            u1 = u2 = _INF
+            j1 = j2 = -1
+            for j, c in out_edges[i]:
+                h = c - v[j]
+                if h < u2:
+                    if h < u1:
+                        u2, j2 = u1, j1
+                        u1, j1 = h, j
+                    elif j != j1:
+                        u2, j2 = h, j
+            i0 = col_row[j1]
+            if u1 < u2:
+                v[j1] -= u2 - u1
+            elif i0 >= 0 and j2 >= 0:
+                j1 = j2
+                i0 = col_row[j1]
+            if i0 >= 0:
+                row_col[i0] = -1
+                if u1 < u2:
+                    k -= 1
+                    free[k] = i0
+                else:
+                    unassigned.append(i0)
+            row_col[i] = j1
+            col_row[j1] = i
+            u[i] = u2  # == u1 on a tie
+        free = unassigned + free[k:]
+
+    # 2. Shortest augmenting path from each free row.
+    heappush, heappop = heapq.heappush, heapq.heappop
+    dist = [_INF] * n_cols  # reduced distance per column, reset after each row
+    pred = [-1] * n_cols    # row a column was reached from
+    done = [False] * n_cols
+    # Integer costs keep every distance integral: pack (distance, column)
+    # into one int heap key instead of a tuple.
+    pack = n_cols if costs.dtype.kind in "iu" else 0
+    for s in free:
+        u[s] = min(c - v[j] for j, c in out_edges[s])
+        reached = {s: 0}  # row -> distance at which it was reached
+        touched = []
+        settled = []
+        heap = []
+        i, di = s, 0
+        while True:
+            base = di - u[i]
+            for j, c in out_edges[i]:
+                nd = base + c - v[j]
+                if nd < dist[j] and not done[j]:
+                    if dist[j] == _INF:
+                        touched.append(j)
+                    dist[j] = nd
+                    pred[j] = i
+                    heappush(heap, nd * pack + j if pack else (nd, j))
+            d, j = divmod(heappop(heap), pack) if pack else heappop(heap)
+            while done[j]:
+                d, j = divmod(heappop(heap), pack) if pack else heappop(heap)
+            done[j] = True
+            settled.append(j)
+            i = col_row[j]
+            if i < 0:
+                end = j
+                break
+            reached[i] = di = d
+
+        # s always reaches a free column (at worst its own "unassigned" one).
+        D = dist[end]
+        for i, di in reached.items():
+            u[i] += D - di
+        for j in settled:
+            v[j] -= D - dist[j]
+        j = end
+        while True:
+            i = pred[j]
+            j, row_col[i] = row_col[i], j
+            col_row[row_col[i]] = i
+            if i == s:
+                break
+        for j in touched:
+            dist[j] = _INF
+            done[j] = False
+
+    row_to_col = np.asarray(row_col, dtype=np.int64)
+    row_to_col[row_to_col >= n_real] = -1
+    # Duplicate (row, col) edges: the cheapest one is the one used.
+    used = row_to_col[rows] == cols
+    best = np.full(n_rows, np.inf)
+    np.minimum.at(best, rows[used], costs[used])
+    total = best[row_to_col >= 0].astype(costs.dtype).sum().item()
+    return row_to_col, total
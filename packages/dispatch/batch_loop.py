@@ -7,59 +7,142 @@ the FAST loop can keep reacting in real time.
 
 When OR-Tools VRP is available the route ordering step delegates to
 ``ortools_wrapper.solve_vrp``; otherwise it uses the built-in greedy
-nearest-neighbor solver.
+nearest-neighbor solver.  Solver time comes out of one budget per tick
+(``DISPATCH_BATCH_TICK_BUDGET_S``), split across clusters by size, and
+each driver's route is seeded from what the previous tick planned for it.
+With ``DISPATCH_BATCH_WORKERS`` > 1 the cluster solves run in a process
+pool on compact matrix inputs and are merged back in cluster order.
+
+``DISPATCH_BATCH_PLANNER=JOINT`` replaces the one-driver-per-cluster step
+with joint planning: pending jobs are split into region partitions, and
+each partition's nearby drivers are routed together over pickup-delivery
+pairs with capacities and time windows (``ortools_wrapper.solve_pdptw``)
+on one shared time matrix.  The tick summary then reports the planned
+drive time next to what the cluster heuristic would have planned for the
+same partitions.
 """
 from __future__ import annotations
 
 import logging
 import math
-from typing import Dict, List, Tuple
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from packages.db.session import SessionLocal
-from packages.dispatch.candidates import _haversine_m
+from packages.dispatch.candidates import _haversine_m, _snapshot_ts
 from packages.dispatch.costs import compute_cost
-from packages.dispatch.offers import create_offer
-from packages.dispatch.ortools_wrapper import solve_vrp
+from packages.dispatch.lookups import task_lookups
+from packages.dispatch.offers import create_offers_bulk
+from packages.dispatch.ortools_wrapper import (
+    VRP_EXACT_MAX_STOPS, VRP_HORIZON_S, pdp_route_cost, solve_pdptw, solve_route_indices,
+)
+from packages.router.matrix_service import Location, time_matrix_service
+from packages.router.speed_model import travel_time_s
 
 logger = logging.getLogger(__name__)
 
+BATCH_PLANNER = os.getenv("DISPATCH_BATCH_PLANNER", "CLUSTER").upper()  # CLUSTER | JOINT
+BATCH_HORIZON_S = VRP_HORIZON_S  # DISPATCH_BATCH_HORIZON_S; also bounds the OR-Tools routes
+BATCH_VRP_TIME_LIMIT_S = float(os.getenv("DISPATCH_BATCH_VRP_TIME_LIMIT_S", "2"))  # cap per solve
+# Solver time for a whole tick; the beat runs every 30 s.
+BATCH_TICK_BUDGET_S = float(os.getenv("DISPATCH_BATCH_TICK_BUDGET_S", "20"))
+# Worker processes for cluster solves (1 = inline in the Celery worker).
+BATCH_WORKERS = int(os.getenv("DISPATCH_BATCH_WORKERS", "1"))
+_POOL_GRACE_S = 5.0  # wait this long past the tick budget before giving up on a worker
+PARTITION_MAX_JOBS = int(os.getenv("DISPATCH_BATCH_PARTITION_MAX_JOBS", "40"))
+_PARTITION_RADIUS_M = 8000  # pickups within 8 km of a partition seed plan together
+
 # ---------------------------------------------------------------------------
 # Geo-clustering helpers
 # ---------------------------------------------------------------------------
 
 _CLUSTER_RADIUS_M = 3000  # jobs within 3 km are grouped together
+_EARTH_RADIUS_M = 6371000.0
+_M_PER_DEG = math.pi * _EARTH_RADIUS_M / 180.0
+
+
+def _unit_vectors(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    la, lo = np.radians(lat), np.radians(lng)
+    c = np.cos(la)
+    return np.column_stack([c * np.cos(lo), c * np.sin(lo), np.sin(la)])
+
 
+def _cluster_jobs(jobs: List[dict], radius_m: float = _CLUSTER_RADIUS_M) -> List[List[dict]]:
+    """Seed clustering of jobs by pickup location on a spatial grid.
 
-def _cluster_jobs(jobs: List[dict]) -> List[List[dict]]:
-    """Simple greedy single-linkage clustering of jobs by pickup location.
+    Seeds are taken in a fixed order (south-west to north-east by grid
+    cell, then ``job_id``); each seed claims every unclaimed job whose
+    pickup is within ``radius_m`` of it.  Pickups are bucketed into cells
+    at least ``radius_m`` wide, so a seed only looks at its own and the
+    neighbouring cells, one vectorized great-circle test per cell.  The
+    result does not depend on input order and clusters keep the bounded
+    extent the one-driver-per-cluster planner relies on.
 
     Returns a list of clusters; each cluster is a list of job dicts.
-    Jobs without valid coordinates are placed in their own singleton cluster.
+    Jobs without valid coordinates are placed in their own singleton cluster
+    at the end.
     """
-    remaining = list(jobs)
+    located: List[dict] = []
+    unlocated: List[dict] = []
+    for j in jobs:
+        if j.get("pickup_lat") is None or j.get("pickup_lng") is None:
+            unlocated.append(j)
+        else:
+            located.append(j)
     clusters: List[List[dict]] = []
-
-    while remaining:
-        seed = remaining.pop(0)
-        slat, slng = seed.get("pickup_lat"), seed.get("pickup_lng")
-        if slat is None or slng is None:
-            clusters.append([seed])
-            continue
-
-        cluster = [seed]
-        still_remaining: List[dict] = []
-        for j in remaining:
-            jlat, jlng = j.get("pickup_lat"), j.get("pickup_lng")
-            if jlat is None or jlng is None:
-                still_remaining.append(j)
+    if located:
+        lat = np.array([float(j["pickup_lat"]) for j in located])
+        lng = np.array([float(j["pickup_lng"]) for j in located])
+        xyz = _unit_vectors(lat, lng)
+        min_dot = math.cos(radius_m / _EARTH_RADIUS_M)
+
+        # Cells are radius_m wide even at the narrowest latitude in the set,
+        # so everything within the radius is at most one cell away.
+        cos_narrow = math.cos(math.radians(min(float(np.abs(lat).max()), 85.0)))
+        d_lat = radius_m / _M_PER_DEG
+        d_lng = radius_m / (_M_PER_DEG * cos_narrow)
+        cells = np.column_stack([np.floor(lat / d_lat), np.floor(lng / d_lng)]).astype(np.int64)
+        job_ids = [str(j.get("job_id", "")) for j in located]
+        seeds = sorted(range(len(located)), key=lambda i: (cells[i, 0], cells[i, 1], job_ids[i], lat[i], lng[i]))
+
+        rank = np.empty(len(located), dtype=np.int64)
+        rank[seeds] = np.arange(len(located))
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i in seeds:
+            buckets.setdefault((int(cells[i, 0]), int(cells[i, 1])), []).append(i)
+        # Unclaimed jobs per cell; emptied cells are dropped.
+        open_by_cell = {k: np.asarray(v) for k, v in buckets.items()}
+        claimed = np.zeros(len(located), dtype=bool)
+
+        for s in seeds:
+            if claimed[s]:
                 continue
-            if _haversine_m(float(slat), float(slng), float(jlat), float(jlng)) <= _CLUSTER_RADIUS_M:
-                cluster.append(j)
-            else:
-                still_remaining.append(j)
-        remaining = still_remaining
-        clusters.append(cluster)
-
+            y, x = int(cells[s, 0]), int(cells[s, 1])
+            members = []
+            for key in ((y + dy, x + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)):
+                idx = open_by_cell.get(key)
+                if idx is None:
+                    continue
+                near = xyz[idx] @ xyz[s] >= min_dot
+                members.append(idx[near])
+                if near.all():
+                    del open_by_cell[key]
+                else:
+                    open_by_cell[key] = idx[~near]
+            members = np.concatenate(members)
+            claimed[members] = True
+            clusters.append([located[i] for i in members[np.argsort(rank[members])]])
+
+    clusters.extend([j] for j in unlocated)
     return clusters
 
 
@@ -106,6 +189,23 @@ def _nn_order_stops(
 # Driver selection
 # ---------------------------------------------------------------------------
 
+def _dispatchable(d: dict, busy_driver_ids) -> bool:
+    """Idle, verified, located, and without an outstanding offer/task."""
+    if d.get("status") != "IDLE":
+        return False
+    elig = d.get("eligibility", {}) or {}
+    if not (elig.get("insurance_verified") and elig.get("registration_verified")):
+        return False
+    if d.get("lat") is None or d.get("lng") is None:
+        return False
+    return d["driver_id"] not in busy_driver_ids
+
+
+def _driver_capacity(d: dict) -> int:
+    cap = d.get("capacity") or {}
+    return max(0, int(cap.get("max_active_orders", 1)) - int(cap.get("active_orders", 0)))
+
+
 def _pick_best_driver(
     snapshot: dict,
     drivers: List[dict],
@@ -130,31 +230,16 @@ def _pick_best_driver(
 
     params = snapshot.get("params", {}) or {}
     radius_m = int(params.get("radius_meters", 6000))
-    tasks = snapshot.get("tasks", []) or []
+    busy_driver_ids = task_lookups(snapshot)["busy_driver_ids"]
 
     best: dict | None = None
     best_dist = float("inf")
 
     for d in drivers:
-        if d["driver_id"] in assigned_driver_ids:
-            continue
-        if d.get("status") != "IDLE":
-            continue
-        elig = d.get("eligibility", {}) or {}
-        if not (elig.get("insurance_verified") and elig.get("registration_verified")):
-            continue
-        dlat, dlng = d.get("lat"), d.get("lng")
-        if dlat is None or dlng is None:
-            continue
-        # Skip drivers that already have an outstanding offer/task
-        if any(
-            t.get("offered_to_driver_id") == d["driver_id"]
-            and t.get("status") in ("OFFERED", "ACCEPTED", "IN_PROGRESS")
-            for t in tasks
-        ):
+        if d["driver_id"] in assigned_driver_ids or not _dispatchable(d, busy_driver_ids):
             continue
 
-        dist = _haversine_m(float(dlat), float(dlng), c_lat, c_lng)
+        dist = _haversine_m(float(d["lat"]), float(d["lng"]), c_lat, c_lng)
         if dist > radius_m:
             continue
         if dist < best_dist:
@@ -168,36 +253,346 @@ def _pick_best_driver(
 # Build a time-matrix for solve_vrp
 # ---------------------------------------------------------------------------
 
-def _build_time_matrix(driver: dict, jobs: List[dict]) -> List[List[int]]:
+_DRIVER_CELL_DEG = 0.001  # ~100 m: drivers in the same cell share matrix rows
+
+
+def _driver_location(driver: dict) -> Location:
+    """Matrix location of a driver: the centre of its ~100 m cell."""
+    cy = round(float(driver.get("lat", 0)) / _DRIVER_CELL_DEG)
+    cx = round(float(driver.get("lng", 0)) / _DRIVER_CELL_DEG)
+    return f"cell:{cy}:{cx}", cy * _DRIVER_CELL_DEG, cx * _DRIVER_CELL_DEG
+
+
+def _pickup_location(job: dict) -> Location:
+    lat, lng = float(job.get("pickup_lat", 0)), float(job.get("pickup_lng", 0))
+    if job.get("store_id"):
+        return f"store:{job['store_id']}", lat, lng
+    return f"pickup:{job.get('order_id') or job.get('job_id')}", lat, lng
+
+
+def _drop_location(job: dict) -> Location:
+    if job.get("drop_lat") is None or job.get("drop_lng") is None:
+        return _pickup_location(job)
+    return f"drop:{job.get('order_id') or job.get('job_id')}", float(job["drop_lat"]), float(job["drop_lng"])
+
+
+def _build_time_matrix(driver: dict, jobs: List[dict], *, ts: Optional[float] = None) -> np.ndarray:
     """Build a simple time matrix for [driver, job0, job1, ...].
 
     Index 0 = driver location.
     Index 1..N = job pickup locations.
-    Uses haversine distance with a road-factor speed model (same as Router
-    MVP) to produce travel-time seconds.
+    Legs come from the shared ``TimeMatrixService`` (haversine with the
+    time-of-day speed model unless it fills from the router), so stores and
+    driver cells seen on earlier ticks are not recomputed.
     """
-    mph = 35.0
-    road_factor = 1.25
-    mps = (mph * 1609.34) / 3600.0
+    locs = [_driver_location(driver)] + [_pickup_location(j) for j in jobs]
+    return time_matrix_service().matrix(locs, ts=ts).astype(np.int32)
+
+
+# ---------------------------------------------------------------------------
+# Solver time budget
+# ---------------------------------------------------------------------------
+
+class _TickBudget:
+    """Splits what is left of the tick's solver time across the remaining solves.
+
+    Each solve gets ``weight / remaining weight`` of the time still left
+    (capped at ``BATCH_VRP_TIME_LIMIT_S``), so a solve that finishes early
+    hands its unused time to the ones after it.
+    """
+
+    def __init__(self, weights: List[int], total_s: float = BATCH_TICK_BUDGET_S):
+        self.deadline = time.monotonic() + total_s
+        self.left = sum(weights)
+
+    def take(self, weight: int) -> float:
+        share = weight / self.left if self.left > 0 else 0.0
+        self.left -= weight
+        return min(BATCH_VRP_TIME_LIMIT_S, max(0.0, self.deadline - time.monotonic()) * share)
+
+
+def _summarize_solves(solves: List[dict]) -> dict:
+    """Tick-level aggregate of ``solve_vrp_with_stats`` records."""
+    return {
+        "solves": len(solves),
+        "exact": sum(1 for s in solves if s["engine"] == "exact"),
+        "warm": sum(1 for s in solves if s["warm"]),
+        "solve_ms": round(sum(s["ms"] for s in solves), 3),
+        "objective_s": sum(s["objective_s"] for s in solves),
+        "improvement_s": sum(s["improvement_s"] for s in solves),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Cluster planning (default)
+# ---------------------------------------------------------------------------
+
+# driver_id -> route planned for it on the previous tick (warm starts)
+_previous_routes: Dict[str, List[dict]] = {}
+
+
+@dataclass
+class _ClusterSolve:
+    """One cluster with its reserved driver and the compact solver inputs."""
+
+    driver: dict
+    jobs: List[dict]
+    weight: int             # share of the tick budget (0 = solved exactly)
+    matrix: np.ndarray      # int32, driver at 0, job k at k+1
+    seed: List[int]         # job indices in the previous tick's order
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pool_unavailable = False  # set once process start-up fails in this worker
+
+
+def _solver_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool for cluster solves, or None to solve inline."""
+    global _pool
+    if BATCH_WORKERS <= 1 or _pool_unavailable:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _drop_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _solve_clusters(work: List[_ClusterSolve]) -> List[Optional[Tuple[List[int], dict]]]:
+    """``solve_route_indices`` for every cluster, in order; None where a solve failed.
+
+    With ``DISPATCH_BATCH_WORKERS`` > 1 the solves fan out to worker
+    processes: the solver time shared out scales with the number of
+    workers, but the tick never waits longer than ``BATCH_TICK_BUDGET_S``
+    (plus a short grace) of wall clock; solves still running then are
+    dropped and their clusters fall back in ``_reconcile``.
+    If the pool cannot start (e.g. inside a daemonic Celery prefork child)
+    the tick solves inline instead.
+    """
+    global _pool_unavailable
+    pool = _solver_pool()
+    results: List[Optional[Tuple[List[int], dict]]] = [None] * len(work)
+    if pool is not None:
+        wait_until = time.monotonic() + BATCH_TICK_BUDGET_S + _POOL_GRACE_S
+        budget = _TickBudget([w.weight for w in work], BATCH_TICK_BUDGET_S * BATCH_WORKERS)
+        try:
+            futures = [pool.submit(solve_route_indices, w.matrix, w.seed, budget.take(w.weight)) for w in work]
+        except Exception:
+            logger.warning("batch_tick: solver pool unavailable, solving clusters inline", exc_info=True)
+            _pool_unavailable = True
+            _drop_pool()
+            return _solve_clusters(work)
+        for i, fut in enumerate(futures):
+            try:
+                results[i] = fut.result(timeout=max(0.0, wait_until - time.monotonic()))
+            except FuturesTimeout:
+                fut.cancel()
+                logger.warning("batch_tick: cluster solve %d missed the tick budget", i)
+            except BrokenProcessPool:
+                logger.warning("batch_tick: solver pool broke; restarting it next tick")
+                _drop_pool()
+            except Exception:
+                logger.warning("batch_tick: cluster solve %d failed in worker", i, exc_info=True)
+        return results
+    budget = _TickBudget([w.weight for w in work])
+    for i, w in enumerate(work):
+        results[i] = solve_route_indices(w.matrix, w.seed, budget.take(w.weight))
+    return results
+
+
+def _reconcile(work: List[_ClusterSolve], results: List[Optional[Tuple[List[int], dict]]]) -> Tuple[List[dict], List[dict]]:
+    """Merge cluster solutions in cluster order into (routes, solve stats).
+
+    Each driver and each job is planned at most once (first cluster wins);
+    clusters whose solve failed or returned nothing fall back to
+    nearest-neighbor ordering here.
+    """
+    planned_routes: List[dict] = []
+    solves: List[dict] = []
+    drivers_taken: set = set()
+    jobs_taken: set = set()
+    for w, res in zip(work, results):
+        did = w.driver["driver_id"]
+        if did in drivers_taken:
+            continue
+        order, solve_stats = res if res is not None else ([], None)
+        if solve_stats is not None:
+            solves.append(solve_stats)
+        ordered_jobs = [w.jobs[k] for k in order if 0 <= k < len(w.jobs)]
+        if not ordered_jobs:
+            # Fallback: nearest-neighbor ordering
+            ordered_jobs = _nn_order_stops(w.driver, w.jobs)
+        ordered_jobs = [j for j in ordered_jobs if id(j) not in jobs_taken]
+        if not ordered_jobs:
+            continue
+        drivers_taken.add(did)
+        jobs_taken.update(id(j) for j in ordered_jobs)
+        planned_routes.append({"driver_id": did, "ordered_jobs": ordered_jobs})
+    return planned_routes, solves
+
+
+def _plan_clusters(snapshot: dict, clusters: List[List[dict]], idle_drivers: List[dict]) -> Tuple[List[dict], dict]:
+    """One nearest driver per cluster, stops ordered by ``solve_vrp`` (or NN).
 
-    locs: List[Tuple[float, float]] = []
-    locs.append((float(driver.get("lat", 0)), float(driver.get("lng", 0))))
+    Drivers are reserved and matrices built up front; the solves then run
+    inline or in worker processes (``_solve_clusters``) and are merged by
+    ``_reconcile``.  Clusters small enough to solve exactly take no share
+    of the tick budget; the rest split it by job count.  Returns
+    (routes, stats).
+    """
+    global _previous_routes
+    assigned_driver_ids: set = set()
+    ts = _snapshot_ts(snapshot)
+    work: List[_ClusterSolve] = []
+
+    for cluster in clusters:
+        driver = _pick_best_driver(snapshot, idle_drivers, cluster, assigned_driver_ids)
+        if driver is None:
+            continue
+        assigned_driver_ids.add(driver["driver_id"])
+        position = {str(j.get("job_id")): k for k, j in enumerate(cluster)}
+        previous = _previous_routes.get(driver["driver_id"]) or []
+        work.append(_ClusterSolve(
+            driver=driver,
+            jobs=cluster,
+            weight=len(cluster) if len(cluster) > VRP_EXACT_MAX_STOPS else 0,
+            matrix=_build_time_matrix(driver, cluster, ts=ts),
+            seed=[position[k] for k in (str(j.get("job_id")) for j in previous) if k in position],
+        ))
+
+    planned_routes, solves = _reconcile(work, _solve_clusters(work))
+    _previous_routes = {r["driver_id"]: r["ordered_jobs"] for r in planned_routes}
+    return planned_routes, {"vrp": _summarize_solves(solves)}
+
+
+# ---------------------------------------------------------------------------
+# Joint multi-vehicle planning (DISPATCH_BATCH_PLANNER=JOINT)
+# ---------------------------------------------------------------------------
+
+def _partitions(snapshot: dict, jobs: List[dict], drivers: List[dict]) -> List[Tuple[List[dict], List[dict]]]:
+    """Split pending jobs into region partitions and give each its nearby drivers.
+
+    Partitions are ``_cluster_jobs`` at ``_PARTITION_RADIUS_M``, chunked to
+    ``PARTITION_MAX_JOBS``.  Each dispatchable driver joins the partition
+    with the nearest pickup centroid (within ``radius_meters`` of its
+    edge); a partition keeps at most two drivers per job, nearest first.
+    """
+    groups: List[List[dict]] = []
+    for cluster in _cluster_jobs(jobs, radius_m=_PARTITION_RADIUS_M):
+        located = [j for j in cluster if j.get("pickup_lat") is not None and j.get("pickup_lng") is not None]
+        groups.extend(located[k:k + PARTITION_MAX_JOBS] for k in range(0, len(located), PARTITION_MAX_JOBS))
+    busy = task_lookups(snapshot)["busy_driver_ids"]
+    pool = [d for d in drivers if _dispatchable(d, busy) and _driver_capacity(d) > 0]
+    if not groups or not pool:
+        return []
+
+    centroids = np.array([
+        [np.mean([float(j["pickup_lat"]) for j in g]), np.mean([float(j["pickup_lng"]) for j in g])] for g in groups
+    ])
+    pos = np.array([[float(d["lat"]), float(d["lng"])] for d in pool])
+    dot = np.clip(_unit_vectors(pos[:, 0], pos[:, 1]) @ _unit_vectors(centroids[:, 0], centroids[:, 1]).T, -1.0, 1.0)
+    dist_m = np.arccos(dot) * _EARTH_RADIUS_M
+    nearest = dist_m.argmin(axis=1)
+    reach_m = int((snapshot.get("params") or {}).get("radius_meters", 6000)) + _PARTITION_RADIUS_M
+
+    members: Dict[int, List[Tuple[float, str, dict]]] = {}
+    for i, d in enumerate(pool):
+        g = int(nearest[i])
+        if dist_m[i, g] <= reach_m:
+            members.setdefault(g, []).append((float(dist_m[i, g]), d["driver_id"], d))
+    out = []
+    for g, group in enumerate(groups):
+        near = sorted(members.get(g, []), key=lambda m: m[:2])[: 2 * len(group)]
+        if near:
+            out.append((group, [m[2] for m in near]))
+    return out
+
+
+def _pdp_time_matrix(drivers: List[dict], jobs: List[dict], ts: Optional[float]) -> np.ndarray:
+    """Shared matrix over [driver positions..., pickup0, drop0, pickup1, drop1, ...]."""
+    locs = [_driver_location(d) for d in drivers]
     for j in jobs:
-        locs.append((float(j.get("pickup_lat", 0)), float(j.get("pickup_lng", 0))))
-
-    n = len(locs)
-    matrix: List[List[int]] = []
-    for i in range(n):
-        row: List[int] = []
-        for j_idx in range(n):
-            if i == j_idx:
-                row.append(0)
-            else:
-                d = _haversine_m(locs[i][0], locs[i][1], locs[j_idx][0], locs[j_idx][1])
-                t = int((d / mps) * road_factor)
-                row.append(max(5, min(t, 3600)))
-        matrix.append(row)
-    return matrix
+        locs += [_pickup_location(j), _drop_location(j)]
+    return time_matrix_service().matrix(locs, ts=ts)
+
+
+def _baseline_routes(snapshot: dict, drivers: List[dict], jobs: List[dict]) -> List[Tuple[int, List[Tuple[str, int]]]]:
+    """What the cluster heuristic plans for the same jobs and drivers.
+
+    One nearest driver per ``_cluster_jobs`` cluster, jobs in
+    nearest-neighbor order, each picked up and dropped off in turn.
+    """
+    index = {id(j): k for k, j in enumerate(jobs)}
+    drv_index = {d["driver_id"]: v for v, d in enumerate(drivers)}
+    assigned: set = set()
+    routes = []
+    for cluster in _cluster_jobs(jobs):
+        driver = _pick_best_driver(snapshot, drivers, cluster, assigned)
+        if driver is None:
+            continue
+        assigned.add(driver["driver_id"])
+        stops = []
+        for j in _nn_order_stops(driver, cluster):
+            stops += [("pickup", index[id(j)]), ("drop", index[id(j)])]
+        routes.append((drv_index[driver["driver_id"]], stops))
+    return routes
+
+
+def _plan_joint(snapshot: dict, pending_jobs: List[dict], drivers: List[dict]) -> Tuple[List[dict], dict]:
+    """Joint pickup-delivery plan per partition, plus a comparison with the cluster heuristic."""
+    now_ms = int(snapshot.get("ts_ms") or time.time() * 1000)
+    ts = now_ms / 1000.0
+    planned_routes: List[dict] = []
+    stats = {
+        "partitions": 0, "engine": None,
+        "jobs_routed": 0, "planned_drive_s": 0,
+        "baseline_jobs_routed": 0, "baseline_drive_s": 0,
+    }
+    parts = _partitions(snapshot, pending_jobs, drivers)
+    budget = _TickBudget([len(jobs) for jobs, _ in parts])
+    for jobs, drvs in parts:
+        time_limit_s = budget.take(len(jobs))
+        matrix = _pdp_time_matrix(drvs, jobs, ts)
+        ready_s = [max(0, int(j.get("ready_at_ms") or now_ms) - now_ms) // 1000 for j in jobs]
+        due_s = [(int(j.get("deadline_ms") or now_ms + BATCH_HORIZON_S * 1000) - now_ms) // 1000 for j in jobs]
+        caps = [_driver_capacity(d) for d in drvs]
+        routes, engine = solve_pdptw(
+            drvs, jobs, matrix, ready_s=ready_s, due_s=due_s, capacities=caps,
+            horizon_s=BATCH_HORIZON_S, time_limit_s=time_limit_s,
+        )
+        stats["partitions"] += 1
+        stats["engine"] = engine
+
+        def drive_s(v, stops, horizon_s):
+            """Drive seconds of a route, or None if it does not fit."""
+            cost = pdp_route_cost(v, stops, matrix, ready_s=ready_s, due_s=due_s,
+                                  capacity=max(1, caps[v]), horizon_s=horizon_s)
+            return None if cost is None else cost[0]
+
+        for v, stops in enumerate(routes):
+            if not stops:
+                continue
+            ordered = [jobs[k] for kind, k in stops if kind == "pickup"]
+            planned_routes.append({"driver_id": drvs[v]["driver_id"], "ordered_jobs": ordered})
+            stats["jobs_routed"] += len(ordered)
+            stats["planned_drive_s"] += drive_s(v, stops, BATCH_HORIZON_S) or 0
+        # The heuristic has no horizon: count the part of each route that fits.
+        for v, stops in _baseline_routes(snapshot, drvs, jobs):
+            n = len(stops)
+            while n and drive_s(v, stops[:n], BATCH_HORIZON_S) is None:
+                n -= 2
+            stats["baseline_jobs_routed"] += n // 2
+            stats["baseline_drive_s"] += drive_s(v, stops[:n], BATCH_HORIZON_S) if n else 0
+    return planned_routes, stats
 
 
 # ---------------------------------------------------------------------------
@@ -212,16 +607,11 @@ def run_batch_tick(snapshot: dict) -> dict:
     """
     drivers = snapshot.get("drivers", []) or []
     jobs = snapshot.get("jobs", []) or []
-    tasks = snapshot.get("tasks", []) or []
     params = snapshot.get("params", {}) or {}
 
     # Filter to jobs that are truly pending dispatch and don't already have
     # an outstanding offer or active task.
-    active_order_ids = {
-        t["order_id"]
-        for t in tasks
-        if t.get("status") in ("OFFERED", "ACCEPTED", "IN_PROGRESS")
-    }
+    active_order_ids = task_lookups(snapshot)["active_order_ids"]
     pending_jobs = [
         j for j in jobs
         if j.get("state") in ("PENDING_DISPATCH", "MERCHANT_ACCEPTED", "DISPATCHING")
@@ -237,95 +627,64 @@ def run_batch_tick(snapshot: dict) -> dict:
         logger.debug("batch_tick: no idle drivers")
         return {"clusters": 0, "routes_planned": 0, "offers_created": 0}
 
-    # Step 1: Cluster jobs by geographic proximity
-    clusters = _cluster_jobs(pending_jobs)
-    logger.info("batch_tick: %d pending jobs -> %d clusters", len(pending_jobs), len(clusters))
+    plan_stats: dict = {}
+    if BATCH_PLANNER == "JOINT":
+        # Steps 1-2: partitions planned jointly over all their drivers
+        planned_routes, plan_stats = _plan_joint(snapshot, pending_jobs, idle_drivers)
+        n_clusters = plan_stats["partitions"]
+        logger.info("batch_tick: %d pending jobs -> %d partitions", len(pending_jobs), n_clusters)
+    else:
+        # Step 1: Cluster jobs by geographic proximity
+        clusters = _cluster_jobs(pending_jobs)
+        n_clusters = len(clusters)
+        logger.info("batch_tick: %d pending jobs -> %d clusters", len(pending_jobs), len(clusters))
+        # Step 2: For each cluster, assign a driver and plan a route
+        planned_routes, plan_stats = _plan_clusters(snapshot, clusters, idle_drivers)
 
-    # Step 2: For each cluster, assign a driver and plan a route
-    planned_routes: List[dict] = []
-    assigned_driver_ids: set = set()
-
-    for cluster in clusters:
-        driver = _pick_best_driver(snapshot, idle_drivers, cluster, assigned_driver_ids)
-        if driver is None:
+    # Step 3: Commit only the *next immediate* offer per driver
+    drv_by_id = {d["driver_id"]: d for d in drivers}
+    specs: List[dict] = []
+    for route in planned_routes:
+        if not route["ordered_jobs"]:
             continue
 
-        # Build time-matrix and try VRP solver; falls back to NN internally
-        time_matrix = _build_time_matrix(driver, cluster)
-        vrp_routes = solve_vrp(
-            drivers=[driver],
-            jobs=cluster,
-            time_matrix=time_matrix,
-        )
+        first_job = route["ordered_jobs"][0]
+        driver_id = route["driver_id"]
 
-        if vrp_routes and vrp_routes[0]:
-            ordered_jobs = vrp_routes[0]
-        else:
-            # Fallback: nearest-neighbor ordering
-            ordered_jobs = _nn_order_stops(driver, cluster)
+        # Compute cost for logging/debugging
+        drv = drv_by_id.get(driver_id)
+        if drv is None:
+            continue
 
-        assigned_driver_ids.add(driver["driver_id"])
-        planned_routes.append({
-            "driver_id": driver["driver_id"],
-            "ordered_jobs": ordered_jobs,
+        # Approximate ETAs for the first job
+        dlat, dlng = drv.get("lat"), drv.get("lng")
+        plat, plng = first_job.get("pickup_lat"), first_job.get("pickup_lng")
+        if None in (dlat, dlng, plat, plng):
+            continue
+
+        pickup_dist = _haversine_m(float(dlat), float(dlng), float(plat), float(plng))
+        eta_pu_s = max(5, travel_time_s(pickup_dist, float(dlat), float(dlng)))
+        eta_drop_s = int(first_job.get("approx_eta_drop_s", 600))
+
+        specs.append({
+            "order_id": first_job["order_id"],
+            "driver_id": driver_id,
+            "edge_debug": {
+                "source": "batch_loop",
+                "cluster_size": len(route["ordered_jobs"]),
+                "eta_pu_s": eta_pu_s,
+                "eta_drop_s": eta_drop_s,
+            },
+            "driver": drv,
+            "job": first_job,
         })
 
-    # Step 3: Commit only the *next immediate* offer per driver
-    offers_created = 0
+    # All offers go out in one transaction with one INSERT per table.
     db = SessionLocal()
     try:
-        for route in planned_routes:
-            if not route["ordered_jobs"]:
-                continue
-
-            first_job = route["ordered_jobs"][0]
-            driver_id = route["driver_id"]
-
-            # Compute cost for logging/debugging
-            drv = next((d for d in drivers if d["driver_id"] == driver_id), None)
-            if drv is None:
-                continue
-
-            # Approximate ETAs for the first job
-            dlat, dlng = drv.get("lat"), drv.get("lng")
-            plat, plng = first_job.get("pickup_lat"), first_job.get("pickup_lng")
-            if None in (dlat, dlng, plat, plng):
-                continue
-
-            mph = 35.0
-            road_factor = 1.25
-            mps = (mph * 1609.34) / 3600.0
-            pickup_dist = _haversine_m(float(dlat), float(dlng), float(plat), float(plng))
-            eta_pu_s = max(5, int((pickup_dist / mps) * road_factor))
-            eta_drop_s = int(first_job.get("approx_eta_drop_s", 600))
-
-            offer_ttl_s = int(params.get("offer_ttl_s", 30))
-
-            try:
-                task = create_offer(
-                    db,
-                    snapshot=snapshot,
-                    order_id=first_job["order_id"],
-                    driver_id=driver_id,
-                    offer_ttl_s=offer_ttl_s,
-                    edge_debug={
-                        "source": "batch_loop",
-                        "cluster_size": len(route["ordered_jobs"]),
-                        "eta_pu_s": eta_pu_s,
-                        "eta_drop_s": eta_drop_s,
-                    },
-                )
-                offers_created += 1
-                logger.info(
-                    "batch_tick: created offer task=%s driver=%s order=%s (cluster of %d)",
-                    task.id, driver_id, first_job["order_id"], len(route["ordered_jobs"]),
-                )
-            except Exception:
-                logger.exception(
-                    "batch_tick: failed to create offer for driver=%s order=%s",
-                    driver_id, first_job.get("order_id"),
-                )
-
+        created = create_offers_bulk(
+            db, snapshot=snapshot, offers=specs, offer_ttl_s=int(params.get("offer_ttl_s", 30)),
+        )
         db.commit()
     except Exception:
         db.rollback()
@@ -333,11 +692,18 @@ def run_batch_tick(snapshot: dict) -> dict:
         raise
     finally:
         db.close()
+    offers_created = len(created)
+    for t, spec in zip(created, specs):
+        logger.info(
+            "batch_tick: created offer task=%s driver=%s order=%s (cluster of %d)",
+            t["task_id"], t["driver_id"], t["order_id"], spec["edge_debug"]["cluster_size"],
+        )
 
     result = {
-        "clusters": len(clusters),
+        "clusters": n_clusters,
         "routes_planned": len(planned_routes),
         "offers_created": offers_created,
+        **plan_stats,
     }
     logger.info("batch_tick result: %s", result)
     return result
@@ -1,7 +1,20 @@
 from __future__ import annotations
-from typing import List, Dict
+from typing import List, Dict, Optional
 import math
 
+from packages.dispatch.lookups import task_lookups
+from packages.router.speed_model import speed_model
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is in requirements.txt
+    np = None
+
+_EARTH_R_M = 6371000.0
+_DISPATCHABLE_JOB_STATES = ("PENDING_DISPATCH", "MERCHANT_ACCEPTED", "DISPATCHING")
+# Upper bound on jobs x drivers cells evaluated per NumPy block.
+_BLOCK_CELLS = 2_000_000
+
 def _haversine_m(lat1, lon1, lat2, lon2) -> float:
     R = 6371000.0
     p1, p2 = math.radians(lat1), math.radians(lat2)
@@ -10,12 +23,55 @@ def _haversine_m(lat1, lon1, lat2, lon2) -> float:
     a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dl/2)**2
     return 2*R*math.asin(math.sqrt(a))
 
-def generate_candidates_topk(snapshot: dict, *, k_prime: int = 100, k: int = 20) -> List[Dict]:
+def _snapshot_ts(snapshot: dict):
+    """Snapshot time (epoch seconds) for speed-profile lookups; None = now."""
+    ts_ms = snapshot.get("ts_ms")
+    return ts_ms / 1000.0 if ts_ms else None
+
+
+def generate_candidates_topk(
+    snapshot: dict,
+    *,
+    k_prime: int = 100,
+    k: int = 20,
+    vectorized: Optional[bool] = None,
+) -> List[Dict]:
     """Top-K candidate generation.
 
     Strategy:
-    1) Prefer H3 ring query if `h3` is installed (fast, scalable).
-    2) Fallback to haversine scan (MVP / dev).
+    1) Persistent spatial index on ``snapshot["driver_index"]`` (kept current
+       by ``SnapshotStore``): per-job cost is O(nearby drivers).
+    2) Columnar NumPy scan over all dispatchable drivers.
+    3) Scalar path with a per-call spatial index (H3, or the pure-Python
+       grid when `h3` is not installed).
+
+    ``vectorized`` forces (True) or disables (False) the NumPy path.
+    """
+    index = snapshot.get("driver_index")
+    if index is not None and not index.available:
+        index = None
+    if vectorized is None:
+        vectorized = np is not None and index is None
+    if vectorized:
+        return _generate_candidates_numpy(snapshot, k_prime=k_prime, k=k)
+
+    if index is None:
+        params = snapshot.get("params", {}) or {}
+        try:
+            from packages.geo.h3_index import new_driver_index
+            index = new_driver_index(res=int(params.get("h3_res", 8)))
+            index.build(snapshot.get("drivers", []) or [])
+        except Exception:
+            index = None
+    return _generate_candidates_scalar(snapshot, k_prime=k_prime, k=k, index=index)
+
+
+def _generate_candidates_scalar(snapshot: dict, *, k_prime: int = 100, k: int = 20, index=None) -> List[Dict]:
+    """Scalar reference implementation.
+
+    With a spatial ``index`` each job only scores the drivers found by
+    expanding rings around its pickup (up to the radius); without one it
+    scans every driver in the snapshot.
 
     Requires jobs/drivers have lat/lng fields (pickup_lat/lng and driver lat/lng).
     """
@@ -25,46 +81,47 @@ def generate_candidates_topk(snapshot: dict, *, k_prime: int = 100, k: int = 20)
 
     drivers = snapshot.get("drivers", []) or []
     jobs = snapshot.get("jobs", []) or []
-    tasks = snapshot.get("tasks", []) or []
+    lookups = task_lookups(snapshot)
+    active_order_ids = lookups["active_order_ids"]
+    busy_driver_ids = lookups["busy_driver_ids"]
 
-    vmax_mps = 20.0
-    road_factor = 1.35
+    speeds = speed_model()
+    ts = _snapshot_ts(snapshot)
 
-    # Try H3 index
-    h3_index = None
-    try:
-        from packages.geo.h3_index import DriverH3Index
-        h3_index = DriverH3Index(res=int(params.get("h3_res", 8)))
-        h3_index.build(drivers)
-    except Exception:
-        h3_index = None
+    if index is not None and not index.available:
+        index = None
+    max_ring = index.rings_for_radius(radius_m) if index is not None else 0
+    # A long-lived index may know drivers this snapshot does not (e.g. pings
+    # that arrived after the snapshot was taken); only offer snapshot drivers.
+    known_ids = {d.get("driver_id") for d in drivers} if index is not None else None
 
     edges: List[Dict] = []
     for job in jobs:
-        if job.get("state") not in ("PENDING_DISPATCH", "MERCHANT_ACCEPTED", "DISPATCHING"):
+        if job.get("state") not in _DISPATCHABLE_JOB_STATES:
             continue
-        if any(t.get("order_id") == job.get("order_id") and t.get("status") in ("OFFERED","ACCEPTED","IN_PROGRESS") for t in tasks):
+        if job.get("order_id") in active_order_ids:
             continue
 
         jlat, jlng = job.get("pickup_lat"), job.get("pickup_lng")
         if jlat is None or jlng is None:
             continue
         jlat = float(jlat); jlng = float(jlng)
+        mps = speeds.speed_mps(jlat, jlng, ts)
 
-        candidate_drivers = []
-        if h3_index is not None and h3_index._h3_available:
-            # Expand rings until we have enough candidates (k_prime) or we hit ring cap
-            for ring in range(0, 6):
-                candidate_drivers = h3_index.query_ring(jlat, jlng, ring)
-                if len(candidate_drivers) >= k_prime or ring == 5:
-                    break
-        if not candidate_drivers:
+        if index is not None:
+            candidate_drivers = [
+                d for d in index.query_nearby(jlat, jlng, min_count=k_prime, max_k=max_ring)
+                if d.get("driver_id") in known_ids
+            ]
+        else:
             candidate_drivers = drivers
 
         scored = []
         for d in candidate_drivers:
             if d.get("status") != "IDLE":
                 continue
+            if d.get("driver_id") in busy_driver_ids:
+                continue
             elig = d.get("eligibility", {}) or {}
             if not (elig.get("insurance_verified") and elig.get("registration_verified")):
                 continue
@@ -74,7 +131,7 @@ def generate_candidates_topk(snapshot: dict, *, k_prime: int = 100, k: int = 20)
             dist = _haversine_m(float(dlat), float(dlng), jlat, jlng)
             if dist > radius_m:
                 continue
-            approx_eta = int(road_factor * (dist / vmax_mps))
+            approx_eta = int(dist / mps)
             if approx_eta > hard_eta_pu_max:
                 continue
             scored.append((approx_eta, d))
@@ -89,3 +146,118 @@ def generate_candidates_topk(snapshot: dict, *, k_prime: int = 100, k: int = 20)
                 "approx": True,
             })
     return edges
+
+
+class DriverColumns:
+    """Columnar view of the dispatchable drivers in a snapshot.
+
+    Only IDLE, insurance+registration verified drivers with a location and
+    no outstanding task are kept; ``order`` holds each row's index in ``snapshot["drivers"]`` so ties
+    break the same way as the scalar path.
+    """
+
+    def __init__(self, drivers: List[dict], *, busy_driver_ids=frozenset()):
+        rows = []
+        for i, d in enumerate(drivers):
+            if d.get("status") != "IDLE":
+                continue
+            if d.get("driver_id") in busy_driver_ids:
+                continue
+            elig = d.get("eligibility", {}) or {}
+            if not (elig.get("insurance_verified") and elig.get("registration_verified")):
+                continue
+            if d.get("lat") is None or d.get("lng") is None:
+                continue
+            rows.append((i, float(d["lat"]), float(d["lng"])))
+
+        self.drivers = drivers
+        self.order = np.array([r[0] for r in rows], dtype=np.int64)
+        lat = np.array([r[1] for r in rows], dtype=np.float64)
+        lng = np.array([r[2] for r in rows], dtype=np.float64)
+        self.lat_rad = np.radians(lat)
+        self.lng_rad = np.radians(lng)
+        self.cos_lat = np.cos(self.lat_rad)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+
+def _haversine_block_m(jlat_rad, jlng_rad, cols: DriverColumns):
+    """Broadcast haversine: (B,) job coords x (N,) drivers -> (B, N) meters."""
+    dphi = cols.lat_rad[None, :] - jlat_rad[:, None]
+    dl = cols.lng_rad[None, :] - jlng_rad[:, None]
+    a = np.sin(dphi / 2) ** 2 + np.cos(jlat_rad)[:, None] * cols.cos_lat[None, :] * np.sin(dl / 2) ** 2
+    return 2 * _EARTH_R_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _generate_candidates_numpy(snapshot: dict, *, k_prime: int = 100, k: int = 20) -> List[Dict]:
+    """Columnar candidate generation.
+
+    Pickup coordinates are processed in blocks against every dispatchable
+    driver at once; per-job top-K uses ``argpartition`` on a composite
+    (eta, snapshot order) key so results match the scalar path exactly.
+    """
+    params = snapshot.get("params", {}) or {}
+    radius_m = int(params.get("radius_meters", 6000))
+    hard_eta_pu_max = int(params.get("hard_pickup_eta_s_max", 900))
+    top = max(0, min(k_prime, k))
+
+    drivers = snapshot.get("drivers", []) or []
+    jobs = snapshot.get("jobs", []) or []
+    lookups = task_lookups(snapshot)
+    active_order_ids = lookups["active_order_ids"]
+
+    open_jobs = []
+    for job in jobs:
+        if job.get("state") not in _DISPATCHABLE_JOB_STATES:
+            continue
+        if job.get("order_id") in active_order_ids:
+            continue
+        if job.get("pickup_lat") is None or job.get("pickup_lng") is None:
+            continue
+        open_jobs.append(job)
+
+    cols = DriverColumns(drivers, busy_driver_ids=lookups["busy_driver_ids"])
+    n = len(cols)
+    if not open_jobs or n == 0 or top == 0:
+        return []
+
+    jlat = np.array([float(j["pickup_lat"]) for j in open_jobs], dtype=np.float64)
+    jlng = np.array([float(j["pickup_lng"]) for j in open_jobs], dtype=np.float64)
+    jmps = speed_model().speeds_mps(jlat, jlng, _snapshot_ts(snapshot))
+    jlat, jlng = np.radians(jlat), np.radians(jlng)
+
+    sentinel = np.iinfo(np.int64).max
+    stride = np.int64(len(drivers) + 1)
+    kk = min(top, n)
+    block = max(1, _BLOCK_CELLS // n)
+
+    edges: List[Dict] = []
+    for start in range(0, len(open_jobs), block):
+        stop = min(start + block, len(open_jobs))
+        dist = _haversine_block_m(jlat[start:stop], jlng[start:stop], cols)
+        eta = np.trunc(dist / jmps[start:stop, None]).astype(np.int64)
+        ok = (dist <= radius_m) & (eta <= hard_eta_pu_max)
+        key = np.where(ok, eta * stride + cols.order[None, :], sentinel)
+
+        if kk < n:
+            part = np.argpartition(key, kk - 1, axis=1)[:, :kk]
+        else:
+            part = np.broadcast_to(np.arange(n), key.shape)
+        part_keys = np.take_along_axis(key, part, axis=1)
+        ranked = np.take_along_axis(part, np.argsort(part_keys, axis=1), axis=1)
+
+        for r in range(stop - start):
+            job = open_jobs[start + r]
+            for c in ranked[r]:
+                if not ok[r, c]:
+                    break
+                d = drivers[cols.order[c]]
+                edges.append({
+                    "driver_id": d["driver_id"],
+                    "job_id": job["job_id"],
+                    "eta_pu_s": int(eta[r, c]),
+                    "eta_drop_s": int(job.get("approx_eta_drop_s", 600)),
+                    "approx": True,
+                })
+    return edges
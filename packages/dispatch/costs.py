@@ -1,16 +1,30 @@
 from __future__ import annotations
-from typing import Tuple, Dict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
 from packages.predictions.acceptance import p_accept
+from packages.predictions.acceptance_model import acceptance_model
 
-def compute_cost(snapshot: dict, driver: dict, job: dict, eta_pu_s: int, eta_drop_s: int) -> Tuple[int, Dict]:
+_P_FAIL_DEFAULT, _EXP_RETURN_S_DEFAULT = 0.03, 600
+
+
+def _weights(snapshot: dict) -> Tuple[float, float, float, float, float, float]:
+    """(alpha, beta, gamma, rho, lambda, mu) from ``params["weights"]``."""
     params = snapshot.get("params", {}) or {}
     W = (params.get("weights") or {})
-    alpha = float(W.get("alpha_total_time", 1.0))
-    beta  = float(W.get("beta_lateness", 25.0))
-    gamma = float(W.get("gamma_deadhead", 1.0))
-    rho   = float(W.get("rho_return_risk", 1.0))
-    lam   = float(W.get("lambda_fairness", 0.0))
-    mu    = float(W.get("mu_zone", 0.0))
+    return (
+        float(W.get("alpha_total_time", 1.0)),
+        float(W.get("beta_lateness", 25.0)),
+        float(W.get("gamma_deadhead", 1.0)),
+        float(W.get("rho_return_risk", 1.0)),
+        float(W.get("lambda_fairness", 0.0)),
+        float(W.get("mu_zone", 0.0)),
+    )
+
+
+def compute_cost(snapshot: dict, driver: dict, job: dict, eta_pu_s: int, eta_drop_s: int) -> Tuple[int, Dict]:
+    alpha, beta, gamma, rho, lam, mu = _weights(snapshot)
 
     now_ms = int(snapshot.get("ts_ms", 0))
     ready_ms = int(job.get("ready_at_ms", now_ms))
@@ -23,7 +37,7 @@ def compute_cost(snapshot: dict, driver: dict, job: dict, eta_pu_s: int, eta_dro
     finish_ms = now_ms + total_time_s * 1000
     lateness_s = max(0.0, (finish_ms - deadline_ms) / 1000.0)
 
-    p_fail, exp_return_s = 0.03, 600
+    p_fail, exp_return_s = _P_FAIL_DEFAULT, _EXP_RETURN_S_DEFAULT
     for r in ((snapshot.get("predictions", {}) or {}).get("id_fail_risk", []) or []):
         if r.get("driver_id") == driver.get("driver_id") and r.get("order_id") == job.get("order_id"):
             p_fail = float(r.get("p_fail", p_fail))
@@ -37,4 +51,93 @@ def compute_cost(snapshot: dict, driver: dict, job: dict, eta_pu_s: int, eta_dro
     base = alpha*total_time_s + beta*lateness_s + gamma*eta_pu_s + rho*risk_pen + lam*fairness_pen + mu*zone_pen
     pacc = p_accept(driver, job, eta_pu_s=eta_pu_s, total_trip_s=total_time_s)
     cost = int(base / max(1e-3, pacc))
-    return cost, {"total_time_s": total_time_s, "lateness_s": lateness_s, "p_accept": pacc, "risk_pen": risk_pen}
+    return cost, {"eta_pu_s": eta_pu_s, "total_time_s": total_time_s, "lateness_s": lateness_s, "p_accept": pacc, "risk_pen": risk_pen}
+
+
+def risk_index(snapshot: dict) -> Dict[Tuple[str, str], Tuple[float, int]]:
+    """(driver_id, order_id) -> (p_fail, expected_return_cost_s); first row wins."""
+    out: Dict[Tuple[str, str], Tuple[float, int]] = {}
+    for r in ((snapshot.get("predictions", {}) or {}).get("id_fail_risk", []) or []):
+        key = (r.get("driver_id"), r.get("order_id"))
+        if key not in out:
+            out[key] = (
+                float(r.get("p_fail", _P_FAIL_DEFAULT)),
+                int(r.get("expected_return_cost_s", _EXP_RETURN_S_DEFAULT)),
+            )
+    return out
+
+
+def compute_costs_batch(snapshot: dict, edges: List[dict]) -> List[dict]:
+    """``compute_cost`` for every edge at once; sets ``cost``/``debug`` in place.
+
+    Weights are parsed once, id-fail predictions are indexed by
+    (driver_id, order_id), and lateness, risk, fairness and p_accept are
+    evaluated over NumPy arrays, with p_accept from the current published
+    acceptance model (``acceptance_model``; the ``p_accept`` heuristic until
+    one is trained).  Edges whose driver or job is not in the
+    snapshot are left unscored, as in the per-edge loop.
+    """
+    drv_by_id = {d["driver_id"]: d for d in (snapshot.get("drivers", []) or [])}
+    job_by_id = {j["job_id"]: j for j in (snapshot.get("jobs", []) or [])}
+    scored = [
+        (e, drv_by_id[e["driver_id"]], job_by_id[e["job_id"]])
+        for e in edges
+        if e.get("driver_id") in drv_by_id and e.get("job_id") in job_by_id
+    ]
+    if not scored:
+        return edges
+
+    alpha, beta, gamma, rho, lam, mu = _weights(snapshot)
+    risk = risk_index(snapshot)
+    now_ms = int(snapshot.get("ts_ms", 0))
+    n = len(scored)
+    eta_pu = np.empty(n, dtype=np.int64)
+    eta_drop = np.empty(n, dtype=np.int64)
+    ready_ms = np.empty(n, dtype=np.int64)
+    deadline_ms = np.empty(n, dtype=np.int64)
+    p_fail = np.empty(n, dtype=np.float64)
+    exp_return = np.empty(n, dtype=np.int64)
+    fairness = np.empty(n, dtype=np.float64)
+    zone_pen = np.empty(n, dtype=np.float64)
+    accept_rate = np.empty(n, dtype=np.float64)
+    cancel_rate = np.empty(n, dtype=np.float64)
+    timeouts = np.empty(n, dtype=np.int64)
+    payout = np.empty(n, dtype=np.int64)
+    default_risk = (_P_FAIL_DEFAULT, _EXP_RETURN_S_DEFAULT)
+    for i, (e, d, j) in enumerate(scored):
+        m = d.get("metrics") or {}
+        eta_pu[i] = int(e["eta_pu_s"])
+        eta_drop[i] = int(e["eta_drop_s"])
+        ready_ms[i] = int(j.get("ready_at_ms", now_ms))
+        deadline_ms[i] = int(j.get("deadline_ms", now_ms + 30_000))
+        p_fail[i], exp_return[i] = risk.get((d.get("driver_id"), j.get("order_id")), default_risk)
+        fairness[i] = float(m.get("fairness_penalty", 0.0))
+        zone_pen[i] = 1.0 if (d.get("zone_id") and j.get("zone_id") and d["zone_id"] != j["zone_id"]) else 0.0
+        accept_rate[i] = float(m.get("accept_rate_7d", 0.6))
+        cancel_rate[i] = float(m.get("cancel_rate_7d", 0.05))
+        timeouts[i] = int(m.get("recent_timeouts", 0))
+        payout[i] = int((j.get("pricing") or {}).get("payout_cents_est", 1000))
+
+    arrive_pu_ms = now_ms + eta_pu * 1000
+    wait_pu_s = np.maximum(0.0, (ready_ms - arrive_pu_ms) / 1000.0)
+    total_time_s = eta_pu + wait_pu_s.astype(np.int64) + eta_drop
+    finish_ms = now_ms + total_time_s * 1000
+    lateness_s = np.maximum(0.0, (finish_ms - deadline_ms) / 1000.0)
+    risk_pen = p_fail * exp_return
+
+    base = alpha*total_time_s + beta*lateness_s + gamma*eta_pu + rho*risk_pen + lam*fairness + mu*zone_pen
+    pacc = acceptance_model().predict_batch(
+        accept_rate, cancel_rate, timeouts, payout, eta_pu_s=eta_pu, total_trip_s=total_time_s,
+    )
+    cost = np.trunc(base / np.maximum(1e-3, pacc)).astype(np.int64)
+
+    for i, (e, _, _) in enumerate(scored):
+        e["cost"] = int(cost[i])
+        e["debug"] = {
+            "eta_pu_s": int(eta_pu[i]),
+            "total_time_s": int(total_time_s[i]),
+            "lateness_s": float(lateness_s[i]),
+            "p_accept": float(pacc[i]),
+            "risk_pen": float(risk_pen[i]),
+        }
+    return edges
@@ -1,12 +1,91 @@
 from __future__ import annotations
-from typing import List, Dict
+from typing import List, Dict, Tuple, Iterable
 from packages.router.router import Router
+from packages.router.store_tables import store_travel_times
+
+# The in-process road graph is too slow for the FAST tick; store tables
+# built from it still serve the store legs.
+_router = Router(local_graph=False)
+_store_tables = store_travel_times()
+
+# Points per table request; OSRM's default --max-table-size is 100.
+MATRIX_MAX_POINTS = 100
+
+LatLng = Tuple[float, float]
+
+
+def route_cache_stats() -> Dict:
+    """Counters of the router cache used for ETA refinement."""
+    return _router.cache_stats()
+
+
+def _pt(lat, lng) -> LatLng:
+    return (round(float(lat), 5), round(float(lng), 5))
+
+
+def _chunks(seq: List, n: int) -> Iterable[List]:
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+def _legs_via_matrix(pairs: Iterable[Tuple[LatLng, LatLng]], *, max_points: int | None = None) -> Dict[Tuple[LatLng, LatLng], int]:
+    """Travel times for (src, dst) pairs using a few ``Router.matrix`` calls.
+
+    Unique sources and destinations are sliced into blocks of
+    ``max_points // 2``; each (source block, destination block) that holds
+    at least one requested pair becomes one sources x destinations matrix
+    (a single table request with OSRM), and the needed cells are scattered
+    back into a dict.
+    """
+    wanted = set(pairs)
+    if not wanted:
+        return {}
+    srcs = sorted({s for s, _ in wanted})
+    dsts = sorted({d for _, d in wanted})
+    half = max(1, (max_points or MATRIX_MAX_POINTS) // 2)
+    s_blocks = list(_chunks(srcs, half))
+    d_blocks = list(_chunks(dsts, half))
+    s_pos = {p: (b, i) for b, blk in enumerate(s_blocks) for i, p in enumerate(blk)}
+    d_pos = {p: (b, i) for b, blk in enumerate(d_blocks) for i, p in enumerate(blk)}
+
+    by_block: Dict[Tuple[int, int], List[Tuple[LatLng, LatLng]]] = {}
+    for s, d in wanted:
+        by_block.setdefault((s_pos[s][0], d_pos[d][0]), []).append((s, d))
+
+    out: Dict[Tuple[LatLng, LatLng], int] = {}
+    for (sb, db), needed in sorted(by_block.items()):
+        s_block, d_block = s_blocks[sb], d_blocks[db]
+        matrix = _router.matrix(list(s_block), list(d_block))
+        for s, d in needed:
+            out[(s, d)] = int(matrix[s_pos[s][1]][d_pos[d][1]])
+    return out
+
+
+def _legs_via_store_tables(pairs: Dict[Tuple[LatLng, LatLng], str], *, store_is_src: bool) -> Dict[Tuple[LatLng, LatLng], int]:
+    """Legs the precomputed store tables can answer; ``pairs`` maps leg -> store_id."""
+    if not pairs or not _store_tables.loaded:
+        return {}
+    keys = list(pairs)
+    store_pts = [k[0] if store_is_src else k[1] for k in keys]
+    other_pts = [k[1] if store_is_src else k[0] for k in keys]
+    t = _store_tables.lookup_many(
+        [pairs[k] for k in keys],
+        [p[0] for p in store_pts], [p[1] for p in store_pts],
+        [p[0] for p in other_pts], [p[1] for p in other_pts],
+    )
+    return {k: int(v) for k, v in zip(keys, t.tolist()) if v >= 0}
 
-_router = Router()
 
 def refine_edges_with_router(snapshot: dict, edges: List[Dict]) -> List[Dict]:
     """Replace approximate eta_pu_s / eta_drop_s using Router for top-K edges.
 
+    Driver->pickup and pickup->drop legs are collected over all edges and
+    deduplicated first.  Legs touching a store are answered from the
+    precomputed store travel-time tables when those are published; the
+    rest are fetched as a handful of sources x destinations matrices (table
+    requests with OSRM, one vectorized pass with haversine) instead of two
+    route lookups per edge.
+
     Expects:
       - driver: lat/lng on snapshot['drivers']
       - job: pickup_lat/lng and drop_lat/lng on snapshot['jobs']
@@ -14,6 +93,9 @@ def refine_edges_with_router(snapshot: dict, edges: List[Dict]) -> List[Dict]:
     drv_by_id = {d["driver_id"]: d for d in (snapshot.get("drivers") or [])}
     job_by_id = {j["job_id"]: j for j in (snapshot.get("jobs") or [])}
 
+    plan = []
+    pu_pairs: Dict[Tuple[LatLng, LatLng], str] = {}
+    drop_pairs: Dict[Tuple[LatLng, LatLng], str] = {}
     for e in edges:
         d = drv_by_id.get(e.get("driver_id"))
         j = job_by_id.get(e.get("job_id"))
@@ -24,11 +106,21 @@ def refine_edges_with_router(snapshot: dict, edges: List[Dict]) -> List[Dict]:
         dplat, dplng = j.get("drop_lat"), j.get("drop_lng")
         if None in (dlat, dlng, plat, plng, dplat, dplng):
             continue
+        drv_pt, pu_pt, drop_pt = _pt(dlat, dlng), _pt(plat, plng), _pt(dplat, dplng)
+        pu_pairs[(drv_pt, pu_pt)] = j.get("store_id")
+        drop_pairs[(pu_pt, drop_pt)] = j.get("store_id")
+        plan.append((e, (drv_pt, pu_pt), (pu_pt, drop_pt)))
+
+    if not plan:
+        return edges
 
-        eta_pu = _router.route_time_latlng((float(dlat), float(dlng)), (float(plat), float(plng)))
-        eta_drop = _router.route_time_latlng((float(plat), float(plng)), (float(dplat), float(dplng)))
+    pu_t = _legs_via_store_tables(pu_pairs, store_is_src=False)
+    pu_t.update(_legs_via_matrix(p for p in pu_pairs if p not in pu_t))
+    drop_t = _legs_via_store_tables(drop_pairs, store_is_src=True)
+    drop_t.update(_legs_via_matrix(p for p in drop_pairs if p not in drop_t))
 
-        e["eta_pu_s"] = int(eta_pu)
-        e["eta_drop_s"] = int(eta_drop)
+    for e, pu_key, drop_key in plan:
+        e["eta_pu_s"] = int(pu_t[pu_key])
+        e["eta_drop_s"] = int(drop_t[drop_key])
         e["approx"] = False
     return edges
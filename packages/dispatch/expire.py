@@ -1,91 +1,107 @@
 from __future__ import annotations
 import time
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, Optional
+from sqlalchemy import BigInteger, case, cast, func, select, text, update
 from sqlalchemy.orm import Session
 
 from packages.db.models import DeliveryTask, OfferLog
-from packages.dossier.writer import emit_order_event
+from packages.dossier.writer import emit_order_events_bulk
 
-from packages.dossier.writer import emit_order_event
+_MAX_PAGES = 100  # safety stop: 100 pages of `limit` tasks per sweep
 
 def _try_pg_advisory_lock(db: Session, key: int = 9001001) -> bool:
     """Best-effort Postgres advisory lock so only one sweeper runs.
 
-    Returns True if lock acquired or DB isn't Postgres.
+    Transaction-scoped: held until the caller commits or rolls back, so it
+    covers every page of the sweep and the commit itself.  Returns True if
+    the lock was acquired or the DB isn't Postgres.
     """
-    try:
-        res = db.execute("SELECT pg_try_advisory_lock(:k)", {"k": key}).scalar()
-        return bool(res)
-    except Exception:
-        # Not Postgres or not permitted; proceed without lock.
+    if db.get_bind().dialect.name != "postgresql":
         return True
+    return bool(db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": key}).scalar())
 
-def _pg_advisory_unlock(db: Session, key: int = 9001001) -> None:
-    try:
-        db.execute("SELECT pg_advisory_unlock(:k)", {"k": key})
-    except Exception:
-        pass
+def _created_ms(db: Session):
+    """SQL expression for OfferLog.created_at in epoch milliseconds (None if unsupported)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", OfferLog.created_at) * 1000, BigInteger)
+    if dialect == "sqlite":
+        return cast((func.julianday(OfferLog.created_at) - 2440587.5) * 86400000.0, BigInteger)
+    return None
 
 def expire_offers(db: Session, *, now_ms: Optional[int] = None, limit: int = 500) -> Dict:
     """Expire OFFERED tasks past offer_expires_at and mark OfferLog as TIMEOUT.
 
+    Works in pages of *limit* tasks until nothing expired is left: each page
+    is one ``UPDATE delivery_tasks ... RETURNING`` (rows picked with
+    ``FOR UPDATE SKIP LOCKED`` on Postgres), one UPDATE of the pages'
+    untouched offer logs, and one bulk insert of TASK_EXPIRED events.
+    The caller commits.
+
     This should be run periodically (e.g. every 10-30 seconds) by a scheduler or a Cloud Run job.
     """
     now_ms = now_ms or int(time.time() * 1000)
     now_dt = datetime.fromtimestamp(now_ms / 1000.0, tz=timezone.utc)
 
     if not _try_pg_advisory_lock(db):
-        return {"expired_tasks": 0, "updated_offer_logs": 0, "skipped": True}
+        return {"expired_tasks": 0, "updated_offer_logs": 0, "pages": 0, "skipped": True}
 
-    try:
-        q = (
-            db.query(DeliveryTask)
-            .filter(DeliveryTask.status == "OFFERED")
-            .filter(DeliveryTask.offer_expires_at.isnot(None))
-            .filter(DeliveryTask.offer_expires_at < now_dt)
-        )
-        # Avoid concurrent sweepers expiring the same rows (Postgres supports SKIP LOCKED).
-        try:
-            q = q.with_for_update(skip_locked=True)
-        except Exception:
-            pass
-        tasks = q.limit(limit).all()
-    finally:
-        _pg_advisory_unlock(db)
+    created_ms = _created_ms(db)
+    latency = None
+    if created_ms is not None:
+        latency = case((created_ms > now_ms, 0), else_=now_ms - created_ms)
 
     expired = 0
     updated_logs = 0
-    for t in tasks:
-        # mark task expired
-        t.status = "EXPIRED"
-        expired += 1
-
-        emit_order_event(
-            db,
-            order_id=t.order_id,
-            actor_type="system",
-            actor_id="dispatch",
-            event_type="TASK_EXPIRED",
-            payload={"task_id": t.id, "driver_id": t.offered_to_driver_id, "expired_at": now_dt.isoformat()},
+    pages = 0
+    while pages < _MAX_PAGES:
+        page = (
+            select(DeliveryTask.id)
+            .where(DeliveryTask.status == "OFFERED")
+            .where(DeliveryTask.offer_expires_at.isnot(None))
+            .where(DeliveryTask.offer_expires_at < now_dt)
+            .order_by(DeliveryTask.offer_expires_at)
+            .limit(limit)
+            # Avoid concurrent sweepers expiring the same rows (Postgres supports SKIP LOCKED).
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
         )
+        rows = db.execute(
+            update(DeliveryTask)
+            .where(DeliveryTask.id.in_(page))
+            .values(status="EXPIRED")
+            .returning(DeliveryTask.id, DeliveryTask.order_id, DeliveryTask.offered_to_driver_id),
+            execution_options={"synchronize_session": False},
+        ).all()
+        if not rows:
+            break
+        pages += 1
+        expired += len(rows)
 
         # best-effort: mark offer log outcome = TIMEOUT
-        log = (
-            db.query(OfferLog)
-            .filter(OfferLog.task_id == t.id)
-            .order_by(OfferLog.created_at.desc())
-            .first()
-        )
-        if log and not log.outcome:
-            log.outcome = "TIMEOUT"
-            log.outcome_ms = now_ms
-            # approximate latency if we can parse created_at
-            try:
-                created_ms = int(log.created_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
-                log.response_latency_ms = max(0, now_ms - created_ms)
-            except Exception:
-                pass
-            updated_logs += 1
+        values = {"outcome": "TIMEOUT", "outcome_ms": now_ms}
+        if latency is not None:
+            values["response_latency_ms"] = latency
+        updated_logs += db.execute(
+            update(OfferLog)
+            .where(OfferLog.task_id.in_([r.id for r in rows]))
+            .where(OfferLog.outcome.is_(None))
+            .values(**values),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+
+        emit_order_events_bulk(db, [
+            {
+                "order_id": r.order_id,
+                "actor_type": "system",
+                "actor_id": "dispatch",
+                "event_type": "TASK_EXPIRED",
+                "payload": {"task_id": r.id, "driver_id": r.offered_to_driver_id, "expired_at": now_dt.isoformat()},
+            }
+            for r in rows
+        ])
+        if len(rows) < limit:
+            break
 
-    return {"expired_tasks": expired, "updated_offer_logs": updated_logs}
+    return {"expired_tasks": expired, "updated_offer_logs": updated_logs, "pages": pages}
@@ -0,0 +1,43 @@
+"""Hash lookups over a snapshot's active tasks.
+
+Candidate generation, the batch loop and the solver all need "does this
+order already have a live task?" and "does this driver already hold an
+offer?".  Scanning ``snapshot["tasks"]`` for every job/driver makes those
+stages quadratic in open work, so the snapshot carries these prebuilt under
+``snapshot["lookups"]``.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Set
+
+ACTIVE_TASK_STATUSES = ("OFFERED", "ACCEPTED", "IN_PROGRESS")
+
+
+def build_task_lookups(tasks: Iterable[dict]) -> Dict:
+    """Index active tasks by order and by driver in one pass."""
+    active_order_ids: Set[str] = set()
+    busy_driver_ids: Set[str] = set()
+    tasks_by_driver: Dict[str, List[dict]] = {}
+    for t in tasks:
+        if t.get("status") not in ACTIVE_TASK_STATUSES:
+            continue
+        if t.get("order_id") is not None:
+            active_order_ids.add(t["order_id"])
+        for did in {t.get("offered_to_driver_id"), t.get("driver_id")}:
+            if did is None:
+                continue
+            busy_driver_ids.add(did)
+            tasks_by_driver.setdefault(did, []).append(t)
+    return {
+        "active_order_ids": active_order_ids,
+        "busy_driver_ids": busy_driver_ids,
+        "tasks_by_driver": tasks_by_driver,
+    }
+
+
+def task_lookups(snapshot: dict) -> Dict:
+    """Return ``snapshot["lookups"]``, building (and caching) it if missing."""
+    lookups = snapshot.get("lookups")
+    if lookups is None:
+        lookups = snapshot["lookups"] = build_task_lookups(snapshot.get("tasks", []) or [])
+    return lookups
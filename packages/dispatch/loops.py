@@ -1,12 +1,31 @@
 from __future__ import annotations
+import threading
 from packages.dispatch.candidates import generate_candidates_topk
 from packages.dispatch.eta import refine_edges_with_router
-from packages.dispatch.costs import compute_cost
-from packages.dispatch.solver_mcf import solve_min_cost_flow
-from packages.dispatch.offers import create_offer
+from packages.dispatch.costs import compute_costs_batch
+from packages.dispatch.solver_mcf import AssignmentSolver
+from packages.dispatch.offers import create_offers_bulk
 from packages.db.session import SessionLocal
 
-def run_fast_tick(snapshot: dict) -> dict:
+# One solver per region: ticks for different regions (API and workers)
+# run concurrently and must not share ``last_stats`` or the thread pool.
+_assignments: dict[str, tuple[AssignmentSolver, threading.Lock]] = {}
+_assignments_lock = threading.Lock()
+
+
+def _assignment_for(region_id: str | None) -> tuple[AssignmentSolver, threading.Lock]:
+    key = region_id or ""
+    with _assignments_lock:
+        entry = _assignments.get(key)
+        if entry is None:
+            entry = _assignments[key] = (AssignmentSolver(), threading.Lock())
+        return entry
+
+def plan_fast_tick(snapshot: dict) -> tuple[list, list]:
+    """DB-free part of the FAST tick: candidates -> ETAs -> costs -> matching.
+
+    Returns (edges, matches).
+    """
     drivers = snapshot.get("drivers", []) or []
     jobs = snapshot.get("jobs", []) or []
 
@@ -19,38 +38,58 @@ def run_fast_tick(snapshot: dict) -> dict:
     # Replace approximate ETAs with router-derived ETAs for these top-K edges
     edges = refine_edges_with_router(snapshot, edges)
 
-    job_by_id = {j["job_id"]: j for j in jobs}
-    drv_by_id = {d["driver_id"]: d for d in drivers}
+    edges = compute_costs_batch(snapshot, edges)
+
+    solver, lock = _assignment_for(snapshot.get("region_id"))
+    with lock:
+        matches = solver.solve(drivers, jobs, edges)
+    return edges, matches
 
+
+def run_fast_tick(snapshot: dict) -> dict:
+    jobs = snapshot.get("jobs", []) or []
+    job_by_id = {j["job_id"]: j for j in jobs}
+    drv_by_id = {d["driver_id"]: d for d in (snapshot.get("drivers", []) or [])}
+    edges, matches = plan_fast_tick(snapshot)
+    # First edge per (driver, job) pair, as the matcher saw it.
+    debug_by_pair = {}
     for e in edges:
-        d = drv_by_id.get(e["driver_id"])
-        j = job_by_id.get(e["job_id"])
-        if not d or not j:
-            continue
-        c, dbg = compute_cost(snapshot, d, j, e["eta_pu_s"], e["eta_drop_s"])
-        e["cost"] = c
-        e["debug"] = dbg
+        debug_by_pair.setdefault((e.get("driver_id"), e.get("job_id")), e.get("debug"))
 
-    matches = solve_min_cost_flow(drivers, jobs, edges)
+    specs, costs = [], []
+    for m in matches:
+        job = job_by_id.get(m["job_id"])
+        if not job:
+            continue
+        specs.append({
+            "order_id": job["order_id"],
+            "driver_id": m["driver_id"],
+            "edge_debug": debug_by_pair.get((m["driver_id"], m["job_id"])),
+            "driver": drv_by_id.get(m["driver_id"]),
+            "job": job,
+        })
+        costs.append(m.get("cost"))
 
-    offers = []
     db = SessionLocal()
     try:
-        for m in matches:
-            job = job_by_id.get(m["job_id"])
-            if not job:
-                continue
-            task = create_offer(
-                db,
-                snapshot=snapshot,
-                order_id=job["order_id"],
-                driver_id=m["driver_id"],
-                offer_ttl_s=int((snapshot.get("params", {}) or {}).get("offer_ttl_s", 30)),
-                edge_debug=(next((e.get("debug") for e in edges if e.get("driver_id")==m["driver_id"] and e.get("job_id")==m["job_id"]), None)),
-            )
-            offers.append({"task_id": task.id, "order_id": job["order_id"], "driver_id": m["driver_id"], "cost": m.get("cost")})
+        created = create_offers_bulk(
+            db,
+            snapshot=snapshot,
+            offers=specs,
+            offer_ttl_s=int((snapshot.get("params", {}) or {}).get("offer_ttl_s", 30)),
+        )
         db.commit()
     finally:
         db.close()
+    offers = [
+        {"task_id": t["task_id"], "order_id": t["order_id"], "driver_id": t["driver_id"], "cost": cost}
+        for t, cost in zip(created, costs)
+    ]
 
-    return {"offers": offers, "edges_considered": len(edges), "matches": len(matches)}
+    solver, lock = _assignment_for(snapshot.get("region_id"))
+    with lock:
+        assignment = solver.summary()
+    return {
+        "offers": offers, "edges_considered": len(edges), "matches": len(matches),
+        "assignment": assignment,
+    }
@@ -1,10 +1,16 @@
 from __future__ import annotations
+import uuid
 from datetime import datetime, timedelta, timezone
+from typing import List
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from packages.db.models import DeliveryTask, OfferLog
-from packages.dossier.writer import emit_order_event
+from packages.dossier.writer import emit_order_event, emit_order_events_bulk
+from packages.predictions.acceptance import acceptance_inputs
+from packages.predictions.acceptance_model import acceptance_model
 
-def create_offer(db: Session, *, snapshot: dict, order_id: str, driver_id: str, offer_ttl_s: int, edge_debug: dict | None = None) -> DeliveryTask:
+def create_offer(db: Session, *, snapshot: dict, order_id: str, driver_id: str, offer_ttl_s: int, edge_debug: dict | None = None,
+                 driver: dict | None = None, job: dict | None = None) -> DeliveryTask:
     import uuid
     task_id = f"task_{uuid.uuid4().hex}"
     task = DeliveryTask(
@@ -23,7 +29,8 @@ def create_offer(db: Session, *, snapshot: dict, order_id: str, driver_id: str,
         task_id=task_id,
         order_id=order_id,
         driver_id=driver_id,
-        features_json=_mk_offer_features(snapshot=snapshot, driver_id=driver_id, order_id=order_id, edge_debug=edge_debug),
+        features_json=_mk_offer_features(snapshot=snapshot, driver_id=driver_id, order_id=order_id, edge_debug=edge_debug,
+                                         driver=driver, job=job),
     )
     db.add(offer_log)
     emit_order_event(db, order_id=order_id, actor_type="system", actor_id="dispatch", event_type="TASK_OFFERED",
@@ -31,14 +38,69 @@ def create_offer(db: Session, *, snapshot: dict, order_id: str, driver_id: str,
     return task
 
 
-def _mk_offer_features(*, snapshot: dict, driver_id: str, order_id: str, edge_debug: dict | None) -> dict:
+def create_offers_bulk(db: Session, *, snapshot: dict, offers: List[dict], offer_ttl_s: int) -> List[dict]:
+    """``create_offer`` for many matches with a fixed number of round trips.
+
+    Each entry of *offers* holds ``order_id``, ``driver_id`` and optionally
+    ``edge_debug``, ``driver`` and ``job``.  All task, offer-log and
+    TASK_OFFERED event rows are built in memory and written with one
+    executemany INSERT per table (event hash chains come from a single
+    prefetch, see ``emit_order_events_bulk``); the caller commits.
+
+    Returns ``{"task_id", "order_id", "driver_id", "expires_at"}`` per offer,
+    in input order.
+    """
+    if not offers:
+        return []
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=offer_ttl_s)
+    tasks, logs, events, out = [], [], [], []
+    for o in offers:
+        task_id = f"task_{uuid.uuid4().hex}"
+        order_id, driver_id = o["order_id"], o["driver_id"]
+        tasks.append({
+            "id": task_id,
+            "order_id": order_id,
+            "status": "OFFERED",
+            "offered_to_driver_id": driver_id,
+            "offer_expires_at": expires_at,
+            "route_json": {"type": "DELIVERY"},
+        })
+        logs.append({
+            "id": f"offlog_{uuid.uuid4().hex}",
+            "task_id": task_id,
+            "order_id": order_id,
+            "driver_id": driver_id,
+            "features_json": _mk_offer_features(snapshot=snapshot, driver_id=driver_id, order_id=order_id,
+                                                edge_debug=o.get("edge_debug"), driver=o.get("driver"), job=o.get("job")),
+        })
+        events.append({
+            "order_id": order_id, "actor_type": "system", "actor_id": "dispatch", "event_type": "TASK_OFFERED",
+            "payload": {"task_id": task_id, "driver_id": driver_id, "expires_at": expires_at.isoformat()},
+        })
+        out.append({"task_id": task_id, "order_id": order_id, "driver_id": driver_id, "expires_at": expires_at})
+    db.execute(insert(DeliveryTask), tasks)
+    db.execute(insert(OfferLog), logs)
+    emit_order_events_bulk(db, events)
+    return out
+
+
+def _mk_offer_features(*, snapshot: dict, driver_id: str, order_id: str, edge_debug: dict | None,
+                       driver: dict | None = None, job: dict | None = None) -> dict:
     # Keep this stable for ML training later.
     params = snapshot.get("params", {}) or {}
-    return {
+    features = {
         "ts_ms": int(snapshot.get("ts_ms", 0)),
         "region_id": snapshot.get("region_id"),
         "weights": (params.get("weights") or {}),
         "driver_id": driver_id,
         "order_id": order_id,
         "edge_debug": edge_debug or {},
+        "acceptance_model": acceptance_model().version,
     }
+    # Raw acceptance-model inputs (``acceptance_model.training_rows`` reads these).
+    dbg = edge_debug or {}
+    if driver is not None and job is not None and dbg.get("eta_pu_s") is not None:
+        eta_pu_s = int(dbg["eta_pu_s"])
+        total_trip_s = int(dbg.get("total_time_s") or eta_pu_s + int(dbg.get("eta_drop_s", 0)))
+        features["acceptance"] = acceptance_inputs(driver, job, eta_pu_s=eta_pu_s, total_trip_s=total_trip_s)
+    return features
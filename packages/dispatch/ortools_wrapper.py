@@ -3,7 +3,14 @@
 Provides ``solve_vrp`` which attempts to use the OR-Tools Constraint
 Programming routing solver for vehicle routing.  If OR-Tools is not
 installed or the solver fails, it falls back to a fast nearest-neighbor
-heuristic so dispatch never blocks on a missing dependency.
+heuristic so dispatch never blocks on a missing dependency.  Each call
+takes its own time limit and optional warm-start routes; small
+single-driver routes are solved exactly, and ``solve_vrp_with_stats``
+reports objective, time and improvement per solve.
+
+``solve_pdptw`` plans several drivers jointly over pickup-delivery pairs
+with capacities and time windows (OR-Tools when installed, cheapest
+insertion otherwise); the batch loop's JOINT planner uses it.
 
 The legacy ``compute_route_stub`` is retained for backward compatibility.
 """
@@ -11,10 +18,22 @@ from __future__ import annotations
 
 import logging
 import math
-from typing import Dict, List, Optional
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Single-driver routes with at most this many stops are solved exactly.
+VRP_EXACT_MAX_STOPS = int(os.getenv("DISPATCH_VRP_EXACT_MAX_STOPS", "8"))
+VRP_TIME_LIMIT_S = 2.0  # per-call OR-Tools budget when the caller sets none
+# Bound on a route's drive time in the OR-Tools model; the batch loop's
+# planning horizon (``batch_loop.BATCH_HORIZON_S`` reads this).
+VRP_HORIZON_S = int(os.getenv("DISPATCH_BATCH_HORIZON_S", str(45 * 60)))
+_VRP_MIN_TIME_LIMIT_S = 0.05  # less than this is not worth starting a search
+
 # ---------------------------------------------------------------------------
 # Haversine (local copy to keep module self-contained)
 # ---------------------------------------------------------------------------
@@ -153,6 +172,105 @@ def _solve_vrp_nn(
     return assigned
 
 
+# ---------------------------------------------------------------------------
+# Route costs, exact small routes and warm starts
+# ---------------------------------------------------------------------------
+
+def _vrp_layout(num_vehicles: int) -> Tuple[List[int], int]:
+    """(start node per vehicle, node of job 0) for the ``solve_vrp`` matrix layout."""
+    if num_vehicles == 1:
+        return [0], 1
+    return list(range(num_vehicles)), num_vehicles
+
+
+def vrp_route_cost(time_matrix, start: int, nodes: Sequence[int]) -> int:
+    """Drive seconds of the open path ``start -> nodes[0] -> ... -> nodes[-1]``."""
+    total, cur = 0, start
+    for node in nodes:
+        total += int(time_matrix[cur][node])
+        cur = node
+    return total
+
+
+def _exact_route(time_matrix) -> List[int]:
+    """Shortest open path from node 0 through every other node (Held-Karp).
+
+    O(2^n * n^2); ``solve_vrp`` only uses it up to ``VRP_EXACT_MAX_STOPS``.
+    """
+    tm = np.asarray(time_matrix, dtype=np.int64)
+    n = len(tm) - 1
+    if n <= 1:
+        return list(range(1, n + 1))
+    inf = np.iinfo(np.int64).max // 4
+    cost = tm[1:, 1:]
+    # best[mask, j]: cheapest path from the start over `mask`, ending at stop j.
+    best = np.full((1 << n, n), inf, dtype=np.int64)
+    prev = np.full((1 << n, n), -1, dtype=np.int64)
+    bits = 1 << np.arange(n)
+    best[bits, np.arange(n)] = tm[0, 1:]
+    masks = np.arange(1 << n)
+    size = np.zeros(1 << n, dtype=np.int64)
+    for k in range(n):
+        size += (masks >> k) & 1
+    for layer in range(1, n):  # extend all paths over `layer` stops at once
+        m = masks[size == layer]
+        via = best[m][:, :, None] + cost[None, :, :]  # via[., j, k]: path ending at j, then stop k
+        arg = via.argmin(axis=1)
+        ext = np.take_along_axis(via, arg[:, None, :], axis=1)[:, 0, :]
+        for k in range(n):
+            sel = (m & bits[k]) == 0
+            nxt = m[sel] | bits[k]
+            best[nxt, k] = ext[sel, k]
+            prev[nxt, k] = arg[sel, k]
+    mask = (1 << n) - 1
+    j = int(best[mask].argmin())
+    order = []
+    while j >= 0:
+        order.append(j + 1)
+        mask, j = mask ^ (1 << j), int(prev[mask, j])
+    return order[::-1]
+
+
+def _seed_routes(
+    time_matrix,
+    starts: List[int],
+    first_job: int,
+    num_jobs: int,
+    initial: List[List[int]],
+) -> List[List[int]]:
+    """Complete *initial* (job indices per vehicle) into a route over every job.
+
+    Jobs that are no longer in the problem, or that appear twice, are
+    dropped; jobs the initial routes do not cover are added by cheapest
+    insertion.  Returns node routes (without start nodes).
+    """
+    seen: set = set()
+    routes: List[List[int]] = []
+    for v in range(len(starts)):
+        route = []
+        for j in initial[v] if v < len(initial) else []:
+            if 0 <= j < num_jobs and j not in seen:
+                seen.add(j)
+                route.append(first_job + j)
+        routes.append(route)
+    for j in range(num_jobs):
+        if j in seen:
+            continue
+        node = first_job + j
+        best = None
+        for v, route in enumerate(routes):
+            path = [starts[v]] + route
+            for pos in range(1, len(path) + 1):
+                before = path[pos - 1]
+                delta = int(time_matrix[before][node])
+                if pos < len(path):
+                    delta += int(time_matrix[node][path[pos]]) - int(time_matrix[before][path[pos]])
+                if best is None or delta < best[0]:
+                    best = (delta, v, pos - 1)
+        routes[best[1]].insert(best[2], node)
+    return routes
+
+
 # ---------------------------------------------------------------------------
 # OR-Tools VRP solver
 # ---------------------------------------------------------------------------
@@ -161,6 +279,10 @@ def _solve_vrp_ortools(
     drivers: List[dict],
     jobs: List[dict],
     time_matrix: List[List[int]],
+    *,
+    time_limit_s: float = VRP_TIME_LIMIT_S,
+    initial_routes: Optional[List[List[int]]] = None,
+    horizon_s: int = VRP_HORIZON_S,
 ) -> Optional[List[List[dict]]]:
     """Attempt to solve the VRP using OR-Tools RoutingModel.
 
@@ -170,6 +292,11 @@ def _solve_vrp_ortools(
     The time_matrix layout is:
       - For single-driver: index 0 = driver, indices 1..N = jobs.
       - For multi-driver: indices 0..D-1 = drivers, indices D..D+J-1 = jobs.
+
+    *initial_routes* (node indices per vehicle, covering every job) seeds
+    the search via ``ReadAssignmentFromRoutes``; the local search then only
+    has to improve on it within *time_limit_s*.  Routes are open and their
+    drive time is capped at *horizon_s*.
     """
     try:
         from ortools.constraint_solver import routing_enums_pb2, pywrapcp
@@ -183,35 +310,30 @@ def _solve_vrp_ortools(
     if num_locations < 2:
         return [[] for _ in range(num_vehicles)]
 
-    # Determine depot indices
-    if num_vehicles == 1:
-        depot = 0
-        manager = pywrapcp.RoutingIndexManager(num_locations, num_vehicles, depot)
-    else:
-        # Multi-vehicle: each driver is its own depot
-        starts = list(range(num_vehicles))
-        # All vehicles return to their own start (no explicit end depot needed;
-        # use the same start index as end for open routes).
-        ends = list(range(num_vehicles))
-        manager = pywrapcp.RoutingIndexManager(num_locations, num_vehicles, starts, ends)
-
+    # Open routes: every vehicle ends at a dummy node that is free to
+    # reach, so OR-Tools minimises the same drive time ``vrp_route_cost``
+    # measures instead of a closed tour back to the driver.
+    end = num_locations
+    starts = [0] if num_vehicles == 1 else list(range(num_vehicles))
+    manager = pywrapcp.RoutingIndexManager(num_locations + 1, num_vehicles, starts, [end] * num_vehicles)
     routing = pywrapcp.RoutingModel(manager)
 
     # Transit callback
     def time_callback(from_index, to_index):
         from_node = manager.IndexToNode(from_index)
         to_node = manager.IndexToNode(to_index)
-        return time_matrix[from_node][to_node]
+        if from_node == end or to_node == end:
+            return 0
+        return int(time_matrix[from_node][to_node])
 
     transit_callback_index = routing.RegisterTransitCallback(time_callback)
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
-    # Add time dimension to track cumulative travel time
-    max_time = 20 * 60  # 20-minute horizon in seconds
+    # Cumulative drive time, bounded by the batch planning horizon
     routing.AddDimension(
         transit_callback_index,
-        30,         # allow waiting time (slack) of up to 30 s
-        max_time,   # vehicle maximum travel time
+        0,          # no waiting: there are no time windows here
+        horizon_s,  # vehicle maximum drive time
         True,       # start cumul to zero
         "Time",
     )
@@ -231,10 +353,20 @@ def _solve_vrp_ortools(
     search_parameters.local_search_metaheuristic = (
         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
     )
-    # Time limit: keep it short so we don't block the worker
-    search_parameters.time_limit.seconds = 2
-
-    solution = routing.SolveWithParameters(search_parameters)
+    # Time limit: the caller's share of the tick budget
+    search_parameters.time_limit.FromMilliseconds(max(1, int(time_limit_s * 1000)))
+
+    solution = None
+    if initial_routes is not None:
+        routing.CloseModelWithParameters(search_parameters)
+        initial = routing.ReadAssignmentFromRoutes(initial_routes, True)
+        if initial is not None:
+            solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+        else:
+            # E.g. a seed route longer than the horizon.
+            logger.info("OR-Tools rejected the warm-start routes; solving from scratch")
+    if solution is None:
+        solution = routing.SolveWithParameters(search_parameters)
     if solution is None:
         logger.warning("OR-Tools VRP solver returned no solution")
         return None
@@ -265,10 +397,97 @@ def _solve_vrp_ortools(
 # Public API
 # ---------------------------------------------------------------------------
 
+def solve_vrp_with_stats(
+    drivers: List[dict],
+    jobs: List[dict],
+    time_matrix: List[List[int]],
+    *,
+    time_limit_s: float = VRP_TIME_LIMIT_S,
+    initial_routes: Optional[List[List[dict]]] = None,
+    horizon_s: int = VRP_HORIZON_S,
+) -> Tuple[List[List[dict]], dict]:
+    """``solve_vrp`` plus a record of how the solve went.
+
+    Single-driver problems with at most ``VRP_EXACT_MAX_STOPS`` jobs are
+    solved exactly.  Larger ones go to OR-Tools for *time_limit_s*, seeded
+    with *initial_routes* (e.g. the previous tick's plan for the same
+    drivers; jobs are matched by ``job_id``, unknown ones dropped and new
+    ones inserted cheapest-first).  Without OR-Tools, or with no time left,
+    the cheaper of the seed and the nearest-neighbor route is returned; an
+    OR-Tools result that is worse than that baseline (short budget, or
+    routes past *horizon_s*) is replaced by it.
+
+    Stats: ``engine`` (exact | ortools | warm | nn), ``stops``,
+    ``time_limit_ms``, ``ms``, ``warm``, ``initial_s`` (drive seconds of
+    the seed, or of the nearest-neighbor route without one),
+    ``objective_s`` (drive seconds of the result, open routes) and
+    ``improvement_s``.
+    """
+    t0 = time.perf_counter()
+    stats = {
+        "engine": "none", "stops": len(jobs), "time_limit_ms": round(time_limit_s * 1000.0, 1),
+        "ms": 0.0, "warm": False, "initial_s": 0, "objective_s": 0, "improvement_s": 0,
+    }
+    if not drivers or not jobs:
+        return [], stats
+
+    starts, first = _vrp_layout(len(drivers))
+
+    def cost(node_routes):
+        return sum(vrp_route_cost(time_matrix, starts[v], r) for v, r in enumerate(node_routes))
+
+    def to_jobs(node_routes):
+        return [[jobs[n - first] for n in r] for r in node_routes]
+
+    def to_nodes(job_routes):
+        index = {id(j): k for k, j in enumerate(jobs)}
+        return [[first + index[id(j)] for j in r] for r in job_routes]
+
+    seed = None
+    if initial_routes:
+        by_id = {str(j.get("job_id")): k for k, j in enumerate(jobs)}
+        initial = [[by_id.get(str(j.get("job_id")), -1) for j in r] for r in initial_routes]
+        seed = _seed_routes(time_matrix, starts, first, len(jobs), initial)
+        stats["warm"] = True
+
+    if len(drivers) == 1 and len(jobs) <= VRP_EXACT_MAX_STOPS:
+        result, engine = [[jobs[n - 1] for n in _exact_route(time_matrix)]], "exact"
+        baseline = seed if seed is not None else to_nodes(_solve_vrp_nn(drivers, jobs, time_matrix))
+    else:
+        result, engine = None, "ortools"
+        if time_limit_s >= _VRP_MIN_TIME_LIMIT_S:
+            result = _solve_vrp_ortools(
+                drivers, jobs, time_matrix, time_limit_s=time_limit_s, initial_routes=seed,
+                horizon_s=horizon_s,
+            )
+        nn = to_nodes(_solve_vrp_nn(drivers, jobs, time_matrix))
+        baseline = seed if seed is not None else nn
+        # Fallback: the seed if it beats nearest-neighbor
+        fallback, fallback_engine = (seed, "warm") if seed is not None and cost(seed) <= cost(nn) else (nn, "nn")
+        if result is None or cost(fallback) < cost(to_nodes(result)):
+            result, engine = to_jobs(fallback), fallback_engine
+
+    stats["engine"] = engine
+    stats["initial_s"] = cost(baseline)
+    stats["objective_s"] = cost(to_nodes(result))
+    stats["improvement_s"] = stats["initial_s"] - stats["objective_s"]
+    stats["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    logger.debug(
+        "solve_vrp: %s, %d stops, %.1f/%.0f ms, objective %d s (%+d s vs %s)",
+        engine, len(jobs), stats["ms"], stats["time_limit_ms"], stats["objective_s"],
+        -stats["improvement_s"], "seed" if stats["warm"] else "nearest-neighbor",
+    )
+    return result, stats
+
+
 def solve_vrp(
     drivers: List[dict],
     jobs: List[dict],
     time_matrix: List[List[int]],
+    *,
+    time_limit_s: float = VRP_TIME_LIMIT_S,
+    initial_routes: Optional[List[List[dict]]] = None,
+    horizon_s: int = VRP_HORIZON_S,
 ) -> List[List[dict]]:
     """Solve a Vehicle Routing Problem for the given drivers and jobs.
 
@@ -283,22 +502,253 @@ def solve_vrp(
         the number of drivers:
         - 1 driver:  index 0 = driver, 1..N = jobs
         - M drivers: indices 0..M-1 = drivers, M..M+N-1 = jobs
+    time_limit_s : float
+        OR-Tools search budget for this call.
+    initial_routes : list[list[dict]], optional
+        Routes to start the search from (see ``solve_vrp_with_stats``).
+    horizon_s : int
+        Longest drive time OR-Tools may plan for one route.
 
     Returns
     -------
     list[list[dict]]
         One route per driver.  Each route is an ordered list of job dicts.
     """
-    if not drivers or not jobs:
-        return []
+    routes, stats = solve_vrp_with_stats(
+        drivers, jobs, time_matrix, time_limit_s=time_limit_s, initial_routes=initial_routes,
+        horizon_s=horizon_s,
+    )
+    if routes:
+        logger.info("solve_vrp: used %s (%d routes)", stats["engine"], len(routes))
+    return routes
+
 
-    # Try OR-Tools first
-    result = _solve_vrp_ortools(drivers, jobs, time_matrix)
-    if result is not None:
-        logger.info("solve_vrp: used OR-Tools (%d routes)", len(result))
-        return result
+def solve_route_indices(
+    time_matrix: np.ndarray,
+    seed: Sequence[int] = (),
+    time_limit_s: float = VRP_TIME_LIMIT_S,
+) -> Tuple[List[int], dict]:
+    """Single-driver ``solve_vrp_with_stats`` over plain arrays.
 
-    # Fallback to nearest-neighbor
-    result = _solve_vrp_nn(drivers, jobs, time_matrix)
-    logger.info("solve_vrp: used nearest-neighbor fallback (%d routes)", len(result))
-    return result
+    ``time_matrix`` is (N+1)x(N+1) with the driver at index 0 and job k at
+    k+1; ``seed`` lists job indices in a previous visit order.  Returns the
+    job indices in visit order and the solve stats.  Inputs and outputs
+    pickle compactly, so batch planning can run this in worker processes.
+    """
+    n = len(time_matrix) - 1
+    jobs = [{"job_id": k} for k in range(n)]
+    initial = [[jobs[k] for k in seed if 0 <= k < n]] if len(seed) else None
+    routes, stats = solve_vrp_with_stats(
+        [{"driver_id": None}], jobs, np.asarray(time_matrix).tolist(),
+        time_limit_s=time_limit_s, initial_routes=initial,
+    )
+    return ([j["job_id"] for j in routes[0]] if routes else []), stats
+
+
+# ---------------------------------------------------------------------------
+# Joint pickup-and-delivery VRP with time windows
+# ---------------------------------------------------------------------------
+
+# Seconds of lateness that cost as much as one second of driving.
+PDP_LATE_WEIGHT = 5
+# Cost of leaving a job unplanned (per job, on top of its drive time).
+PDP_DROP_PENALTY = 24 * 3600
+PDP_SERVICE_S = 120  # time spent at each pickup / drop-off
+
+Stop = Tuple[str, int]  # ("pickup" | "drop", job index)
+
+
+def _pdp_nodes(num_drivers: int, job: int) -> Tuple[int, int]:
+    """Matrix indices of a job's pickup and drop-off (see ``solve_pdptw``)."""
+    return num_drivers + 2 * job, num_drivers + 2 * job + 1
+
+
+def pdp_route_cost(
+    vehicle: int,
+    stops: Sequence[Stop],
+    time_matrix: np.ndarray,
+    *,
+    ready_s: Sequence[int],
+    due_s: Sequence[int],
+    capacity: int,
+    horizon_s: int,
+    service_s: int = PDP_SERVICE_S,
+) -> Optional[Tuple[int, int]]:
+    """(drive_s, late_s) of one route from the driver's position, or None if infeasible.
+
+    Infeasible = over capacity, a drop-off before its pickup, or finishing
+    after ``horizon_s``.
+    """
+    D = len(time_matrix) - 2 * len(ready_s)
+    node, t, load, drive, late = vehicle, 0, 0, 0, 0
+    onboard = set()
+    for kind, k in stops:
+        nxt = _pdp_nodes(D, k)[0 if kind == "pickup" else 1]
+        leg = int(time_matrix[node][nxt])
+        drive += leg
+        t += leg
+        if kind == "pickup":
+            t = max(t, int(ready_s[k]))
+            load += 1
+            if load > capacity:
+                return None
+            onboard.add(k)
+        else:
+            if k not in onboard:
+                return None
+            onboard.discard(k)
+            load -= 1
+            late += max(0, t - int(due_s[k]))
+        t += service_s
+        node = nxt
+    if t > horizon_s:
+        return None
+    return drive, late
+
+
+def _solve_pdptw_insertion(
+    num_drivers: int,
+    time_matrix: np.ndarray,
+    ready_s: Sequence[int],
+    due_s: Sequence[int],
+    capacities: Sequence[int],
+    horizon_s: int,
+    service_s: int,
+) -> List[List[Stop]]:
+    """Cheapest insertion, jobs in deadline order; no improvement phase."""
+    routes: List[List[Stop]] = [[] for _ in range(num_drivers)]
+    costs = [0] * num_drivers
+
+    def cost(v, stops):
+        r = pdp_route_cost(v, stops, time_matrix, ready_s=ready_s, due_s=due_s,
+                           capacity=capacities[v], horizon_s=horizon_s, service_s=service_s)
+        return None if r is None else r[0] + PDP_LATE_WEIGHT * r[1]
+
+    for k in sorted(range(len(ready_s)), key=lambda k: (due_s[k], ready_s[k], k)):
+        best = None  # (delta, vehicle, stops)
+        for v in range(num_drivers):
+            if capacities[v] <= 0:
+                continue
+            route = routes[v]
+            for p in range(len(route) + 1):
+                with_pickup = route[:p] + [("pickup", k)] + route[p:]
+                for q in range(p + 1, len(with_pickup) + 1):
+                    stops = with_pickup[:q] + [("drop", k)] + with_pickup[q:]
+                    c = cost(v, stops)
+                    if c is not None and (best is None or c - costs[v] < best[0]):
+                        best = (c - costs[v], v, stops)
+        if best is not None and best[0] < PDP_DROP_PENALTY:
+            _, v, stops = best
+            routes[v] = stops
+            costs[v] += best[0]
+    return routes
+
+
+def _solve_pdptw_ortools(
+    num_drivers: int,
+    time_matrix: np.ndarray,
+    ready_s: Sequence[int],
+    due_s: Sequence[int],
+    capacities: Sequence[int],
+    horizon_s: int,
+    service_s: int,
+    time_limit_s: float,
+) -> Optional[List[List[Stop]]]:
+    try:
+        from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+    except ImportError:
+        return None
+
+    J = len(ready_s)
+    end = num_drivers + 2 * J  # shared open-route end: free to reach from anywhere
+    manager = pywrapcp.RoutingIndexManager(end + 1, num_drivers, list(range(num_drivers)), [end] * num_drivers)
+    routing = pywrapcp.RoutingModel(manager)
+    tm = np.asarray(time_matrix, dtype=np.int64)
+
+    def drive(from_index, to_index):
+        i, j = manager.IndexToNode(from_index), manager.IndexToNode(to_index)
+        return 0 if j == end or i == end else int(tm[i, j])
+
+    def elapsed(from_index, to_index):
+        i = manager.IndexToNode(from_index)
+        return drive(from_index, to_index) + (service_s if num_drivers <= i < end else 0)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(routing.RegisterTransitCallback(drive))
+    time_cb = routing.RegisterTransitCallback(elapsed)
+    routing.AddDimension(time_cb, horizon_s, horizon_s, True, "Time")
+    time_dim = routing.GetDimensionOrDie("Time")
+
+    def demand(index):
+        node = manager.IndexToNode(index)
+        if num_drivers <= node < end:
+            return 1 if (node - num_drivers) % 2 == 0 else -1
+        return 0
+
+    routing.AddDimensionWithVehicleCapacity(
+        routing.RegisterUnaryTransitCallback(demand), 0, [max(0, int(c)) for c in capacities], True, "Load",
+    )
+    solver = routing.solver()
+    for k in range(J):
+        p_node, d_node = _pdp_nodes(num_drivers, k)
+        p, d = manager.NodeToIndex(p_node), manager.NodeToIndex(d_node)
+        routing.AddPickupAndDelivery(p, d)
+        solver.Add(routing.VehicleVar(p) == routing.VehicleVar(d))
+        solver.Add(time_dim.CumulVar(p) <= time_dim.CumulVar(d))
+        time_dim.CumulVar(p).SetMin(min(int(ready_s[k]), horizon_s))
+        time_dim.SetCumulVarSoftUpperBound(d, max(0, int(due_s[k])), PDP_LATE_WEIGHT)
+        routing.AddDisjunction([p, d], PDP_DROP_PENALTY, 2)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.FromMilliseconds(max(1, int(time_limit_s * 1000)))
+    solution = routing.SolveWithParameters(params)
+    if solution is None:
+        logger.warning("OR-Tools PDPTW solver returned no solution")
+        return None
+
+    routes: List[List[Stop]] = []
+    for v in range(num_drivers):
+        stops: List[Stop] = []
+        index = solution.Value(routing.NextVar(routing.Start(v)))
+        while not routing.IsEnd(index):
+            node = manager.IndexToNode(index) - num_drivers
+            stops.append(("pickup" if node % 2 == 0 else "drop", node // 2))
+            index = solution.Value(routing.NextVar(index))
+        routes.append(stops)
+    return routes
+
+
+def solve_pdptw(
+    drivers: List[dict],
+    jobs: List[dict],
+    time_matrix: np.ndarray,
+    *,
+    ready_s: Sequence[int],
+    due_s: Sequence[int],
+    capacities: Sequence[int],
+    horizon_s: int,
+    service_s: int = PDP_SERVICE_S,
+    time_limit_s: float = 2.0,
+) -> Tuple[List[List[Stop]], str]:
+    """Plan all *drivers* jointly over the pickup-delivery pairs of *jobs*.
+
+    ``time_matrix`` is square over ``D + 2J`` nodes: indices 0..D-1 are the
+    drivers' positions, then job k's pickup at ``D + 2k`` and drop-off at
+    ``D + 2k + 1``.  ``ready_s`` / ``due_s`` are each job's earliest pickup
+    and target drop-off in seconds from now (drop-off windows are soft,
+    costing ``PDP_LATE_WEIGHT`` per late second); ``capacities`` is the
+    number of orders each driver can carry at once.  Routes are open (no
+    return leg), must finish within ``horizon_s``, and jobs that do not fit
+    are left out.
+
+    Returns (routes, engine): one list of ``(kind, job_index)`` stops per
+    driver, and "ortools" or "insertion".
+    """
+    if not drivers or not jobs:
+        return [[] for _ in drivers], "none"
+    args = (len(drivers), time_matrix, ready_s, due_s, capacities, horizon_s, service_s)
+    routes = _solve_pdptw_ortools(*args, time_limit_s)
+    if routes is not None:
+        return routes, "ortools"
+    return _solve_pdptw_insertion(*args), "insertion"
@@ -1,88 +1,220 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Sequence
 import time
 from sqlalchemy.orm import Session
 from packages.db.models import Driver, Order, Store, DeliveryTask, CustomerAddress
+from packages.dispatch.lookups import ACTIVE_TASK_STATUSES, build_task_lookups
+from packages.router.local_graph import ROAD_GRAPH_ID
 
 DEFAULT_PREP_S = 5 * 60
 DEFAULT_SLA_S = 45 * 60
 
+# Only drivers in these statuses can receive offers; everything else is
+# filtered out in SQL instead of being shipped to the dispatch loops.
+DISPATCH_DRIVER_STATUSES = ("IDLE",)
+DISPATCHABLE_ORDER_STATUSES = ("CREATED", "AGE_VERIFIED", "PAYMENT_AUTHORIZED", "DISPATCHING")
+
+
+def _ms(dt) -> Optional[int]:
+    return int(dt.timestamp() * 1000) if dt else None
+
+
+_DRIVER_COLUMNS = (
+    Driver.id, Driver.node_id, Driver.lat, Driver.lng, Driver.status, Driver.zone_id,
+    Driver.vehicle_verified, Driver.insurance_verified, Driver.registration_verified,
+    Driver.background_clear, Driver.training_flags_json, Driver.metrics_json, Driver.updated_at,
+)
+
+
+def _driver_dict(d, *, now_ms: int) -> Optional[Dict]:
+    """Build a driver dict from a ``_DRIVER_COLUMNS`` row (None if unlocated)."""
+    if not d.lat or not d.lng:
+        return None
+    return {
+        "driver_id": d.id,
+        "node_id": d.node_id,
+        "lat": float(d.lat),
+        "lng": float(d.lng),
+        "status": d.status,
+        "zone_id": d.zone_id,
+        "capacity": {"max_active_orders": 1, "active_orders": 0},
+        "eligibility": {
+            "vehicle_verified": bool(d.vehicle_verified),
+            "insurance_verified": bool(d.insurance_verified),
+            "registration_verified": bool(d.registration_verified),
+            "background_clear": bool(d.background_clear),
+            "training_flags": d.training_flags_json or [],
+        },
+        "metrics": d.metrics_json or {},
+        "last_update_ms": now_ms,
+    }
+
+
+def _load_drivers(
+    db: Session,
+    *,
+    now_ms: int,
+    statuses: Sequence[str],
+    zone_ids: Optional[Iterable[str]],
+) -> List[Dict]:
+    """Driver rows as dispatch dicts, selecting only the columns dispatch uses."""
+    q = (
+        db.query(*_DRIVER_COLUMNS)
+        .filter(Driver.status.in_(list(statuses)))
+        .filter(Driver.lat.isnot(None), Driver.lng.isnot(None))
+    )
+    if zone_ids is not None:
+        q = q.filter(Driver.zone_id.in_(list(zone_ids)))
+
+    drivers = []
+    for row in q:
+        d = _driver_dict(row, now_ms=now_ms)
+        if d is not None:
+            drivers.append(d)
+    return drivers
+
+
+_TASK_COLUMNS = (
+    DeliveryTask.id, DeliveryTask.order_id, DeliveryTask.status, DeliveryTask.driver_id,
+    DeliveryTask.offered_to_driver_id, DeliveryTask.offer_expires_at, DeliveryTask.updated_at,
+)
+
+
+def _task_dict(t) -> Dict:
+    return {
+        "task_id": t.id,
+        "order_id": t.order_id,
+        "status": t.status,
+        "driver_id": t.driver_id,
+        "offered_to_driver_id": t.offered_to_driver_id,
+        "offer_expires_at_ms": _ms(t.offer_expires_at),
+    }
+
+
+def _load_tasks(db: Session) -> List[Dict]:
+    q = db.query(*_TASK_COLUMNS).filter(DeliveryTask.status.in_(list(ACTIVE_TASK_STATUSES)))
+    return [_task_dict(t) for t in q]
+
+
+def _order_job(o, *, now_ms: int) -> Optional[Dict]:
+    """Build a job dict from a joined order/store/address row (None if unroutable)."""
+    if not o.store_lat or not o.store_lng or not o.addr_lat or not o.addr_lng:
+        return None
+    created_ms = _ms(o.created_at) or now_ms
+    ready_at_ms = created_ms + DEFAULT_PREP_S*1000
+    deadline_ms = created_ms + DEFAULT_SLA_S*1000
+    return {
+        "order_id": o.id,
+        "job_id": f"job_{o.id}",
+        "store_id": o.store_id,
+        "pickup_node_id": f"store_{o.store_id}",
+        "drop_node_id": f"addr_{o.address_id}",
+        "pickup_lat": float(o.store_lat),
+        "pickup_lng": float(o.store_lng),
+        "drop_lat": float(o.addr_lat),
+        "drop_lng": float(o.addr_lng),
+        "created_ms": created_ms,
+        "ready_at_ms": ready_at_ms,
+        "deadline_ms": deadline_ms,
+        "priority": 1,
+        "requires_id_check": True,
+        "return_to_store_on_refusal": True,
+        "zone_id": None,
+        "state": "PENDING_DISPATCH",
+        "pricing": {"payout_cents_est": max(500, int((o.total_cents or 0) * 0.25))},
+        "approx_eta_drop_s": 600,
+    }
+
+
+def _orders_query(db: Session, *, outer: bool = False):
+    """Orders joined to their store and drop-off address in a single query.
+
+    With ``outer=True`` orders are returned even when the store/address is
+    missing or has no coordinates (``_order_job`` then returns None).
+    """
+    q = db.query(
+        Order.id, Order.store_id, Order.address_id, Order.status, Order.created_at, Order.updated_at,
+        Order.total_cents,
+        Store.lat.label("store_lat"), Store.lng.label("store_lng"),
+        CustomerAddress.lat.label("addr_lat"), CustomerAddress.lng.label("addr_lng"),
+    )
+    if outer:
+        return (
+            q.outerjoin(Store, Store.id == Order.store_id)
+            .outerjoin(CustomerAddress, CustomerAddress.id == Order.address_id)
+        )
+    return (
+        q.join(Store, Store.id == Order.store_id)
+        .join(CustomerAddress, CustomerAddress.id == Order.address_id)
+        .filter(Store.lat.isnot(None), Store.lng.isnot(None))
+        .filter(CustomerAddress.lat.isnot(None), CustomerAddress.lng.isnot(None))
+    )
+
+
+def _load_jobs(db: Session, *, now_ms: int) -> tuple[List[Dict], int]:
+    """Return (jobs, rows_fetched) for orders needing dispatch."""
+    rows = _orders_query(db).filter(Order.status.in_(list(DISPATCHABLE_ORDER_STATUSES))).all()
+    jobs = []
+    for o in rows:
+        job = _order_job(o, now_ms=now_ms)
+        if job is not None:
+            jobs.append(job)
+    return jobs, len(rows)
+
+
 def build_dispatch_snapshot(
     db: Session,
     *,
     region_id: str,
     now_ms: int | None = None,
     horizon_s: int = 20 * 60,
+    driver_statuses: Sequence[str] = DISPATCH_DRIVER_STATUSES,
+    zone_ids: Optional[Iterable[str]] = None,
 ) -> Dict:
+    """Build the dispatch snapshot with one set-based query per entity.
+
+    Drivers are filtered by status (and optionally ``zone_ids``) in SQL,
+    orders are fetched already joined to their store and address, and
+    ``snapshot["stats"]`` records row counts and per-phase timings.
+    """
     now_ms = now_ms or int(time.time() * 1000)
+    timings_ms: Dict[str, float] = {}
+    rows: Dict[str, int] = {}
 
-    # Drivers: all in region (MVP: no region field -> include all)
-    drivers = []
-    for d in db.query(Driver).all():
-        drivers.append({
-            "driver_id": d.id,
-            "node_id": d.node_id,
-            "lat": float(d.lat) if d.lat else None,
-            "lng": float(d.lng) if d.lng else None,
-            "status": d.status,
-            "zone_id": d.zone_id,
-            "capacity": {"max_active_orders": 1, "active_orders": 0},
-            "eligibility": {
-                "vehicle_verified": bool(d.vehicle_verified),
-                "insurance_verified": bool(d.insurance_verified),
-                "registration_verified": bool(d.registration_verified),
-                "background_clear": bool(d.background_clear),
-                "training_flags": d.training_flags_json or [],
-            },
-            "metrics": d.metrics_json or {},
-            "last_update_ms": now_ms,
-        })
-
-    # Tasks (offered/accepted/in_progress)
-    tasks = []
-    for t in db.query(DeliveryTask).filter(DeliveryTask.status.in_(["OFFERED","ACCEPTED","IN_PROGRESS"])).all():
-        tasks.append({
-            "task_id": t.id,
-            "order_id": t.order_id,
-            "status": t.status,
-            "offered_to_driver_id": t.offered_to_driver_id,
-            "offer_expires_at_ms": int(t.offer_expires_at.timestamp()*1000) if t.offer_expires_at else None,
-        })
-
-    # Orders needing dispatch
-    orders = db.query(Order).filter(Order.status.in_(["CREATED","AGE_VERIFIED","PAYMENT_AUTHORIZED","DISPATCHING"])).all()
-    jobs = []
-    for o in orders:
-        store = db.get(Store, o.store_id)
-        addr = db.get(CustomerAddress, o.address_id)
-        if not store or not store.lat or not store.lng or not addr or not addr.lat or not addr.lng:
-            continue
-        created_ms = int(o.created_at.timestamp()*1000) if o.created_at else now_ms
-        ready_at_ms = created_ms + DEFAULT_PREP_S*1000
-        deadline_ms = created_ms + DEFAULT_SLA_S*1000
-
-        jobs.append({
-            "order_id": o.id,
-            "job_id": f"job_{o.id}",
-            "store_id": o.store_id,
-            "pickup_node_id": f"store_{o.store_id}",
-            "drop_node_id": f"addr_{o.address_id}",
-            "pickup_lat": float(store.lat),
-            "pickup_lng": float(store.lng),
-            "drop_lat": float(addr.lat),
-            "drop_lng": float(addr.lng),
-            "created_ms": created_ms,
-            "ready_at_ms": ready_at_ms,
-            "deadline_ms": deadline_ms,
-            "priority": 1,
-            "requires_id_check": True,
-            "return_to_store_on_refusal": True,
-            "zone_id": None,
-            "state": "PENDING_DISPATCH",
-            "pricing": {"payout_cents_est": max(500, int((o.total_cents or 0) * 0.25))},
-            "approx_eta_drop_s": 600,
-        })
+    t0 = time.perf_counter()
+    drivers = _load_drivers(db, now_ms=now_ms, statuses=driver_statuses, zone_ids=zone_ids)
+    timings_ms["drivers"] = round((time.perf_counter() - t0) * 1000, 3)
+    rows["drivers"] = len(drivers)
+
+    t0 = time.perf_counter()
+    tasks = _load_tasks(db)
+    timings_ms["tasks"] = round((time.perf_counter() - t0) * 1000, 3)
+    rows["tasks"] = len(tasks)
+
+    t0 = time.perf_counter()
+    jobs, order_rows = _load_jobs(db, now_ms=now_ms)
+    timings_ms["jobs"] = round((time.perf_counter() - t0) * 1000, 3)
+    rows["orders"] = order_rows
+    rows["jobs"] = len(jobs)
+
+    timings_ms["total"] = round(sum(timings_ms.values()), 3)
 
+    return snapshot_dict(
+        region_id=region_id, now_ms=now_ms, drivers=drivers, jobs=jobs, tasks=tasks,
+        stats={"rows": rows, "timings_ms": timings_ms},
+    )
+
+
+def snapshot_dict(
+    *,
+    region_id: str,
+    now_ms: int,
+    drivers: List[Dict],
+    jobs: List[Dict],
+    tasks: List[Dict],
+    stats: Dict,
+) -> Dict:
+    """Assemble the snapshot dict consumed by the FAST and BATCH loops."""
     return {
         "ts_ms": now_ms,
         "region_id": region_id,
@@ -95,9 +227,11 @@ def build_dispatch_snapshot(
             "h3_res": 8,
             "weights": {"alpha_total_time":1.0,"beta_lateness":25.0,"gamma_deadhead":1.0,"rho_return_risk":1.0,"lambda_fairness":0.0,"mu_zone":0.0},
         },
-        "road_graph": {"graph_id":"osm-texas","profile_id":"car-default"},
+        "road_graph": {"graph_id": ROAD_GRAPH_ID, "profile_id": "car-default"},
         "drivers": drivers,
         "jobs": jobs,
         "tasks": tasks,
         "predictions": {},
+        "lookups": build_task_lookups(tasks),
+        "stats": stats,
     }
@@ -0,0 +1,219 @@
+"""Long-lived dispatch snapshot kept in sync with deltas between FAST ticks.
+
+``build_dispatch_snapshot`` reads every open order, task and dispatchable
+driver on each call.  ``SnapshotStore`` does that once (``seed``) and then,
+on every ``refresh``, only reads rows whose ``updated_at`` moved past the
+last watermark it saw -- driver pings/status changes, new orders and tasks,
+and order/task status transitions.  A periodic full reseed (``reconcile_s``)
+catches anything the deltas cannot see, e.g. store or address coordinate
+edits or rows touched by raw SQL that skipped ``updated_at``.
+
+Watermarks come from the rows themselves (DB clock), and each delta query
+re-reads an ``overlap_s`` window behind the watermark so rows committed by
+a transaction that started before the previous refresh are not missed.
+Applying a row is idempotent, so the overlap only costs a few re-reads.
+
+Driver changes are also applied to a long-lived spatial index (the
+process-wide ``shared_driver_index`` by default: H3, or the pure-Python
+grid when `h3` is not installed) which is attached to each
+snapshot as ``snapshot["driver_index"]`` for candidate generation.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from packages.db.models import DeliveryTask, Driver, Order
+from packages.geo.h3_index import shared_driver_index
+from packages.dispatch.snapshot import (
+    ACTIVE_TASK_STATUSES,
+    DISPATCH_DRIVER_STATUSES,
+    DISPATCHABLE_ORDER_STATUSES,
+    _DRIVER_COLUMNS,
+    _TASK_COLUMNS,
+    _driver_dict,
+    _order_job,
+    _orders_query,
+    _task_dict,
+    build_dispatch_snapshot,
+    snapshot_dict,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _later(a: Optional[datetime], b: Optional[datetime]) -> Optional[datetime]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return b if b > a else a
+
+
+class SnapshotStore:
+    """In-worker dispatch snapshot updated incrementally from ``updated_at``."""
+
+    def __init__(
+        self,
+        *,
+        region_id: str,
+        reconcile_s: float = 60.0,
+        overlap_s: float = 5.0,
+        driver_statuses: Sequence[str] = DISPATCH_DRIVER_STATUSES,
+        zone_ids: Optional[Iterable[str]] = None,
+        driver_index=None,
+    ):
+        self.region_id = region_id
+        self.reconcile_s = reconcile_s
+        self.overlap = timedelta(seconds=overlap_s)
+        self.driver_statuses = tuple(driver_statuses)
+        self.zone_ids = set(zone_ids) if zone_ids is not None else None
+        self.driver_index = driver_index if driver_index is not None else shared_driver_index()
+
+        self.drivers: Dict[str, dict] = {}
+        self.jobs: Dict[str, dict] = {}      # keyed by order_id
+        self.tasks: Dict[str, dict] = {}     # keyed by task_id
+
+        self._wm_driver: Optional[datetime] = None
+        self._wm_order: Optional[datetime] = None
+        self._wm_task: Optional[datetime] = None
+        self._seeded_at: Optional[float] = None
+
+    @property
+    def seeded(self) -> bool:
+        return self._seeded_at is not None
+
+    def invalidate(self) -> None:
+        """Force a full reseed on the next ``refresh``."""
+        self._seeded_at = None
+
+    # ------------------------------------------------------------------
+    # Full load
+    # ------------------------------------------------------------------
+
+    def seed(self, db: Session, *, now_ms: int | None = None) -> Dict:
+        """Load the full snapshot and reset watermarks to the DB's latest ``updated_at``."""
+        now_ms = now_ms or int(time.time() * 1000)
+        # Read the watermarks first: anything updated while the full load is
+        # running is then re-read by the next delta instead of being lost.
+        wm_driver = db.query(Driver.updated_at).order_by(Driver.updated_at.desc()).limit(1).scalar()
+        wm_order = db.query(Order.updated_at).order_by(Order.updated_at.desc()).limit(1).scalar()
+        wm_task = db.query(DeliveryTask.updated_at).order_by(DeliveryTask.updated_at.desc()).limit(1).scalar()
+
+        snap = build_dispatch_snapshot(
+            db, region_id=self.region_id, now_ms=now_ms,
+            driver_statuses=self.driver_statuses, zone_ids=self.zone_ids,
+        )
+        self.drivers = {d["driver_id"]: d for d in snap["drivers"]}
+        self.driver_index.build(snap["drivers"])
+        snap["driver_index"] = self.driver_index
+        self.jobs = {j["order_id"]: j for j in snap["jobs"]}
+        self.tasks = {t["task_id"]: t for t in snap["tasks"]}
+        self._wm_driver, self._wm_order, self._wm_task = wm_driver, wm_order, wm_task
+        self._seeded_at = time.monotonic()
+
+        snap["stats"]["mode"] = "full"
+        return snap
+
+    # ------------------------------------------------------------------
+    # Deltas
+    # ------------------------------------------------------------------
+
+    def _since(self, wm: Optional[datetime]) -> Optional[datetime]:
+        return wm - self.overlap if wm is not None else None
+
+    def _apply_drivers(self, db: Session, *, now_ms: int) -> int:
+        q = db.query(*_DRIVER_COLUMNS)
+        since = self._since(self._wm_driver)
+        if since is not None:
+            q = q.filter(Driver.updated_at > since)
+        n = 0
+        for row in q:
+            n += 1
+            self._wm_driver = _later(self._wm_driver, row.updated_at)
+            d = None
+            if row.status in self.driver_statuses and (self.zone_ids is None or row.zone_id in self.zone_ids):
+                d = _driver_dict(row, now_ms=now_ms)
+            if d is None:
+                self.drivers.pop(row.id, None)
+                self.driver_index.remove(row.id)
+            else:
+                self.drivers[row.id] = d
+                self.driver_index.upsert(d)
+        return n
+
+    def _apply_orders(self, db: Session, *, now_ms: int) -> int:
+        # Outer joins so an order whose store/address lost its coordinates
+        # still shows up here and is dropped from the job set.
+        q = _orders_query(db, outer=True)
+        since = self._since(self._wm_order)
+        if since is not None:
+            q = q.filter(Order.updated_at > since)
+        n = 0
+        for row in q:
+            n += 1
+            self._wm_order = _later(self._wm_order, row.updated_at)
+            job = _order_job(row, now_ms=now_ms) if row.status in DISPATCHABLE_ORDER_STATUSES else None
+            if job is None:
+                self.jobs.pop(row.id, None)
+            else:
+                self.jobs[row.id] = job
+        return n
+
+    def _apply_tasks(self, db: Session) -> int:
+        q = db.query(*_TASK_COLUMNS)
+        since = self._since(self._wm_task)
+        if since is not None:
+            q = q.filter(DeliveryTask.updated_at > since)
+        n = 0
+        for row in q:
+            n += 1
+            self._wm_task = _later(self._wm_task, row.updated_at)
+            if row.status in ACTIVE_TASK_STATUSES:
+                self.tasks[row.id] = _task_dict(row)
+            else:
+                self.tasks.pop(row.id, None)
+        return n
+
+    def refresh(self, db: Session, *, now_ms: int | None = None) -> Dict:
+        """Return an up-to-date snapshot, reseeding when due and applying deltas otherwise."""
+        now_ms = now_ms or int(time.time() * 1000)
+        if not self.seeded or (time.monotonic() - self._seeded_at) >= self.reconcile_s:
+            return self.seed(db, now_ms=now_ms)
+
+        timings_ms: Dict[str, float] = {}
+        rows: Dict[str, int] = {}
+
+        t0 = time.perf_counter()
+        rows["drivers_changed"] = self._apply_drivers(db, now_ms=now_ms)
+        timings_ms["drivers"] = round((time.perf_counter() - t0) * 1000, 3)
+
+        t0 = time.perf_counter()
+        rows["tasks_changed"] = self._apply_tasks(db)
+        timings_ms["tasks"] = round((time.perf_counter() - t0) * 1000, 3)
+
+        t0 = time.perf_counter()
+        rows["orders_changed"] = self._apply_orders(db, now_ms=now_ms)
+        timings_ms["jobs"] = round((time.perf_counter() - t0) * 1000, 3)
+
+        timings_ms["total"] = round(sum(timings_ms.values()), 3)
+        rows.update(drivers=len(self.drivers), tasks=len(self.tasks), jobs=len(self.jobs))
+        return self.snapshot(now_ms=now_ms, stats={"mode": "delta", "rows": rows, "timings_ms": timings_ms})
+
+    def snapshot(self, *, now_ms: int | None = None, stats: Dict | None = None) -> Dict:
+        """Materialize the current state as a regular snapshot dict."""
+        now_ms = now_ms or int(time.time() * 1000)
+        snap = snapshot_dict(
+            region_id=self.region_id,
+            now_ms=now_ms,
+            drivers=list(self.drivers.values()),
+            jobs=list(self.jobs.values()),
+            tasks=list(self.tasks.values()),
+            stats=stats or {},
+        )
+        snap["driver_index"] = self.driver_index
+        return snap
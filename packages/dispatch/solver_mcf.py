@@ -1,54 +1,192 @@
+"""Driver <-> job assignment for the FAST loop.
+
+The bipartite candidate graph is sparse: each job only has edges to its
+top-K nearby drivers, so it falls apart into many small independent
+pieces (one per neighbourhood).  ``AssignmentSolver``:
+
+  * drops unscored edges, non-IDLE drivers and unknown jobs, so isolated
+    drivers/jobs never become nodes;
+  * splits the remaining edges into connected components (union-find) and
+    solves each on its own -- a maximum-cardinality, minimum-cost matching
+    via OR-Tools ``SimpleMinCostFlow``, or the same optimum from the
+    pure-Python sparse solver in ``assignment`` when OR-Tools is not
+    installed;
+  * optionally solves components in a thread pool (``max_workers``);
+  * records ``last_stats`` with the size and solve time of each component.
+
+There is no cross-tick warm start: every matched pair becomes an
+OFFERED task, so the next tick's components never repeat.
+``solve_min_cost_flow`` is the one-shot entry point.
+"""
 from __future__ import annotations
-from typing import List
 
-def solve_min_cost_flow(drivers: List[dict], jobs: List[dict], edges: List[dict]) -> List[dict]:
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from packages.dispatch.assignment import solve_sparse_assignment
+
+log = logging.getLogger(__name__)
+
+MCF_WORKERS = int(os.getenv("DISPATCH_MCF_WORKERS", "1"))
+# Components smaller than this are solved inline even with a pool.
+_PARALLEL_MIN_EDGES = 64
+
+Edge = Tuple[str, str, int]  # (driver_id, job_id, cost)
+
+
+def _ortools_mcf():
     try:
         from ortools.graph.python import min_cost_flow
     except Exception:
-        used_d, used_j, out = set(), set(), []
-        for e in sorted([e for e in edges if e.get("cost") is not None], key=lambda x: x["cost"]):
-            if e["driver_id"] in used_d or e["job_id"] in used_j:
-                continue
-            out.append({"driver_id": e["driver_id"], "job_id": e["job_id"], "cost": e["cost"]})
-            used_d.add(e["driver_id"]); used_j.add(e["job_id"])
-        return out
-
-    idle = [d for d in drivers if d.get("status") == "IDLE"]
-    drv_ids = [d["driver_id"] for d in idle]
-    job_ids = [j["job_id"] for j in jobs]
-    drv_index = {did:i for i,did in enumerate(drv_ids)}
-    job_index = {jid:i for i,jid in enumerate(job_ids)}
+        return None
+    return min_cost_flow
+
+
+def components(drivers: List[dict], jobs: List[dict], edges: List[dict]) -> List[List[Edge]]:
+    """Connected components of the usable edges, each in input edge order."""
+    idle = {d["driver_id"] for d in drivers if d.get("status") == "IDLE"}
+    job_ids = {j["job_id"] for j in jobs}
+    usable: List[Edge] = [
+        (e["driver_id"], e["job_id"], int(e["cost"]))
+        for e in edges
+        if e.get("cost") is not None and e.get("driver_id") in idle and e.get("job_id") in job_ids
+    ]
+    parent: Dict[Tuple[int, str], Tuple[int, str]] = {}
+
+    def find(x):
+        root = x
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for did, jid, _ in usable:
+        a, b = find((0, did)), find((1, jid))
+        if a != b:
+            parent[a] = b
+    groups: Dict[Tuple[int, str], List[Edge]] = {}
+    for edge in usable:
+        groups.setdefault(find((0, edge[0])), []).append(edge)
+    return list(groups.values())
+
+
+def _solve_sparse(comp: List[Edge]) -> List[dict]:
+    drv_index: Dict[str, int] = {}
+    job_index: Dict[str, int] = {}
+    rows = [drv_index.setdefault(did, len(drv_index)) for did, _, _ in comp]
+    cols = [job_index.setdefault(jid, len(job_index)) for _, jid, _ in comp]
+    row_to_col, _ = solve_sparse_assignment(len(drv_index), len(job_index), rows, cols, [e[2] for e in comp])
+    match = row_to_col.tolist()
+    chosen: Dict[int, int] = {}  # driver row -> cheapest edge to its matched job
+    for a, (r, c) in enumerate(zip(rows, cols)):
+        if match[r] == c and (r not in chosen or comp[a][2] < comp[chosen[r]][2]):
+            chosen[r] = a
+    return [
+        {"driver_id": did, "job_id": jid, "cost": cost}
+        for a, (did, jid, cost) in enumerate(comp) if chosen.get(rows[a]) == a
+    ]
+
+
+def _solve_ortools(min_cost_flow, comp: List[Edge]) -> List[dict]:
+    drv_ids = list(dict.fromkeys(e[0] for e in comp))
+    job_ids = list(dict.fromkeys(e[1] for e in comp))
+    drv_index = {did: i for i, did in enumerate(drv_ids)}
+    job_index = {jid: i for i, jid in enumerate(job_ids)}
     Nd, Nj = len(drv_ids), len(job_ids)
-    source = 0
-    sink = Nd + Nj + 1
-    def n_driver(i): return 1 + i
-    def n_job(j): return 1 + Nd + j
+    source, sink = 0, Nd + Nj + 1
 
     mcf = min_cost_flow.SimpleMinCostFlow()
-    for d in idle:
-        mcf.add_arc_with_capacity_and_unit_cost(source, n_driver(drv_index[d["driver_id"]]), 1, 0)
+    for i in range(Nd):
+        mcf.add_arc_with_capacity_and_unit_cost(source, 1 + i, 1, 0)
+    first_pair_arc = mcf.num_arcs()
+    for did, jid, cost in comp:
+        mcf.add_arc_with_capacity_and_unit_cost(1 + drv_index[did], 1 + Nd + job_index[jid], 1, cost)
+    for j in range(Nj):
+        mcf.add_arc_with_capacity_and_unit_cost(1 + Nd + j, sink, 1, 0)
+    mcf.set_node_supply(source, min(Nd, Nj))
+    mcf.set_node_supply(sink, -min(Nd, Nj))
 
-    for e in edges:
-        did, jid, c = e.get("driver_id"), e.get("job_id"), e.get("cost")
-        if c is None or did not in drv_index or jid not in job_index:
-            continue
-        mcf.add_arc_with_capacity_and_unit_cost(n_driver(drv_index[did]), n_job(job_index[jid]), 1, int(c))
+    # Max-flow-with-min-cost: components where not every driver/job can be
+    # paired still return their best maximum matching.
+    if mcf.solve_max_flow_with_min_cost() != mcf.OPTIMAL:
+        return []
+    out = []
+    for a, (did, jid, cost) in enumerate(comp, start=first_pair_arc):
+        if mcf.flow(a) > 0:
+            out.append({"driver_id": did, "job_id": jid, "cost": cost})
+    return out
 
-    for jid, j in job_index.items():
-        mcf.add_arc_with_capacity_and_unit_cost(n_job(j), sink, 1, 0)
 
-    F = min(len(idle), Nj)
-    mcf.set_node_supply(source, F)
-    mcf.set_node_supply(sink, -F)
+class AssignmentSolver:
+    """Component-wise assignment, optionally solving large components in parallel."""
 
-    if mcf.solve() != mcf.OPTIMAL:
-        return []
+    def __init__(self, *, max_workers: int = MCF_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.last_stats: List[dict] = []
+
+    def _solve_one(self, mcf_mod, comp: List[Edge]) -> Tuple[List[dict], float]:
+        t0 = time.perf_counter()
+        if len(comp) == 1:
+            did, jid, cost = comp[0]
+            out = [{"driver_id": did, "job_id": jid, "cost": cost}]
+        elif mcf_mod is None:
+            out = _solve_sparse(comp)
+        else:
+            out = _solve_ortools(mcf_mod, comp)
+        return out, (time.perf_counter() - t0) * 1000.0
 
-    matches = []
-    for a in range(mcf.num_arcs()):
-        if mcf.flow(a) <= 0:
-            continue
-        tail, head = mcf.tail(a), mcf.head(a)
-        if 1 <= tail <= Nd and (1+Nd) <= head <= (Nd+Nj):
-            matches.append({"driver_id": drv_ids[tail-1], "job_id": job_ids[head-(1+Nd)], "cost": mcf.unit_cost(a)})
-    return matches
+    def solve(self, drivers: List[dict], jobs: List[dict], edges: List[dict]) -> List[dict]:
+        mcf_mod = _ortools_mcf()
+        comps = components(drivers, jobs, edges)
+        results: List[Optional[List[dict]]] = [None] * len(comps)
+        times = [0.0] * len(comps)
+        parallel = [i for i in range(len(comps)) if len(comps[i]) >= _PARALLEL_MIN_EDGES] if self.max_workers > 1 else []
+        if len(parallel) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mcf")
+            futures = {i: self._pool.submit(self._solve_one, mcf_mod, comps[i]) for i in parallel}
+            for i, fut in futures.items():
+                results[i], times[i] = fut.result()
+        for i in range(len(comps)):
+            if results[i] is None:
+                results[i], times[i] = self._solve_one(mcf_mod, comps[i])
+
+        self.last_stats = [
+            {
+                "drivers": len({e[0] for e in comp}),
+                "jobs": len({e[1] for e in comp}),
+                "edges": len(comp),
+                "ms": round(times[i], 3),
+            }
+            for i, comp in enumerate(comps)
+        ]
+        if comps:
+            log.debug(
+                "assignment: %d components, solve %.1f ms, largest %d edges",
+                len(comps), sum(times), max(len(c) for c in comps),
+            )
+        return [dict(m) for r in results for m in r]
+
+    def summary(self) -> dict:
+        """Aggregate of ``last_stats`` for tick summaries."""
+        s = self.last_stats
+        return {
+            "components": len(s),
+            "solve_ms": round(sum(c["ms"] for c in s), 3),
+            "max_component_ms": max((c["ms"] for c in s), default=0.0),
+            "max_component_edges": max((c["edges"] for c in s), default=0),
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def solve_min_cost_flow(drivers: List[dict], jobs: List[dict], edges: List[dict]) -> List[dict]:
+    return AssignmentSolver(max_workers=1).solve(drivers, jobs, edges)
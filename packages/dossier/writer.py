@@ -1,5 +1,7 @@
 from __future__ import annotations
 import uuid
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 from packages.db.models import OrderEvent
 from packages.common.crypto import sha256_hex, stable_json
@@ -23,6 +25,16 @@ def emit_order_event(
     )
     hash_prev = last.hash_self if last else None
 
+    evt = OrderEvent(**_event_row(order_id=order_id, actor_type=actor_type, actor_id=actor_id,
+                                  event_type=event_type, payload=payload, hash_prev=hash_prev))
+    db.add(evt)
+    db.flush()
+    return evt
+
+
+def _event_row(*, order_id: str, actor_type: str, actor_id: str, event_type: str, payload: dict,
+               hash_prev: Optional[str]) -> dict:
+    """Column values of one chained event (new id, hash over the event and ``hash_prev``)."""
     evt_id = f"evt_{uuid.uuid4().hex}"
     to_hash = {
         "order_id": order_id,
@@ -33,18 +45,53 @@ def emit_order_event(
         "hash_prev": hash_prev,
         "id": evt_id,
     }
-    hash_self = sha256_hex(stable_json(to_hash))
-
-    evt = OrderEvent(
-        id=evt_id,
-        order_id=order_id,
-        actor_type=actor_type,
-        actor_id=actor_id,
-        event_type=event_type,
-        payload=payload,
-        hash_prev=hash_prev,
-        hash_self=hash_self,
+    return {
+        "id": evt_id,
+        "order_id": order_id,
+        "actor_type": actor_type,
+        "actor_id": actor_id,
+        "event_type": event_type,
+        "payload": payload,
+        "hash_prev": hash_prev,
+        "hash_self": sha256_hex(stable_json(to_hash)),
+    }
+
+
+def last_event_hashes(db: Session, order_ids: Iterable[str]) -> Dict[str, str]:
+    """``hash_self`` of the latest event of each order, in one query."""
+    ids = sorted(set(order_ids))
+    if not ids:
+        return {}
+    ranked = (
+        select(
+            OrderEvent.order_id,
+            OrderEvent.hash_self,
+            func.row_number().over(partition_by=OrderEvent.order_id, order_by=OrderEvent.ts.desc()).label("rn"),
+        )
+        .where(OrderEvent.order_id.in_(ids))
+        .subquery()
     )
-    db.add(evt)
-    db.flush()
-    return evt
+    rows = db.execute(select(ranked.c.order_id, ranked.c.hash_self).where(ranked.c.rn == 1))
+    return {order_id: hash_self for order_id, hash_self in rows}
+
+
+def emit_order_events_bulk(db: Session, events: List[dict]) -> List[dict]:
+    """Append many events (dicts of ``emit_order_event``'s keyword arguments) at once.
+
+    One query fetches the chain heads of all affected orders, hashes are
+    chained in memory (several events for one order chain in list order),
+    and all rows go out in a single executemany INSERT.  Returns the
+    inserted rows.
+    """
+    if not events:
+        return []
+    db.flush()  # chain onto events still pending in this session
+    heads = last_event_hashes(db, (e["order_id"] for e in events))
+    rows = []
+    for e in events:
+        row = _event_row(order_id=e["order_id"], actor_type=e["actor_type"], actor_id=e["actor_id"],
+                         event_type=e["event_type"], payload=e["payload"], hash_prev=heads.get(e["order_id"]))
+        heads[e["order_id"]] = row["hash_self"]
+        rows.append(row)
+    db.execute(insert(OrderEvent), rows)
+    return rows
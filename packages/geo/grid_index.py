@@ -0,0 +1,157 @@
+"""Pure-Python lat/lng bucket grid with the same interface as DriverH3Index.
+
+Used when the optional ``h3`` package is missing (e.g. the slim worker
+image) so candidate generation still only visits nearby cells.
+
+Cells are ``cell_m`` tall; each row of cells gets its own longitude step
+(``cell_m`` wide at that row's latitude), so a ring of k cells always spans
+at least ``k * cell_m`` in every direction regardless of latitude.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from packages.geo.h3_index import is_dispatchable
+
+_M_PER_DEG_LAT = 111_320.0
+
+Cell = Tuple[int, int]
+
+
+class DriverGridIndex:
+    """Long-lived in-memory driver index keyed by fixed-size grid cell."""
+
+    def __init__(self, *, cell_m: float = 500.0):
+        self.cell_m = float(cell_m)
+        self._lat_step = self.cell_m / _M_PER_DEG_LAT
+        self.map: Dict[Cell, Dict[str, dict]] = {}
+        self._cell_of: Dict[str, Cell] = {}
+        self._lng_steps: Dict[int, float] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._cell_of
+
+    # ------------------------------------------------------------------
+    # Cell arithmetic
+    # ------------------------------------------------------------------
+
+    def _row(self, lat: float) -> int:
+        return int(math.floor(lat / self._lat_step))
+
+    def _lng_step(self, row: int) -> float:
+        step = self._lng_steps.get(row)
+        if step is None:
+            center_lat = (row + 0.5) * self._lat_step
+            cos_lat = max(0.01, math.cos(math.radians(center_lat)))
+            step = self._lng_steps[row] = self.cell_m / (_M_PER_DEG_LAT * cos_lat)
+        return step
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        row = self._row(lat)
+        return row, int(math.floor(lng / self._lng_step(row)))
+
+    def _square(self, lat: float, lng: float, k: int) -> Iterator[Cell]:
+        """Cells within k rows/columns of the query point's cell."""
+        row0 = self._row(lat)
+        for row in range(row0 - k, row0 + k + 1):
+            col0 = int(math.floor(lng / self._lng_step(row)))
+            for col in range(col0 - k, col0 + k + 1):
+                yield row, col
+
+    def _hollow_square(self, lat: float, lng: float, k: int) -> Iterator[Cell]:
+        """Cells at exactly Chebyshev distance k (per-row column offsets)."""
+        if k == 0:
+            yield self._cell(lat, lng)
+            return
+        row0 = self._row(lat)
+        for row in range(row0 - k, row0 + k + 1):
+            col0 = int(math.floor(lng / self._lng_step(row)))
+            if row in (row0 - k, row0 + k):
+                for col in range(col0 - k, col0 + k + 1):
+                    yield row, col
+            else:
+                yield row, col0 - k
+                yield row, col0 + k
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def build(self, drivers: Iterable[dict]) -> None:
+        with self._lock:
+            self.map.clear()
+            self._cell_of.clear()
+            for d in drivers:
+                self.upsert(d)
+
+    def upsert(self, d: dict) -> None:
+        """Insert or move a driver; non-dispatchable drivers are removed."""
+        did = d.get("driver_id")
+        if did is None:
+            return
+        if not is_dispatchable(d):
+            self.remove(did)
+            return
+        cell = self._cell(float(d["lat"]), float(d["lng"]))
+        with self._lock:
+            prev = self._cell_of.get(did)
+            if prev is not None and prev != cell:
+                bucket = self.map.get(prev)
+                if bucket is not None:
+                    bucket.pop(did, None)
+                    if not bucket:
+                        del self.map[prev]
+            self.map.setdefault(cell, {})[did] = d
+            self._cell_of[did] = cell
+
+    def remove(self, driver_id: str) -> None:
+        with self._lock:
+            cell = self._cell_of.pop(driver_id, None)
+            if cell is None:
+                return
+            bucket = self.map.get(cell)
+            if bucket is not None:
+                bucket.pop(driver_id, None)
+                if not bucket:
+                    del self.map[cell]
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def query_ring(self, lat: float, lng: float, k: int) -> List[dict]:
+        out: List[dict] = []
+        with self._lock:
+            for c in self._square(float(lat), float(lng), k):
+                bucket = self.map.get(c)
+                if bucket:
+                    out.extend(bucket.values())
+        return out
+
+    def rings_for_radius(self, radius_m: float) -> int:
+        """Smallest k whose square is guaranteed to cover ``radius_m`` around a point."""
+        return int(math.ceil(radius_m / self.cell_m))
+
+    def query_nearby(self, lat: float, lng: float, *, min_count: int, max_k: int) -> List[dict]:
+        """Expand square rings 0..max_k until at least ``min_count`` drivers are found."""
+        lat, lng = float(lat), float(lng)
+        out: List[dict] = []
+        with self._lock:
+            for k in range(0, max_k + 1):
+                for c in self._hollow_square(lat, lng, k):
+                    bucket = self.map.get(c)
+                    if bucket:
+                        out.extend(bucket.values())
+                if len(out) >= min_count:
+                    break
+        return out
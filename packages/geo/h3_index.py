@@ -1,4 +1,7 @@
 from __future__ import annotations
+import math
+import threading
+from collections import OrderedDict
 from typing import Iterable, List, Tuple, Dict, Optional
 
 def h3_ring_cells(lat: float, lng: float, res: int, k: int) -> List[str]:
@@ -15,37 +18,194 @@ def h3_cell(lat: float, lng: float, res: int) -> str:
     import h3  # type: ignore
     return h3.latlng_to_cell(lat, lng, res)
 
+def is_dispatchable(d: dict) -> bool:
+    """IDLE, insurance+registration verified and located -- the FAST loop's driver filter."""
+    if d.get("status") != "IDLE":
+        return False
+    elig = d.get("eligibility", {}) or {}
+    if not (elig.get("insurance_verified") and elig.get("registration_verified")):
+        return False
+    return d.get("lat") is not None and d.get("lng") is not None
+
 class DriverH3Index:
-    """Lightweight in-memory index. Rebuild each tick for MVP."""
-    def __init__(self, *, res: int = 8):
+    """Long-lived in-memory driver index keyed by H3 cell.
+
+    ``build`` loads a full driver list; ``upsert``/``remove`` keep it current
+    between ticks (a location ping only moves the driver between two cells).
+    Only dispatchable drivers (see ``is_dispatchable``) are kept, so ring
+    queries return pre-filtered candidates.  Ring cell sets are cached per
+    (cell, k) since pickups repeat the same store cells every tick.
+    """
+    def __init__(self, *, res: int = 8, ring_cache_size: int = 8192):
         self.res = res
-        self.map: Dict[str, List[dict]] = {}
+        self.map: Dict[str, Dict[str, dict]] = {}
+        self._cell_of: Dict[str, str] = {}
+        self._rings: OrderedDict[Tuple[str, int], Tuple[str, ...]] = OrderedDict()
+        self._ring_cache_size = ring_cache_size
+        self._lock = threading.RLock()
         self._h3_available: bool = True
 
+    @property
+    def available(self) -> bool:
+        return self._h3_available
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._cell_of
+
+    def _cell(self, lat: float, lng: float) -> Optional[str]:
+        try:
+            return h3_cell(float(lat), float(lng), self.res)
+        except ImportError:
+            self._h3_available = False
+            return None
+        except Exception:
+            return None
+
     def build(self, drivers: Iterable[dict]) -> None:
-        self.map.clear()
-        for d in drivers:
-            lat = d.get("lat"); lng = d.get("lng")
-            if lat is None or lng is None:
-                continue
-            try:
-                cell = h3_cell(float(lat), float(lng), self.res)
-            except ImportError:
-                self._h3_available = False
+        with self._lock:
+            self.map.clear()
+            self._cell_of.clear()
+            for d in drivers:
+                self.upsert(d)
+                if not self._h3_available:
+                    return
+
+    def upsert(self, d: dict) -> None:
+        """Insert or move a driver; non-dispatchable drivers are removed."""
+        did = d.get("driver_id")
+        if did is None:
+            return
+        if not is_dispatchable(d):
+            self.remove(did)
+            return
+        cell = self._cell(d["lat"], d["lng"])
+        with self._lock:
+            if cell is None:
+                self.remove(did)
+                return
+            prev = self._cell_of.get(did)
+            if prev is not None and prev != cell:
+                bucket = self.map.get(prev)
+                if bucket is not None:
+                    bucket.pop(did, None)
+                    if not bucket:
+                        del self.map[prev]
+            self.map.setdefault(cell, {})[did] = d
+            self._cell_of[did] = cell
+
+    def remove(self, driver_id: str) -> None:
+        with self._lock:
+            cell = self._cell_of.pop(driver_id, None)
+            if cell is None:
                 return
-            except Exception:
-                continue
-            self.map.setdefault(cell, []).append(d)
+            bucket = self.map.get(cell)
+            if bucket is not None:
+                bucket.pop(driver_id, None)
+                if not bucket:
+                    del self.map[cell]
+
+    def _cached_cells(self, key: Tuple[str, int]) -> Optional[Tuple[str, ...]]:
+        cells = self._rings.get(key)
+        if cells is not None:
+            self._rings.move_to_end(key)
+        return cells
+
+    def _cache_cells(self, key: Tuple[str, int], cells: Tuple[str, ...]) -> Tuple[str, ...]:
+        self._rings[key] = cells
+        if len(self._rings) > self._ring_cache_size:
+            self._rings.popitem(last=False)
+        return cells
+
+    def _disk(self, origin: str, k: int) -> Tuple[str, ...]:
+        cells = self._cached_cells((origin, k))
+        if cells is None:
+            import h3  # type: ignore
+            cells = self._cache_cells((origin, k), tuple(h3.grid_disk(origin, k)))
+        return cells
+
+    def _hollow_ring(self, origin: str, k: int) -> Tuple[str, ...]:
+        if k == 0:
+            return (origin,)
+        key = (origin, -k)  # negative k: hollow ring at distance k
+        cells = self._cached_cells(key)
+        if cells is None:
+            inner = set(self._disk(origin, k - 1))
+            cells = self._cache_cells(key, tuple(c for c in self._disk(origin, k) if c not in inner))
+        return cells
 
     def query_ring(self, lat: float, lng: float, k: int) -> List[dict]:
         if not self._h3_available:
             return []
+        origin = self._cell(lat, lng)
+        if origin is None:
+            return []
+        out: List[dict] = []
+        with self._lock:
+            for c in self._disk(origin, k):
+                bucket = self.map.get(c)
+                if bucket:
+                    out.extend(bucket.values())
+        return out
+
+    def rings_for_radius(self, radius_m: float) -> int:
+        """Smallest k whose disk is guaranteed to cover ``radius_m`` around a point."""
         try:
-            cells = h3_ring_cells(lat, lng, self.res, k)
-        except (ImportError, Exception):
-            self._h3_available = False
+            import h3  # type: ignore
+            edge_m = h3.average_hexagon_edge_length(self.res, unit="m")
+        except Exception:
+            return 5
+        # Neighbouring centres are sqrt(3)*edge apart; +1 ring for the
+        # query point sitting anywhere inside the origin cell.
+        return int(math.ceil(radius_m / (math.sqrt(3) * edge_m))) + 1
+
+    def query_nearby(self, lat: float, lng: float, *, min_count: int, max_k: int) -> List[dict]:
+        """Expand hollow rings 0..max_k until at least ``min_count`` drivers are found.
+
+        Cost is proportional to the cells visited and the drivers in them,
+        not to the fleet size.
+        """
+        if not self._h3_available:
+            return []
+        origin = self._cell(lat, lng)
+        if origin is None:
             return []
         out: List[dict] = []
-        for c in cells:
-            out.extend(self.map.get(c, []))
+        with self._lock:
+            for k in range(0, max_k + 1):
+                for c in self._hollow_ring(origin, k):
+                    bucket = self.map.get(c)
+                    if bucket:
+                        out.extend(bucket.values())
+                if len(out) >= min_count:
+                    break
         return out
+
+
+def h3_installed() -> bool:
+    try:
+        import h3  # type: ignore  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def new_driver_index(*, res: int = 8, grid_cell_m: float = 500.0):
+    """DriverH3Index when `h3` is installed, else the pure-Python DriverGridIndex."""
+    if h3_installed():
+        return DriverH3Index(res=res)
+    from packages.geo.grid_index import DriverGridIndex
+    return DriverGridIndex(cell_m=grid_cell_m)
+
+
+_shared: Dict[int, object] = {}
+_shared_lock = threading.Lock()
+
+def shared_driver_index(res: int = 8):
+    """Process-wide index fed by driver updates (API) and snapshot deltas (worker)."""
+    with _shared_lock:
+        idx = _shared.get(res)
+        if idx is None:
+            idx = _shared[res] = new_driver_index(res=res)
+        return idx
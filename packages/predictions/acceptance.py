@@ -1,6 +1,12 @@
 from __future__ import annotations
 import math
 
+import numpy as np
+
+# Logistic coefficients: intercept, accept-rate logit, pickup minutes,
+# payout dollars, payout per trip minute, recent timeouts, cancel rate.
+_B = (-0.2, 1.2, 0.15, 0.02, 0.8, 0.6, 1.0)
+
 def clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
 
@@ -19,7 +25,73 @@ def p_accept(driver: dict, job: dict, *, eta_pu_s: int, total_trip_s: int) -> fl
     ar = clamp(accept_rate, 0.05, 0.95)
     logit_ar = math.log(ar / (1 - ar))
 
-    b0,b1,b2,b3,b4,b5,b6 = -0.2,1.2,0.15,0.02,0.8,0.6,1.0
+    b0,b1,b2,b3,b4,b5,b6 = _B
     value_per_min = (payout_cents / max(1, total_trip_s)) * 60.0
     z = b0 + b1*logit_ar - b2*eta_pu_min + b3*(payout_cents/100.0) + b4*value_per_min - b5*recent_timeouts - b6*cancel_rate
     return clamp(sigmoid(z), 0.05, 0.95)
+
+# Feature columns of the vectorized / trained model.  The hand-tuned
+# ``_B`` above maps onto them with its signs folded in.
+FEATURES = ("logit_accept_rate", "eta_pu_min", "payout_usd", "value_per_min", "recent_timeouts", "cancel_rate")
+HEURISTIC_INTERCEPT = _B[0]
+HEURISTIC_COEF = (_B[1], -_B[2], _B[3], _B[4], -_B[5], -_B[6])
+
+def acceptance_inputs(driver: dict, job: dict, *, eta_pu_s: int, total_trip_s: int) -> dict:
+    """Raw model inputs for one edge (logged with each offer for training)."""
+    m = driver.get("metrics", {}) or {}
+    return {
+        "accept_rate_7d": float(m.get("accept_rate_7d", 0.6)),
+        "cancel_rate_7d": float(m.get("cancel_rate_7d", 0.05)),
+        "recent_timeouts": int(m.get("recent_timeouts", 0)),
+        "payout_cents": int((job.get("pricing") or {}).get("payout_cents_est", 1000)),
+        "eta_pu_s": int(eta_pu_s),
+        "total_trip_s": int(total_trip_s),
+    }
+
+def feature_matrix(
+    accept_rate,
+    cancel_rate,
+    recent_timeouts,
+    payout_cents,
+    *,
+    eta_pu_s,
+    total_trip_s,
+) -> np.ndarray:
+    """(n, len(FEATURES)) design matrix from equal-length raw input arrays."""
+    ar = np.clip(np.asarray(accept_rate, dtype=np.float64), 0.05, 0.95)
+    payout = np.asarray(payout_cents, dtype=np.float64)
+    total = np.maximum(1, np.asarray(total_trip_s, dtype=np.int64))
+    return np.column_stack([
+        np.log(ar / (1 - ar)),
+        np.asarray(eta_pu_s, dtype=np.float64) / 60.0,
+        payout / 100.0,
+        (payout / total) * 60.0,
+        np.asarray(recent_timeouts, dtype=np.float64),
+        np.asarray(cancel_rate, dtype=np.float64),
+    ])
+
+def p_accept_from_features(X: np.ndarray, *, intercept: float, coef) -> np.ndarray:
+    z = intercept + X @ np.asarray(coef, dtype=np.float64)
+    return np.clip(1.0 / (1.0 + np.exp(-z)), 0.05, 0.95)
+
+def p_accept_batch(
+    accept_rate,
+    cancel_rate,
+    recent_timeouts,
+    payout_cents,
+    *,
+    eta_pu_s,
+    total_trip_s,
+    intercept: float = HEURISTIC_INTERCEPT,
+    coef=HEURISTIC_COEF,
+) -> np.ndarray:
+    """Vectorized ``p_accept`` over equal-length arrays (one row per edge).
+
+    With the default coefficients this matches ``p_accept``; trained
+    models (``acceptance_model``) pass their own.
+    """
+    X = feature_matrix(
+        accept_rate, cancel_rate, recent_timeouts, payout_cents,
+        eta_pu_s=eta_pu_s, total_trip_s=total_trip_s,
+    )
+    return p_accept_from_features(X, intercept=intercept, coef=coef)
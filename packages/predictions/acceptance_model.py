@@ -0,0 +1,270 @@
+"""Trained offer-acceptance model: versioned artifacts, batch scoring, hot reload.
+
+``acceptance.p_accept`` stays the hand-tuned per-edge reference.  This
+module fits the same logistic form (``acceptance.FEATURES``) to logged
+offer outcomes and serves it to the batch cost path:
+
+  * ``train_acceptance_model(db)`` reads ``OfferLog`` rows whose
+    ``features_json["acceptance"]`` holds the raw inputs logged by
+    ``offers.create_offer``.  ACCEPTED is the positive label, and
+    REJECTED/TIMEOUT are negatives.  It fits an L2-regularised logistic
+    regression (Newton / IRLS) on the oldest 80% and checks log-loss on
+    the newest 20% against the heuristic.  It publishes only if the model
+    is no worse.
+  * Artifacts are JSON files in ``ACCEPTANCE_MODEL_DIR``::
+
+        acceptance_<version>.json   features, intercept, coef, metrics
+        acceptance_current.json     {"version": ...}, swapped atomically
+
+  * ``acceptance_model()`` returns the current model.  It re-checks the
+    pointer every ``check_s`` and swaps in new versions without a
+    restart.  Until an artifact exists it is the heuristic.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from packages.predictions.acceptance import (
+    FEATURES,
+    HEURISTIC_COEF,
+    HEURISTIC_INTERCEPT,
+    feature_matrix,
+    p_accept_from_features,
+)
+
+log = logging.getLogger(__name__)
+
+ACCEPTANCE_MODEL_DIR = os.getenv("ACCEPTANCE_MODEL_DIR", os.path.join("var", "models"))
+MIN_TRAIN_ROWS = int(os.getenv("ACCEPTANCE_MIN_TRAIN_ROWS", "500"))
+_CURRENT = "acceptance_current.json"
+_KEEP_VERSIONS = 3
+_LABELS = {"ACCEPTED": 1, "REJECTED": 0, "TIMEOUT": 0}
+
+
+class AcceptanceModel:
+    """Logistic model over ``acceptance.FEATURES``; immutable once built."""
+
+    def __init__(
+        self,
+        *,
+        version: str,
+        intercept: float,
+        coef: Sequence[float],
+        features: Sequence[str] = FEATURES,
+        metrics: Optional[dict] = None,
+    ):
+        if tuple(features) != FEATURES:
+            raise ValueError(f"model features {tuple(features)} do not match {FEATURES}")
+        if len(coef) != len(FEATURES):
+            raise ValueError(f"expected {len(FEATURES)} coefficients, got {len(coef)}")
+        self.version = version
+        self.intercept = float(intercept)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.metrics = dict(metrics or {})
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "features": list(FEATURES),
+            "intercept": self.intercept,
+            "coef": self.coef.tolist(),
+            "metrics": self.metrics,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AcceptanceModel":
+        return cls(
+            version=str(d["version"]), intercept=d["intercept"], coef=d["coef"],
+            features=d.get("features", FEATURES), metrics=d.get("metrics"),
+        )
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return p_accept_from_features(X, intercept=self.intercept, coef=self.coef)
+
+    def predict_batch(
+        self, accept_rate, cancel_rate, recent_timeouts, payout_cents, *, eta_pu_s, total_trip_s,
+    ) -> np.ndarray:
+        """P(accept) per edge from raw input arrays (see ``feature_matrix``)."""
+        return self.predict(feature_matrix(
+            accept_rate, cancel_rate, recent_timeouts, payout_cents,
+            eta_pu_s=eta_pu_s, total_trip_s=total_trip_s,
+        ))
+
+
+HEURISTIC_MODEL = AcceptanceModel(version="heuristic", intercept=HEURISTIC_INTERCEPT, coef=HEURISTIC_COEF)
+
+
+# ----------------------------------------------------------------------
+# Training
+# ----------------------------------------------------------------------
+
+def fit_logistic(
+    X: np.ndarray, y: np.ndarray, *, l2: float = 1.0, max_iter: int = 50, tol: float = 1e-8,
+) -> Tuple[float, np.ndarray]:
+    """L2-regularised logistic regression by Newton's method (intercept unpenalised)."""
+    n, k = X.shape
+    A = np.column_stack([np.ones(n), X])
+    w = np.zeros(k + 1)
+    w[0] = np.log((y.mean() + 1e-6) / (1 - y.mean() + 1e-6))
+    reg = np.full(k + 1, l2)
+    reg[0] = 0.0
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(A @ w)))
+        grad = A.T @ (p - y) + reg * w
+        H = (A * (p * (1 - p))[:, None]).T @ A + np.diag(reg) + 1e-9 * np.eye(k + 1)
+        step = np.linalg.solve(H, grad)
+        w -= step
+        if np.max(np.abs(step)) < tol:
+            break
+    return float(w[0]), w[1:]
+
+
+def log_loss(p: np.ndarray, y: np.ndarray) -> float:
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def training_rows(db, *, days: int = 30) -> Tuple[np.ndarray, np.ndarray]:
+    """(X, y) from labelled offer logs in the last ``days``, oldest first."""
+    from packages.db.models import OfferLog
+
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    rows = (
+        db.query(OfferLog.features_json, OfferLog.outcome)
+        .filter(OfferLog.outcome.in_(list(_LABELS)), OfferLog.created_at >= since)
+        .order_by(OfferLog.created_at)
+        .all()
+    )
+    cols: Dict[str, list] = {k: [] for k in (
+        "accept_rate_7d", "cancel_rate_7d", "recent_timeouts", "payout_cents", "eta_pu_s", "total_trip_s",
+    )}
+    y = []
+    for features, outcome in rows:
+        inputs = (features or {}).get("acceptance")
+        if not inputs or any(inputs.get(k) is None for k in cols):
+            continue  # offers logged before acceptance inputs were recorded
+        for k in cols:
+            cols[k].append(inputs[k])
+        y.append(_LABELS[outcome])
+    X = feature_matrix(
+        cols["accept_rate_7d"], cols["cancel_rate_7d"], cols["recent_timeouts"], cols["payout_cents"],
+        eta_pu_s=cols["eta_pu_s"], total_trip_s=cols["total_trip_s"],
+    ) if y else np.empty((0, len(FEATURES)))
+    return X, np.asarray(y, dtype=np.float64)
+
+
+def fit_acceptance_model(X: np.ndarray, y: np.ndarray, *, l2: float = 1.0, holdout: float = 0.2) -> AcceptanceModel:
+    """Fit on the oldest rows, report holdout log-loss next to the heuristic's."""
+    n = len(y)
+    cut = max(1, int(n * (1 - holdout)))
+    intercept, coef = fit_logistic(X[:cut], y[:cut], l2=l2)
+    model = AcceptanceModel(version=str(time.time_ns()), intercept=intercept, coef=coef)
+    Xh, yh = (X[cut:], y[cut:]) if cut < n else (X, y)
+    model.metrics = {
+        "n_train": int(cut),
+        "n_holdout": int(len(yh)),
+        "positive_rate": round(float(y.mean()), 4) if n else 0.0,
+        "holdout_log_loss": round(log_loss(model.predict(Xh), yh), 5),
+        "heuristic_log_loss": round(log_loss(HEURISTIC_MODEL.predict(Xh), yh), 5),
+        "trained_at_ms": int(time.time() * 1000),
+    }
+    return model
+
+
+def publish_model(model: AcceptanceModel, *, directory: str = ACCEPTANCE_MODEL_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"acceptance_{model.version}.json")
+    with open(path, "w") as f:
+        json.dump(model.to_dict(), f)
+    tmp = os.path.join(directory, _CURRENT + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"version": model.version}, f)
+    os.replace(tmp, os.path.join(directory, _CURRENT))
+    versions = sorted(
+        (f[len("acceptance_"):-len(".json")] for f in os.listdir(directory)
+         if f.startswith("acceptance_") and f.endswith(".json") and f != _CURRENT),
+        key=int,
+    )
+    for v in versions[:-_KEEP_VERSIONS]:
+        try:
+            os.remove(os.path.join(directory, f"acceptance_{v}.json"))
+        except OSError:
+            pass
+    return path
+
+
+def train_acceptance_model(
+    db, *, directory: str = ACCEPTANCE_MODEL_DIR, days: int = 30, min_rows: int = MIN_TRAIN_ROWS,
+) -> Dict:
+    """Train from recent offer outcomes and publish when it beats the heuristic."""
+    X, y = training_rows(db, days=days)
+    if len(y) < min_rows or y.min() == y.max():
+        return {"published": False, "reason": "insufficient data", "rows": int(len(y))}
+    model = fit_acceptance_model(X, y)
+    m = model.metrics
+    if m["holdout_log_loss"] > m["heuristic_log_loss"]:
+        return {"published": False, "reason": "worse than heuristic", **m}
+    publish_model(model, directory=directory)
+    return {"published": True, "version": model.version, **m}
+
+
+# ----------------------------------------------------------------------
+# Serving
+# ----------------------------------------------------------------------
+
+class AcceptanceModelStore:
+    """Current published model, re-checked every ``check_s``."""
+
+    def __init__(self, directory: str = ACCEPTANCE_MODEL_DIR, *, check_s: float = 30.0):
+        self.directory = directory
+        self.check_s = check_s
+        self._model = HEURISTIC_MODEL
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> AcceptanceModel:
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_s
+                    self._reload()
+        return self._model
+
+    def _reload(self) -> None:
+        try:
+            with open(os.path.join(self.directory, _CURRENT)) as f:
+                version = json.load(f)["version"]
+            if version == self._model.version:
+                return
+            with open(os.path.join(self.directory, f"acceptance_{version}.json")) as f:
+                model = AcceptanceModel.from_dict(json.load(f))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("acceptance model reload failed, keeping %s: %s", self._model.version, e)
+            return
+        log.info("acceptance model %s loaded (was %s)", model.version, self._model.version)
+        self._model = model
+
+
+_shared: Optional[AcceptanceModelStore] = None
+_shared_lock = threading.Lock()
+
+
+def acceptance_model() -> AcceptanceModel:
+    """Process-wide current model (the heuristic until one is published)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = AcceptanceModelStore()
+    return _shared.get()
@@ -1,37 +1,145 @@
 from __future__ import annotations
+import os
+import sys
+import threading
 import time
 from collections import OrderedDict
 from typing import Any, Optional, Tuple
 
+# Default memory budget per cache instance; max_items stays as a secondary cap.
+DEFAULT_MAX_BYTES = int(os.getenv("ROUTER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+_EVICT_TO = 0.9  # evict in batches down to 90% of the budget
+
+
+_ENTRY_OVERHEAD = 160  # ordered-dict node and slot plus the (expires, size, value) tuple
+_SCALAR_SIZE = {int: sys.getsizeof(1 << 20), float: sys.getsizeof(1.0), type(None): 0}
+# Whole-entry size for scalar values, by value type.  Route keys are short
+# tuples, so one measured key stands in for all of them and the hot path of
+# ``set`` is a single dict lookup instead of a ``sys.getsizeof`` walk.
+_ROUTE_KEY_SIZE = sys.getsizeof(("t", 0.0, 0.0, 0.0, 0.0))
+_SCALAR_ENTRY = {t: _ROUTE_KEY_SIZE + _ENTRY_OVERHEAD + n for t, n in _SCALAR_SIZE.items()}
+
+
+def _sizeof(key: Any, val: Any) -> int:
+    """Approximate footprint of one entry (shallow, plus one level for containers)."""
+    n = sys.getsizeof(key) + _ENTRY_OVERHEAD
+    scalar = _SCALAR_SIZE.get(type(val))
+    if scalar is not None:
+        return n + scalar
+    n += sys.getsizeof(val)
+    if isinstance(val, (list, tuple)):
+        n += sum(sys.getsizeof(v) for v in val)
+    return n
+
+
+class _Shard:
+    __slots__ = ("lock", "data", "bytes", "next_sweep", "max_bytes", "max_items")
+
+    def __init__(self, max_bytes: int, max_items: int):
+        self.lock = threading.Lock()
+        # key -> (expires_at, size, value), in write order (so also expiry order)
+        self.data: OrderedDict[Any, Tuple[float, int, Any]] = OrderedDict()
+        self.bytes = 0
+        self.next_sweep = 0.0
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+
+
 class TTLCache:
-    """Tiny in-memory TTL LRU cache.
+    """Thread-safe in-memory TTL cache with a byte budget.
 
     Key should be hashable. Values can be any python object.
+
+    Keys are spread over independently locked shards.  Hits are lock-free
+    reads checked against a monotonic expiry; they do not reorder anything.
+    Each shard keeps entries in write order, which with a single TTL is also
+    expiry order, so expired entries are swept from the front in one batch
+    by the first write of each generation (every ``ttl_s / 8``).  When
+    a shard exceeds its share of ``max_bytes`` (or ``max_items``) the oldest
+    writes are evicted in one batch down to 90%.  Eviction is by write age,
+    not recency of reads.
     """
-    def __init__(self, max_items: int = 50_000, ttl_s: int = 30):
+    def __init__(
+        self,
+        max_items: int = 50_000,
+        ttl_s: int = 30,
+        *,
+        max_bytes: Optional[int] = None,
+        shards: int = 16,
+    ):
         self.max_items = max_items
         self.ttl_s = ttl_s
-        self._data: OrderedDict[Any, Tuple[float, Any]] = OrderedDict()
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        # Small caches get fewer shards so per-shard limits stay meaningful.
+        n = 1
+        while n * 2 <= shards and n * 2 * 1024 <= max_items:
+            n *= 2
+        self._mask = n - 1
+        self._shards = [
+            _Shard(max_bytes=max(1, self.max_bytes // n), max_items=max(1, -(-max_items // n)))
+            for _ in range(n)
+        ]
+        self._gen_s = max(ttl_s / 8.0, 0.01)
+
+    def __len__(self) -> int:
+        return sum(len(sh.data) for sh in self._shards)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(sh.bytes for sh in self._shards)
 
     def get(self, key: Any) -> Optional[Any]:
-        now = time.time()
-        item = self._data.get(key)
-        if not item:
+        sh = self._shards[hash(key) & self._mask]
+        item = sh.data.get(key)  # atomic under the GIL; no lock on hits
+        if item is None:
             return None
-        ts, val = item
-        if now - ts > self.ttl_s:
-            try:
-                del self._data[key]
-            except KeyError:
-                pass
+        if item[0] <= time.monotonic():
+            with sh.lock:
+                if sh.data.get(key) is item:
+                    del sh.data[key]
+                    sh.bytes -= item[1]
             return None
-        # refresh LRU
-        self._data.move_to_end(key, last=True)
-        return val
+        return item[2]
 
     def set(self, key: Any, val: Any) -> None:
-        now = time.time()
-        self._data[key] = (now, val)
-        self._data.move_to_end(key, last=True)
-        while len(self._data) > self.max_items:
-            self._data.popitem(last=False)
+        size = _SCALAR_ENTRY.get(type(val)) or _sizeof(key, val)
+        sh = self._shards[hash(key) & self._mask]
+        now = time.monotonic()
+        item = (now + self.ttl_s, size, val)
+        with sh.lock:
+            data = sh.data
+            old = data.setdefault(key, item)  # one lookup when the key is new
+            if old is not item:
+                data[key] = item
+                data.move_to_end(key)
+                size -= old[1]
+            sh.bytes += size
+            if now >= sh.next_sweep or sh.bytes > sh.max_bytes or len(data) > sh.max_items:
+                self._maintain(sh, now)
+
+    def clear(self) -> None:
+        for sh in self._shards:
+            with sh.lock:
+                sh.data.clear()
+                sh.bytes = 0
+
+    # -- internals (caller holds sh.lock) ------------------------------------
+
+    def _maintain(self, sh: _Shard, now: float) -> None:
+        data = sh.data
+        if now >= sh.next_sweep:
+            # Expired entries sit at the front of the shard: drop them in one batch.
+            sh.next_sweep = now + self._gen_s
+            while data:
+                item = data[next(iter(data))]
+                if item[0] > now:
+                    break
+                data.popitem(last=False)
+                sh.bytes -= item[1]
+        if sh.bytes > sh.max_bytes or len(data) > sh.max_items:
+            # Evict the oldest writes until back under 90% of the limits.
+            byte_goal = int(sh.max_bytes * _EVICT_TO)
+            item_goal = min(sh.max_items, max(1, int(sh.max_items * _EVICT_TO)))
+            while data and (sh.bytes > byte_goal or len(data) > item_goal):
+                _, item = data.popitem(last=False)
+                sh.bytes -= item[1]
@@ -0,0 +1,456 @@
+"""In-process road-graph router (``ROUTER_MODE=LOCAL_GRAPH``).
+
+Loads a preprocessed road graph -- e.g. the OSM Texas extract named by
+``snapshot["road_graph"]["graph_id"]`` -- into compact NumPy CSR arrays and
+answers queries without a network hop:
+
+  * point-to-point: bidirectional Dijkstra (forward + reverse CSR)
+  * one-to-many: single-source Dijkstra that stops once every target is
+    settled or ``ROAD_GRAPH_MAX_S`` is exceeded (used for matrices)
+
+Connected-component labels are computed at load time, so targets on an
+island the source cannot reach are skipped without a search.
+
+The searches are plain Python: a one-to-many query costs milliseconds
+per source on a city-sized graph, far too slow for the 3 s FAST tick.
+The FAST loop therefore never routes through this engine
+(``Router(local_graph=False)`` in ``packages.dispatch.eta``); it serves the
+precomputed store tables and the batch loop.  Each router also spends at
+most ``ROAD_GRAPH_SEARCH_BUDGET_S`` of search time per
+``ROAD_GRAPH_SEARCH_WINDOW_S`` (one batch tick by default); past that,
+queries fall back to haversine until the window rolls over.
+
+Graph file (``<ROAD_GRAPH_DIR>/<graph_id>.npz`` or ``ROAD_GRAPH_PATH``)::
+
+    lat, lng   float64[n]     node coordinates
+    indptr     int64[n + 1]   CSR row offsets (outgoing edges)
+    indices    int32[m]       edge heads
+    weights    float32[m]     edge travel time, seconds
+
+``scripts/build_road_graph.py`` builds one from node/edge CSV exports.
+Query points are snapped to the nearest node through a coarse lat/lng
+bucket grid; the snap distance is charged at the default haversine speed.
+Points that do not snap (too far from the graph) or are disconnected fall
+back to the haversine estimate.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from packages.router.cache import TTLCache
+from packages.router.router import haversine_time_matrix
+from packages.router.speed_model import DEFAULT_MPS
+
+log = logging.getLogger(__name__)
+
+ROAD_GRAPH_ID = os.getenv("ROAD_GRAPH_ID", "osm-texas")
+ROAD_GRAPH_DIR = os.getenv("ROAD_GRAPH_DIR", os.path.join("var", "road_graphs"))
+MAX_SNAP_M = float(os.getenv("ROAD_GRAPH_MAX_SNAP_M", "2000"))
+# Matrix searches stop at this many seconds (the dispatch horizon); longer legs use haversine.
+MAX_SEARCH_S = float(os.getenv("ROAD_GRAPH_MAX_S", str(45 * 60)))
+# Search time a router may spend per window (<= 0 disables the budget).
+SEARCH_BUDGET_S = float(os.getenv("ROAD_GRAPH_SEARCH_BUDGET_S", "10"))
+SEARCH_WINDOW_S = float(os.getenv("ROAD_GRAPH_SEARCH_WINDOW_S", "30"))
+_SNAP_CELL_DEG = 0.01  # ~1.1 km buckets for nearest-node search
+_INF = float("inf")
+
+LatLng = Tuple[float, float]
+
+
+def road_graph_path(graph_id: str = ROAD_GRAPH_ID) -> str:
+    return os.getenv("ROAD_GRAPH_PATH") or os.path.join(ROAD_GRAPH_DIR, f"{graph_id}.npz")
+
+
+def _reverse_csr(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray):
+    n = len(indptr) - 1
+    tails = np.repeat(np.arange(n, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    r_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n), out=r_indptr[1:])
+    return r_indptr, tails[order], weights[order]
+
+
+def _weak_components(n: int, tails: np.ndarray, heads: np.ndarray) -> np.ndarray:
+    """Weakly connected component label per node (smallest node id in the component).
+
+    Edges count in both directions: min-label hooking over every edge plus
+    pointer jumping, vectorized.  Different labels mean no path either way.
+    """
+    labels = np.arange(n, dtype=np.int64)
+    if len(tails) == 0:
+        return labels
+    while True:
+        lt, lh = labels[tails], labels[heads]
+        low = np.minimum(lt, lh)
+        new = labels.copy()
+        np.minimum.at(new, lt, low)
+        np.minimum.at(new, lh, low)
+        while True:
+            jumped = new[new]
+            if np.array_equal(jumped, new):
+                break
+            new = jumped
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+class RoadGraph:
+    """Directed road graph in CSR form with nearest-node snapping."""
+
+    def __init__(self, lat, lng, indptr, indices, weights, *, graph_id: str = ""):
+        self.graph_id = graph_id
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lng = np.ascontiguousarray(lng, dtype=np.float64)
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.int64)
+        self.indices = np.ascontiguousarray(indices, dtype=np.int32)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        n = len(self.lat)
+        if len(self.lng) != n or len(self.indptr) != n + 1 or len(self.indices) != len(self.weights):
+            raise ValueError("inconsistent road graph arrays")
+        r_indptr, r_indices, r_weights = _reverse_csr(self.indptr, self.indices, self.weights)
+        self.component = _weak_components(n, np.repeat(np.arange(n), np.diff(self.indptr)), self.indices)
+        self.last_settled = 0  # nodes settled by the latest times_from call
+        # memoryviews index to plain Python ints/floats without copying the arrays.
+        self._fwd = (memoryview(self.indptr), memoryview(self.indices), memoryview(self.weights))
+        self._bwd = (memoryview(r_indptr), memoryview(r_indices), memoryview(r_weights))
+        self._build_snap_grid()
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ------------------------------------------------------------------
+    # IO
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path: str, *, graph_id: Optional[str] = None) -> "RoadGraph":
+        with np.load(path) as z:
+            return cls(
+                z["lat"], z["lng"], z["indptr"], z["indices"], z["weights"],
+                graph_id=graph_id or os.path.splitext(os.path.basename(path))[0],
+            )
+
+    def save(self, path: str) -> None:
+        np.savez(path, lat=self.lat, lng=self.lng, indptr=self.indptr, indices=self.indices, weights=self.weights)
+
+    @classmethod
+    def from_edges(
+        cls,
+        lat: Sequence[float],
+        lng: Sequence[float],
+        edges: Iterable[Tuple[int, int, float]],
+        *,
+        bidirectional: bool = False,
+        graph_id: str = "",
+    ) -> "RoadGraph":
+        """Build from (tail, head, seconds) edges; ``bidirectional`` adds reverse edges."""
+        e = np.asarray(list(edges), dtype=np.float64).reshape(-1, 3)
+        tails, heads, w = e[:, 0].astype(np.int64), e[:, 1].astype(np.int64), e[:, 2]
+        if bidirectional:
+            tails, heads, w = np.concatenate([tails, heads]), np.concatenate([heads, tails]), np.concatenate([w, w])
+        n = len(lat)
+        order = np.lexsort((heads, tails))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+        return cls(lat, lng, indptr, heads[order], w[order], graph_id=graph_id)
+
+    # ------------------------------------------------------------------
+    # Snapping
+    # ------------------------------------------------------------------
+
+    def _build_snap_grid(self) -> None:
+        ky = np.floor(self.lat / _SNAP_CELL_DEG).astype(np.int64)
+        kx = np.floor(self.lng / _SNAP_CELL_DEG).astype(np.int64)
+        order = np.lexsort((kx, ky))
+        keys = np.stack([ky[order], kx[order]], axis=1)
+        self._snap_nodes = order
+        self._snap_cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        if len(order) == 0:
+            return
+        change = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        starts = np.concatenate([[0], change])
+        ends = np.concatenate([change, [len(order)]])
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            self._snap_cells[(int(keys[s, 0]), int(keys[s, 1]))] = (s, e)
+
+    def nearest_node(self, lat: float, lng: float, *, max_m: float = MAX_SNAP_M) -> Tuple[int, float]:
+        """(node, distance_m) of the closest node within ``max_m``; (-1, inf) if none."""
+        cy, cx = int(math.floor(lat / _SNAP_CELL_DEG)), int(math.floor(lng / _SNAP_CELL_DEG))
+        max_ring = int(math.ceil(max_m / (_SNAP_CELL_DEG * 111_320.0 * max(0.1, math.cos(math.radians(lat)))))) + 1
+        found: List[np.ndarray] = []
+        stop_at = max_ring
+        for r in range(0, max_ring + 1):
+            if r > stop_at:
+                break
+            for y in range(cy - r, cy + r + 1):
+                for x in range(cx - r, cx + r + 1):
+                    if max(abs(y - cy), abs(x - cx)) != r:
+                        continue
+                    span = self._snap_cells.get((y, x))
+                    if span is not None:
+                        found.append(self._snap_nodes[span[0]:span[1]])
+            if found and stop_at == max_ring:
+                stop_at = r + 1  # a closer node may sit just across the cell edge
+        if not found:
+            return -1, _INF
+        cand = np.concatenate(found)
+        p1, p2 = math.radians(lat), np.radians(self.lat[cand])
+        dphi = p2 - p1
+        dl = np.radians(self.lng[cand] - lng)
+        h = np.sin(dphi / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+        d = 2 * 6371000.0 * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+        i = int(np.argmin(d))
+        if d[i] > max_m:
+            return -1, _INF
+        return int(cand[i]), float(d[i])
+
+    # ------------------------------------------------------------------
+    # Shortest paths
+    # ------------------------------------------------------------------
+
+    def shortest_time(self, s: int, t: int) -> float:
+        """Bidirectional Dijkstra; seconds, or inf when t is unreachable."""
+        return self._bidirectional(s, t)[0]
+
+    def shortest_path(self, s: int, t: int) -> List[int]:
+        best, meet, pf, pb = self._bidirectional(s, t, keep_parents=True)
+        if best == _INF:
+            return []
+        path = []
+        u = meet
+        while u != -1:
+            path.append(u)
+            u = pf.get(u, -1)
+        path.reverse()
+        u = pb.get(meet, -1)
+        while u != -1:
+            path.append(u)
+            u = pb.get(u, -1)
+        return path
+
+    def _bidirectional(self, s: int, t: int, *, keep_parents: bool = False):
+        pf: Dict[int, int] = {}
+        pb: Dict[int, int] = {}
+        if s == t:
+            return 0.0, s, pf, pb
+        if self.component[s] != self.component[t]:
+            return _INF, -1, pf, pb
+        dist = ({s: 0.0}, {t: 0.0})
+        heaps = ([(0.0, s)], [(0.0, t)])
+        done = (set(), set())
+        graphs = (self._fwd, self._bwd)
+        parents = (pf, pb)
+        best, meet = _INF, -1
+        heappop, heappush = heapq.heappop, heapq.heappush
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            heap, d_self, d_other, settled = heaps[side], dist[side], dist[1 - side], done[side]
+            ip, ix, w = graphs[side]
+            parent = parents[side]
+            d, u = heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            for i in range(ip[u], ip[u + 1]):
+                v = ix[i]
+                nd = d + w[i]
+                if nd < d_self.get(v, _INF):
+                    d_self[v] = nd
+                    heappush(heap, (nd, v))
+                    if keep_parents:
+                        parent[v] = u
+                    other = d_other.get(v)
+                    if other is not None and nd + other < best:
+                        best, meet = nd + other, v
+        return best, meet, pf, pb
+
+    def times_from(self, s: int, targets: Iterable[int], *, max_s: float = _INF) -> Dict[int, float]:
+        """One-to-many Dijkstra from ``s``; stops once all reachable targets are settled.
+
+        Targets outside ``s``'s component are dropped up front and targets
+        further than ``max_s`` are left out, so a badly snapped point cannot
+        make the search sweep the whole graph.
+        """
+        comp = self.component
+        own = comp[s]
+        remaining = {t for t in targets if comp[t] == own}
+        out: Dict[int, float] = {}
+        self.last_settled = 0
+        if s in remaining:
+            out[s] = 0.0
+            remaining.discard(s)
+        if not remaining:
+            return out
+        ip, ix, w = self._fwd
+        dist = {s: 0.0}
+        heap = [(0.0, s)]
+        settled = set()
+        heappop, heappush = heapq.heappop, heapq.heappush
+        while heap and remaining:
+            d, u = heappop(heap)
+            if u in settled:
+                continue
+            if d > max_s:
+                break
+            settled.add(u)
+            if u in remaining:
+                out[u] = d
+                remaining.discard(u)
+            for i in range(ip[u], ip[u + 1]):
+                v = ix[i]
+                nd = d + w[i]
+                if nd < dist.get(v, _INF):
+                    dist[v] = nd
+                    heappush(heap, (nd, v))
+        self.last_settled = len(settled)
+        return out
+
+
+def _snap_seconds(dist_m: float) -> float:
+    return dist_m / DEFAULT_MPS
+
+
+class _SearchBudget:
+    """Search seconds left in the current window; ``budget_s`` <= 0 means unlimited."""
+
+    def __init__(self, budget_s: float, window_s: float):
+        self.budget_s = budget_s
+        self.window_s = max(window_s, 1e-3)
+        self._window_end = 0.0
+        self._spent = 0.0
+        self.skipped = 0  # searches refused since the router was created
+
+    def allow(self) -> bool:
+        if self.budget_s <= 0:
+            return True
+        now = time.monotonic()
+        if now >= self._window_end:
+            self._window_end = now + self.window_s
+            self._spent = 0.0
+        if self._spent < self.budget_s:
+            return True
+        self.skipped += 1
+        return False
+
+    def charge(self, seconds: float) -> None:
+        self._spent += seconds
+
+
+class LocalGraphRouter:
+    """Router engine over a ``RoadGraph`` (same surface as ``OSRMRouter``)."""
+
+    def __init__(
+        self,
+        graph: RoadGraph,
+        *,
+        ttl_s: int = 60,
+        max_items: int = 50_000,
+        max_s: float = MAX_SEARCH_S,
+        budget_s: float = SEARCH_BUDGET_S,
+        window_s: float = SEARCH_WINDOW_S,
+    ):
+        self.graph = graph
+        self.max_s = max_s
+        self.cache = TTLCache(max_items=max_items, ttl_s=ttl_s)
+        self.budget = _SearchBudget(budget_s, window_s)
+
+    @classmethod
+    def from_env(cls, *, graph_id: str = ROAD_GRAPH_ID, **kwargs) -> "LocalGraphRouter":
+        path = road_graph_path(graph_id)
+        graph = RoadGraph.load(path, graph_id=graph_id)
+        log.info("loaded road graph %s: %d nodes, %d edges", path, len(graph), len(graph.indices))
+        return cls(graph, **kwargs)
+
+    def cache_stats(self) -> dict:
+        return {"l1_size": len(self.cache), "graph_nodes": len(self.graph), "budget_skips": self.budget.skipped}
+
+    def _snap(self, p: LatLng) -> Tuple[int, float]:
+        key = ("snap", round(p[0], 5), round(p[1], 5))
+        hit = self.cache.get(key)
+        if hit is None:
+            hit = self.graph.nearest_node(p[0], p[1])
+            self.cache.set(key, hit)
+        return hit
+
+    @staticmethod
+    def _fallback(a: LatLng, b: LatLng) -> int:
+        return int(haversine_time_matrix([a], [b])[0, 0])
+
+    def route_time_latlng(self, a: LatLng, b: LatLng) -> int:
+        key = ("lg_t", round(a[0], 5), round(a[1], 5), round(b[0], 5), round(b[1], 5))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return int(cached)
+        (na, da), (nb, db) = self._snap(a), self._snap(b)
+        t = _INF
+        if na >= 0 and nb >= 0 and self.budget.allow():
+            t0 = time.perf_counter()
+            t = self.graph.shortest_time(na, nb)
+            self.budget.charge(time.perf_counter() - t0)
+        if t == _INF:
+            t_s = self._fallback(a, b)
+        else:
+            t_s = max(1, int(round(t + _snap_seconds(da) + _snap_seconds(db))))
+            self.cache.set(key, t_s)
+        return t_s
+
+    def route_path_latlng(self, a: LatLng, b: LatLng) -> Optional[List[LatLng]]:
+        """Node coordinates along the fastest path (None if not routable)."""
+        (na, _), (nb, _) = self._snap(a), self._snap(b)
+        if na < 0 or nb < 0:
+            return None
+        nodes = self.graph.shortest_path(na, nb)
+        if not nodes:
+            return None
+        return [(float(self.graph.lat[u]), float(self.graph.lng[u])) for u in nodes]
+
+    def matrix(self, sources: Sequence[LatLng], destinations: Sequence[LatLng]) -> List[List[int]]:
+        """Sources x destinations via one early-exit Dijkstra per distinct source node.
+
+        Pairs with no road path within ``max_s``, and sources left once the
+        search budget is spent, fall back to haversine.
+        """
+        if not sources or not destinations:
+            return [[] for _ in sources]
+        src = [self._snap(tuple(p)) for p in sources]
+        dst = [self._snap(tuple(p)) for p in destinations]
+        targets = {n for n, _ in dst if n >= 0}
+        out = np.full((len(sources), len(destinations)), -1, dtype=np.int64)
+        by_node: Dict[int, Dict[int, float]] = {}
+        for i, (ns, ds) in enumerate(src):
+            if ns < 0:
+                continue
+            times = by_node.get(ns)
+            if times is None:
+                if not self.budget.allow():
+                    continue
+                t0 = time.perf_counter()
+                times = by_node[ns] = self.graph.times_from(ns, targets, max_s=self.max_s)
+                self.budget.charge(time.perf_counter() - t0)
+            for j, (nd, dd) in enumerate(dst):
+                t = times.get(nd) if nd >= 0 else None
+                if t is not None:
+                    out[i, j] = max(1, int(round(t + _snap_seconds(ds) + _snap_seconds(dd))))
+        missing = out < 0
+        if missing.any():
+            fb = haversine_time_matrix(sources, destinations)
+            out[missing] = fb[missing]
+        return out.tolist()
+
+    def batch_matrix(self, points: List[LatLng]) -> List[List[int]]:
+        if not points:
+            return []
+        m = np.asarray(self.matrix(points, points), dtype=np.int64)
+        np.fill_diagonal(m, 0)
+        return m.tolist()
+
@@ -0,0 +1,185 @@
+"""Travel-time matrices over stable location ids, cached across ticks.
+
+The BATCH loop rebuilds a time matrix for every cluster / partition every
+~30 s, yet most of its locations repeat from tick to tick: pickups are a
+handful of stores, pending orders keep their drop-offs until dispatched,
+and drivers move between a limited set of cells.  ``TimeMatrixService``
+keys locations by id (``store:<id>``, ``drop:<order_id>``,
+``cell:<lat>:<lng>`` -- see ``batch_loop``) and keeps every pairwise leg
+it has computed in one dense int32 array:
+
+  * ``matrix(locations)`` maps ids to slots, computes only the legs that
+    touch locations it has not seen yet (vectorized haversine blocks, or
+    ``Router.matrix`` calls with ``TIME_MATRIX_FILL=ROUTER``), and returns
+    the submatrix by fancy indexing;
+  * the array grows by doubling up to ``TIME_MATRIX_MAX_LOCATIONS`` and then
+    evicts least-recently-used locations;
+  * legs are dropped when the speed model or its hour-of-week bucket
+    changes, and per location when an id shows up with new coordinates.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from packages.router.router import haversine_time_matrix
+from packages.router.speed_model import speed_model
+from packages.router.store_tables import MatrixFn
+
+log = logging.getLogger(__name__)
+
+MAX_LOCATIONS = int(os.getenv("TIME_MATRIX_MAX_LOCATIONS", "4096"))
+FILL = os.getenv("TIME_MATRIX_FILL", "HAVERSINE").upper()  # HAVERSINE | ROUTER
+_INITIAL_SLOTS = 256
+# An id whose coordinates moved further than this is treated as a new place.
+_MOVED_DEG = 1e-5
+
+Location = Tuple[str, float, float]  # (location id, lat, lng)
+
+
+class TimeMatrixService:
+    """Pairwise travel times between location ids, reused across calls."""
+
+    def __init__(self, *, max_locations: int = MAX_LOCATIONS, fill: Optional[MatrixFn] = None):
+        self.max_locations = max(2, max_locations)
+        self._fill = fill
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._tick = 0
+        self.pair_hits = 0
+        self.pair_misses = 0
+        self._allocate(min(_INITIAL_SLOTS, self.max_locations))
+
+    def _allocate(self, n: int) -> None:
+        self._slot: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = [None] * n
+        self._coords = np.zeros((n, 2), dtype=np.float64)
+        self._tt = np.full((n, n), -1, dtype=np.int32)
+        self._last_used = np.zeros(n, dtype=np.int64)
+        self._free = list(range(n - 1, -1, -1))
+
+    def _grow(self) -> bool:
+        n = len(self._ids)
+        if n >= self.max_locations:
+            return False
+        m = min(2 * n, self.max_locations)
+        tt = np.full((m, m), -1, dtype=np.int32)
+        tt[:n, :n] = self._tt
+        self._tt = tt
+        self._coords = np.vstack([self._coords, np.zeros((m - n, 2))])
+        self._last_used = np.concatenate([self._last_used, np.zeros(m - n, dtype=np.int64)])
+        self._ids.extend([None] * (m - n))
+        self._free.extend(range(m - 1, n - 1, -1))
+        return True
+
+    def _forget(self, slot: int) -> None:
+        self._tt[slot, :] = -1
+        self._tt[:, slot] = -1
+
+    def _slot_for(self, loc_id: str, lat: float, lng: float) -> int:
+        slot = self._slot.get(loc_id)
+        if slot is not None:
+            if abs(self._coords[slot, 0] - lat) > _MOVED_DEG or abs(self._coords[slot, 1] - lng) > _MOVED_DEG:
+                self._forget(slot)
+                self._coords[slot] = (lat, lng)
+            self._last_used[slot] = self._tick
+            return slot
+        if not self._free and not self._grow():
+            # Evict the least recently used location not needed by this call.
+            stale = np.flatnonzero(self._last_used < self._tick)
+            slot = int(stale[np.argmin(self._last_used[stale])])
+            del self._slot[self._ids[slot]]
+            self._forget(slot)
+        else:
+            slot = self._free.pop()
+        self._slot[loc_id] = slot
+        self._ids[slot] = loc_id
+        self._coords[slot] = (lat, lng)
+        self._last_used[slot] = self._tick
+        return slot
+
+    def _compute(self, src: np.ndarray, dst: np.ndarray, ts: Optional[float]) -> np.ndarray:
+        if self._fill is not None:
+            return np.asarray(self._fill(src.tolist(), dst.tolist()), dtype=np.int64).reshape(len(src), len(dst))
+        return haversine_time_matrix(src, dst, ts=ts)
+
+    def matrix(self, locations: Sequence[Location], *, ts: Optional[float] = None) -> np.ndarray:
+        """len(locations) x len(locations) travel seconds (int64), zero on the diagonal.
+
+        Repeated ids are allowed (e.g. two orders from the same store).
+        """
+        if not locations:
+            return np.zeros((0, 0), dtype=np.int64)
+        model = speed_model()
+        epoch = (id(model), model.hour_of_week(ts))
+        with self._lock:
+            if epoch != self._epoch:
+                self._allocate(len(self._ids))
+                self._epoch = epoch
+            self._tick += 1
+            distinct = dict.fromkeys(loc[0] for loc in locations)
+            if len(distinct) > len(self._ids) and not self._reserve(len(distinct)):
+                # More distinct places than the cache holds: compute directly.
+                pts = np.array([(float(lat), float(lng)) for _, lat, lng in locations])
+                tt = self._compute(pts, pts, ts)
+                np.fill_diagonal(tt, 0)
+                return tt
+            idx = np.array([self._slot_for(i, float(lat), float(lng)) for i, lat, lng in locations])
+            uniq = np.unique(idx)
+            fresh = 0
+            # A slot with an unknown diagonal is new (or moved): fill its row
+            # and column against every location of this call.
+            is_new = self._tt[uniq, uniq] < 0
+            new, old = uniq[is_new], uniq[~is_new]
+            if len(new):
+                self._tt[np.ix_(new, uniq)] = self._compute(self._coords[new], self._coords[uniq], ts)
+                self._tt[new, new] = 0
+                fresh += len(new) * len(uniq)
+                if len(old):
+                    self._tt[np.ix_(old, new)] = self._compute(self._coords[old], self._coords[new], ts)
+                    fresh += len(old) * len(new)
+            # Known locations first seen in different calls may still miss a leg.
+            rows = old[(self._tt[np.ix_(old, old)] < 0).any(axis=1)]
+            if len(rows):
+                self._tt[np.ix_(rows, old)] = self._compute(self._coords[rows], self._coords[old], ts)
+                self._tt[rows, rows] = 0
+                fresh += len(rows) * len(old)
+            self.pair_misses += fresh
+            self.pair_hits += max(0, len(uniq) * len(uniq) - fresh)
+            return self._tt[np.ix_(idx, idx)].astype(np.int64)
+
+    def _reserve(self, n: int) -> bool:
+        while len(self._ids) < n:
+            if not self._grow():
+                return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "locations": len(self._slot),
+            "slots": len(self._ids),
+            "pair_hits": self.pair_hits,
+            "pair_misses": self.pair_misses,
+        }
+
+
+_shared: Optional[TimeMatrixService] = None
+_shared_lock = threading.Lock()
+
+
+def time_matrix_service() -> TimeMatrixService:
+    """Process-wide service (``TIME_MATRIX_FILL=ROUTER`` fills from ``Router.matrix``)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                fill = None
+                if FILL == "ROUTER":
+                    from packages.router.router import Router
+                    fill = Router().matrix
+                _shared = TimeMatrixService(fill=fill)
+    return _shared
@@ -2,38 +2,281 @@
 
 Set ROUTER_MODE=OSRM and optionally OSRM_BASE_URL to activate.
 Defaults to the public OSRM demo server for development.
+
+All HTTP goes through one pooled keep-alive session per router, at most
+``OSRM_MAX_CONCURRENCY`` requests in flight, and concurrent callers asking
+for the same URL share a single outstanding request (coalescing).
+``packages.router.osrm_async`` is the asyncio variant for the API.
 """
 from __future__ import annotations
 
 import logging
 import os
-from typing import List, Optional, Tuple
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from packages.router.cache import TTLCache
+from packages.router.route_cache import RouteTimeCache, l2_from_env
+from packages.router.router import haversine_time_matrix
 
 log = logging.getLogger(__name__)
 
 OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
 PROFILE = "car"
+# Table requests are chunked to stay under the server's --max-table-size
+# and typical proxy URL limits.
+MAX_TABLE_POINTS = int(os.getenv("OSRM_MAX_TABLE_POINTS", "100"))
+MAX_URL_LEN = int(os.getenv("OSRM_MAX_URL_LEN", "8000"))
+MAX_CONCURRENCY = int(os.getenv("OSRM_MAX_CONCURRENCY", "8"))
+POOL_SIZE = int(os.getenv("OSRM_POOL_SIZE", "16"))
+_URL_CHARS_PER_POINT = 28  # "-97.123456,30.123456;" plus its sources/destinations index
+
+LatLng = Tuple[float, float]
+
+
+# ----------------------------------------------------------------------
+# URLs, responses and matrix bookkeeping (shared with osrm_async)
+# ----------------------------------------------------------------------
+
+def new_route_cache(*, ttl_s: int, max_items: int) -> RouteTimeCache:
+    """Per-leg OSRM time cache: local LRU over the ``ROUTE_CACHE_L2`` shared store."""
+    return RouteTimeCache(
+        namespace=f"osrm:{PROFILE}", l1_ttl_s=ttl_s, l1_max_items=max_items, l2=l2_from_env()
+    )
+
+
+def route_url(base: str, a: LatLng, b: LatLng) -> str:
+    coords = f"{a[1]},{a[0]};{b[1]},{b[0]}"  # OSRM uses lng,lat
+    return f"{base}/route/v1/{PROFILE}/{coords}?overview=full"
+
+
+def table_url(base: str, sources: Sequence[LatLng], destinations: Sequence[LatLng]) -> str:
+    points = list(sources) + list(destinations)
+    coords = ";".join(f"{p[1]:.6f},{p[0]:.6f}" for p in points)  # OSRM uses lng,lat
+    src_idx = ";".join(str(i) for i in range(len(sources)))
+    dst_idx = ";".join(str(len(sources) + j) for j in range(len(destinations)))
+    return f"{base}/table/v1/{PROFILE}/{coords}?sources={src_idx}&destinations={dst_idx}"
+
+
+def parse_route(data: dict) -> Optional[dict]:
+    if data.get("code") == "Ok" and data.get("routes"):
+        return data["routes"][0]
+    return None
+
+
+def parse_table(data: dict) -> Optional[List[List[Optional[int]]]]:
+    """Durations in seconds (None for unroutable cells), or None if the request failed."""
+    if data.get("code") != "Ok":
+        return None
+    return [
+        [max(1, int(cell)) if cell is not None else None for cell in row]
+        for row in data["durations"]
+    ]
+
+
+def table_chunks(rows: List[int], cols: List[int]) -> Iterable[Tuple[List[int], List[int]]]:
+    """Split rows x cols into blocks whose point count fits one table request."""
+    by_url = max(2, (MAX_URL_LEN - 200) // _URL_CHARS_PER_POINT)
+    max_pts = max(2, min(MAX_TABLE_POINTS, by_url))
+    rs = min(len(rows), max(1, max_pts - min(len(cols), max_pts // 2)))
+    cs = max(1, max_pts - rs)
+    for r0 in range(0, len(rows), rs):
+        for c0 in range(0, len(cols), cs):
+            yield rows[r0:r0 + rs], cols[c0:c0 + cs]
+
+
+def cached_matrix(times: RouteTimeCache, sources: Sequence[LatLng], destinations: Sequence[LatLng]) -> np.ndarray:
+    """Matrix of cached cells (one batched L1/L2 lookup); -1 where nothing is cached yet."""
+    sources = [tuple(a) for a in sources]
+    destinations = [tuple(b) for b in destinations]
+    found = times.get_many((a, b) for a in sources for b in destinations)
+    out = np.full((len(sources), len(destinations)), -1, dtype=np.int64)
+    if found:
+        for i, a in enumerate(sources):
+            for j, b in enumerate(destinations):
+                cached = found.get((a, b))
+                if cached is not None:
+                    out[i, j] = cached
+    return out
+
+
+def missing_chunks(out: np.ndarray) -> List[Tuple[List[int], List[int]]]:
+    """Table-request blocks that cover every missing (-1) cell of ``out``."""
+    missing = out < 0
+    if not missing.any():
+        return []
+    rows = np.flatnonzero(missing.any(axis=1)).tolist()
+    cols = np.flatnonzero(missing.any(axis=0)).tolist()
+    return [(r, c) for r, c in table_chunks(rows, cols) if missing[np.ix_(r, c)].any()]
+
+
+def merge_block(
+    times: RouteTimeCache,
+    out: np.ndarray,
+    chunk: Tuple[List[int], List[int]],
+    block: Optional[List[List[Optional[int]]]],
+    sources: Sequence[LatLng],
+    destinations: Sequence[LatLng],
+) -> None:
+    """Write one table response into ``out`` and the per-cell cache."""
+    if block is None:
+        return
+    r_chunk, c_chunk = chunk
+    fresh = {}
+    for ii, i in enumerate(r_chunk):
+        for jj, j in enumerate(c_chunk):
+            cell = block[ii][jj]
+            if out[i, j] < 0 and cell is not None:
+                out[i, j] = cell
+                fresh[(tuple(sources[i]), tuple(destinations[j]))] = cell
+    times.set_many(fresh)
+
+
+def fill_missing_with_haversine(out: np.ndarray, sources: Sequence[LatLng], destinations: Sequence[LatLng]) -> None:
+    """Vectorized haversine estimate for cells OSRM did not provide (not cached)."""
+    still = out < 0
+    if not still.any():
+        return
+    rows = np.flatnonzero(still.any(axis=1))
+    cols = np.flatnonzero(still.any(axis=0))
+    fb = haversine_time_matrix([sources[i] for i in rows], [destinations[j] for j in cols])
+    sub = out[np.ix_(rows, cols)]
+    out[np.ix_(rows, cols)] = np.where(sub < 0, fb, sub)
+
+
+# ----------------------------------------------------------------------
+# Coalescing
+# ----------------------------------------------------------------------
+
+class InFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.coalesced = 0
+
+    def run(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
 
 
 class OSRMRouter:
     """OSRM-backed router providing travel times and polylines."""
 
-    def __init__(self, *, ttl_s: int = 60, max_items: int = 50_000):
+    def __init__(
+        self,
+        *,
+        ttl_s: int = 60,
+        max_items: int = 50_000,
+        base_url: Optional[str] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        pool_size: int = POOL_SIZE,
+        route_cache: Optional[RouteTimeCache] = None,
+    ):
         self.cache = TTLCache(max_items=max_items, ttl_s=ttl_s)
-        self.base = OSRM_BASE_URL.rstrip("/")
+        self.times = route_cache or new_route_cache(ttl_s=ttl_s, max_items=max_items)
+        self.base = (base_url or OSRM_BASE_URL).rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.pool_size = max(pool_size, self.max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._inflight = InFlight()
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.requests_sent = 0
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _http(self):
+        """Lazily created keep-alive session sized for ``pool_size`` connections."""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _get_json(self, url: str, *, timeout: float) -> dict:
+        """GET ``url`` through the pool; identical concurrent URLs share one request."""
+        def fetch() -> dict:
+            session = self._http()
+            with self._slots:
+                with self._lock:
+                    self.requests_sent += 1
+                resp = session.get(url, timeout=timeout)
+                resp.raise_for_status()
+                return resp.json()
+
+        return self._inflight.run(url, fetch)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="osrm"
+                )
+            return self._executor
+
+    @property
+    def coalesced(self) -> int:
+        return self._inflight.coalesced
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    # ------------------------------------------------------------------
+    # Routing API
+    # ------------------------------------------------------------------
+
+    def cache_stats(self) -> dict:
+        return self.times.stats()
 
     def route_time_latlng(self, a: Tuple[float, float], b: Tuple[float, float]) -> int:
         """Travel time in seconds between two lat/lng points."""
-        key = ("osrm_t", round(a[0], 5), round(a[1], 5), round(b[0], 5), round(b[1], 5))
-        cached = self.cache.get(key)
+        cached = self.times.get(a, b)
         if cached is not None:
-            return int(cached)
+            return cached
 
         result = self._route(a, b)
-        t_s = int(result["duration"]) if result else self._haversine_fallback(a, b)
-        self.cache.set(key, t_s)
+        if not result:
+            return self._haversine_fallback(a, b)
+        t_s = int(result["duration"])
+        self.times.set(a, b, t_s)
         return t_s
 
     def route_path_latlng(
@@ -56,14 +299,10 @@ class OSRMRouter:
         if cached is not None:
             return cached
 
-        import requests
-
         coords = ";".join(f"{p[1]},{p[0]}" for p in points)  # OSRM uses lng,lat
         url = f"{self.base}/table/v1/{PROFILE}/{coords}"
         try:
-            resp = requests.get(url, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
+            data = self._get_json(url, timeout=15)
             if data.get("code") == "Ok":
                 matrix = [
                     [max(1, int(cell)) if cell is not None else 9999 for cell in row]
@@ -83,18 +322,53 @@ class OSRMRouter:
                     matrix[i][j] = self._haversine_fallback(points[i], points[j])
         return matrix
 
+    def matrix(
+        self,
+        sources: Sequence[Tuple[float, float]],
+        destinations: Sequence[Tuple[float, float]],
+    ) -> List[List[int]]:
+        """Sources x destinations travel times via OSRM ``sources=``/``destinations=``.
+
+        Cells already cached (from earlier matrices or route lookups) are
+        reused; only rows/columns with missing cells are requested, chunked
+        under ``MAX_TABLE_POINTS``/``MAX_URL_LEN`` and fetched concurrently.
+        Cells OSRM could not provide fall back to a vectorized haversine
+        estimate (not cached).
+        """
+        if not sources or not destinations:
+            return [[] for _ in sources]
+
+        out = cached_matrix(self.times, sources, destinations)
+        chunks = missing_chunks(out)
+        if not chunks:
+            return out.tolist()
+        if len(chunks) == 1:
+            r, c = chunks[0]
+            blocks = [self._table([sources[i] for i in r], [destinations[j] for j in c])]
+        else:
+            blocks = list(self._pool().map(
+                lambda rc: self._table([sources[i] for i in rc[0]], [destinations[j] for j in rc[1]]),
+                chunks,
+            ))
+        for chunk, block in zip(chunks, blocks):
+            merge_block(self.times, out, chunk, block, sources, destinations)
+        fill_missing_with_haversine(out, sources, destinations)
+        return out.tolist()
+
+    def _table(
+        self, sources: List[Tuple[float, float]], destinations: List[Tuple[float, float]]
+    ) -> Optional[List[List[Optional[int]]]]:
+        """One OSRM table request; durations in seconds (None for unroutable cells)."""
+        try:
+            return parse_table(self._get_json(table_url(self.base, sources, destinations), timeout=15))
+        except Exception as e:
+            log.error("OSRM table failed: %s", e)
+        return None
+
     def _route(self, a: Tuple[float, float], b: Tuple[float, float]) -> Optional[dict]:
         """Call OSRM route service."""
-        import requests
-
-        coords = f"{a[1]},{a[0]};{b[1]},{b[0]}"  # OSRM uses lng,lat
-        url = f"{self.base}/route/v1/{PROFILE}/{coords}?overview=full"
         try:
-            resp = requests.get(url, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            if data.get("code") == "Ok" and data.get("routes"):
-                return data["routes"][0]
+            return parse_route(self._get_json(route_url(self.base, a, b), timeout=10))
         except Exception as e:
             log.error("OSRM route failed: %s", e)
         return None
@@ -102,14 +376,4 @@ class OSRMRouter:
     @staticmethod
     def _haversine_fallback(a: Tuple[float, float], b: Tuple[float, float]) -> int:
         """Fallback haversine estimate when OSRM is unavailable."""
-        import math
-
-        R = 6371000.0
-        p1, p2 = math.radians(a[0]), math.radians(b[0])
-        dphi = math.radians(b[0] - a[0])
-        dl = math.radians(b[1] - a[1])
-        h = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
-        dist_m = 2 * R * math.asin(math.sqrt(h))
-        mph = 35.0
-        mps = (mph * 1609.34) / 3600.0
-        return max(5, int(dist_m / mps * 1.25))
+        return int(haversine_time_matrix([a], [b])[0, 0])
@@ -0,0 +1,183 @@
+"""asyncio OSRM client for the API process.
+
+Same two-tier route cache, URLs and matrix chunking as ``OSRMRouter`` but on a
+pooled ``httpx.AsyncClient``: an ``asyncio.Semaphore`` bounds requests in
+flight and concurrent awaits of the same URL share one request.  Use
+``shared_async_osrm()`` from request handlers; the app closes it on
+shutdown via ``close_shared_async_osrm()``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from packages.router.osrm import (
+    MAX_CONCURRENCY,
+    OSRM_BASE_URL,
+    POOL_SIZE,
+    OSRMRouter,
+    cached_matrix,
+    fill_missing_with_haversine,
+    merge_block,
+    missing_chunks,
+    new_route_cache,
+    parse_route,
+    parse_table,
+    route_url,
+    table_url,
+)
+from packages.router.route_cache import RouteTimeCache
+
+log = logging.getLogger(__name__)
+
+LatLng = Tuple[float, float]
+
+
+class AsyncOSRMRouter:
+    """Async counterpart of ``OSRMRouter`` (route times, polylines, matrices)."""
+
+    def __init__(
+        self,
+        *,
+        ttl_s: int = 60,
+        max_items: int = 50_000,
+        base_url: Optional[str] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        pool_size: int = POOL_SIZE,
+        route_cache: Optional[RouteTimeCache] = None,
+    ):
+        self.times = route_cache or new_route_cache(ttl_s=ttl_s, max_items=max_items)
+        self.base = (base_url or OSRM_BASE_URL).rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.pool_size = max(pool_size, self.max_concurrency)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._client = None
+        self.requests_sent = 0
+        self.coalesced = 0
+
+    async def __aenter__(self) -> "AsyncOSRMRouter":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    def _http(self):
+        if self._client is None:
+            import httpx
+
+            limits = httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            )
+            self._client = httpx.AsyncClient(limits=limits)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+
+    async def _get_json(self, url: str, *, timeout: float) -> dict:
+        """GET ``url`` through the pool; identical concurrent URLs share one request."""
+        fut = self._inflight.get(url)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[url] = fut
+        try:
+            client = self._http()
+            async with self._slots:
+                self.requests_sent += 1
+                resp = await client.get(url, timeout=timeout)
+                resp.raise_for_status()
+                data = resp.json()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            fut.set_result(data)
+            return data
+        finally:
+            self._inflight.pop(url, None)
+
+    async def _cache_call(self, fn, *args):
+        # A shared (Redis/SQLite) L2 is blocking I/O; keep it off the event loop.
+        if self.times.l2 is not None:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def route_time_latlng(self, a: LatLng, b: LatLng) -> int:
+        """Travel time in seconds between two lat/lng points."""
+        cached = await self._cache_call(self.times.get, a, b)
+        if cached is not None:
+            return cached
+
+        result = await self._route(a, b)
+        if not result:
+            return OSRMRouter._haversine_fallback(a, b)
+        t_s = int(result["duration"])
+        await self._cache_call(self.times.set, a, b, t_s)
+        return t_s
+
+    async def route_path_latlng(self, a: LatLng, b: LatLng) -> Optional[str]:
+        """Encoded polyline between two lat/lng points."""
+        result = await self._route(a, b)
+        if result:
+            return result.get("geometry")
+        return None
+
+    async def matrix(self, sources: Sequence[LatLng], destinations: Sequence[LatLng]) -> List[List[int]]:
+        """Sources x destinations travel times; see ``OSRMRouter.matrix``."""
+        if not sources or not destinations:
+            return [[] for _ in sources]
+
+        out = await self._cache_call(cached_matrix, self.times, sources, destinations)
+        chunks = missing_chunks(out)
+        blocks = await asyncio.gather(*(
+            self._table([sources[i] for i in r], [destinations[j] for j in c]) for r, c in chunks
+        ))
+        for chunk, block in zip(chunks, blocks):
+            await self._cache_call(merge_block, self.times, out, chunk, block, sources, destinations)
+        fill_missing_with_haversine(out, sources, destinations)
+        return out.tolist()
+
+    async def _table(self, sources: List[LatLng], destinations: List[LatLng]) -> Optional[List[List[Optional[int]]]]:
+        try:
+            return parse_table(await self._get_json(table_url(self.base, sources, destinations), timeout=15))
+        except Exception as e:
+            log.error("OSRM table failed: %s", e)
+        return None
+
+    async def _route(self, a: LatLng, b: LatLng) -> Optional[dict]:
+        try:
+            return parse_route(await self._get_json(route_url(self.base, a, b), timeout=10))
+        except Exception as e:
+            log.error("OSRM route failed: %s", e)
+        return None
+
+
+_shared: Optional[AsyncOSRMRouter] = None
+
+
+def shared_async_osrm() -> AsyncOSRMRouter:
+    """Process-wide async client so API requests share one connection pool."""
+    global _shared
+    if _shared is None:
+        _shared = AsyncOSRMRouter()
+    return _shared
+
+
+async def close_shared_async_osrm() -> None:
+    global _shared
+    if _shared is not None:
+        await _shared.aclose()
+        _shared = None
@@ -0,0 +1,276 @@
+"""Two-tier route-time cache: in-process LRU (L1) over a shared store (L2).
+
+Every worker and API replica otherwise recomputes the same store ->
+neighbourhood legs, and a per-process cache starts cold after each deploy.
+``RouteTimeCache`` checks the local ``TTLCache`` first, then a shared L2
+(Redis, or a SQLite file as a single-host stand-in), and writes misses
+through to both.
+
+Keys are quantized coordinates (``ROUTE_CACHE_PRECISION`` decimals, 4 ~=
+11 m) plus a time-of-day bucket in ``ROUTE_CACHE_TZ``, so a leg cached in
+the evening peak is not served at 3am.  L2 failures are counted and the
+L2 is skipped for ``l2_cooldown_s`` so an unreachable Redis costs one
+timeout, not one per lookup.
+
+Config (env):
+  ROUTE_CACHE_L2            none | redis | sqlite:/path/to/file.db  (default none)
+  ROUTE_CACHE_L1_TTL_S      default: the caller's ttl_s
+  ROUTE_CACHE_L2_TTL_S      default 43200 (12h)
+  ROUTE_CACHE_PRECISION     default 4
+  ROUTE_CACHE_TOD_BUCKET_MIN  default 60
+  ROUTE_CACHE_TZ            default America/Chicago
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from packages.router.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+LatLng = Tuple[float, float]
+Pair = Tuple[LatLng, LatLng]
+
+L2_TTL_S = int(os.getenv("ROUTE_CACHE_L2_TTL_S", str(12 * 3600)))
+PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", "4"))
+TOD_BUCKET_MIN = int(os.getenv("ROUTE_CACHE_TOD_BUCKET_MIN", "60"))
+TZ = os.getenv("ROUTE_CACHE_TZ", "America/Chicago")
+
+
+# ----------------------------------------------------------------------
+# L2 backends
+# ----------------------------------------------------------------------
+
+class RedisL2:
+    """Redis L2: ``MGET`` for lookups, pipelined ``SET ... EX`` for writes."""
+
+    def __init__(self, client=None, *, url: Optional[str] = None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+                decode_responses=True,
+                socket_connect_timeout=0.25,
+                socket_timeout=0.25,
+            )
+        self.client = client
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[int]]:
+        if not keys:
+            return []
+        return [int(v) if v is not None else None for v in self.client.mget(list(keys))]
+
+    def set_many(self, items: Dict[str, int], ttl_s: int) -> None:
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for k, v in items.items():
+            pipe.set(k, int(v), ex=ttl_s)
+        pipe.execute()
+
+
+class SQLiteL2:
+    """Single-host stand-in for Redis: one SQLite file shared by local processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS route_times (k TEXT PRIMARY KEY, v INTEGER NOT NULL, exp REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[int]]:
+        if not keys:
+            return []
+        found: Dict[str, int] = {}
+        now = time.time()
+        keys = list(keys)
+        for i in range(0, len(keys), 500):  # SQLite variable limit
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self._conn().execute(
+                f"SELECT k, v FROM route_times WHERE k IN ({marks}) AND exp > ?", (*chunk, now)
+            )
+            found.update(rows)
+        return [found.get(k) for k in keys]
+
+    def set_many(self, items: Dict[str, int], ttl_s: int) -> None:
+        if not items:
+            return
+        exp = time.time() + ttl_s
+        self._conn().executemany(
+            "INSERT OR REPLACE INTO route_times (k, v, exp) VALUES (?, ?, ?)",
+            [(k, int(v), exp) for k, v in items.items()],
+        )
+
+
+def l2_from_env():
+    """L2 backend selected by ``ROUTE_CACHE_L2`` (None when disabled)."""
+    spec = os.getenv("ROUTE_CACHE_L2", "none").strip()
+    if not spec or spec.lower() == "none":
+        return None
+    try:
+        if spec.lower() == "redis":
+            return RedisL2()
+        if spec.lower().startswith("sqlite:"):
+            return SQLiteL2(spec.split(":", 1)[1])
+    except Exception as e:
+        log.warning("route cache L2 %r unavailable, using L1 only: %s", spec, e)
+        return None
+    log.warning("unknown ROUTE_CACHE_L2=%r, using L1 only", spec)
+    return None
+
+
+# ----------------------------------------------------------------------
+# Two-tier cache
+# ----------------------------------------------------------------------
+
+class RouteTimeCache:
+    """Route times (seconds) keyed by quantized (a, b) and time-of-day bucket."""
+
+    def __init__(
+        self,
+        *,
+        namespace: str,
+        l1_ttl_s: int = 60,
+        l1_max_items: int = 50_000,
+        l2=None,
+        l2_ttl_s: int = L2_TTL_S,
+        precision: int = PRECISION,
+        tod_bucket_min: int = TOD_BUCKET_MIN,
+        tz: str = TZ,
+        l2_cooldown_s: float = 30.0,
+    ):
+        self.namespace = namespace
+        self.l1 = TTLCache(max_items=l1_max_items, ttl_s=int(os.getenv("ROUTE_CACHE_L1_TTL_S", l1_ttl_s)))
+        self.l2 = l2
+        self.l2_ttl_s = l2_ttl_s
+        self.precision = precision
+        self.tod_bucket_min = max(1, tod_bucket_min)
+        self.tz = ZoneInfo(tz)
+        self.l2_cooldown_s = l2_cooldown_s
+        self._l2_down_until = 0.0
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {
+            "l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0,
+            "l2_calls": 0, "l2_errors": 0, "l2_ms": 0.0,
+        }
+
+    # -- keys --------------------------------------------------------------
+
+    def tod_bucket(self, ts: Optional[float] = None) -> int:
+        now = datetime.fromtimestamp(ts if ts is not None else time.time(), self.tz)
+        return (now.hour * 60 + now.minute) // self.tod_bucket_min
+
+    def key(self, a: LatLng, b: LatLng, *, bucket: Optional[int] = None) -> str:
+        p = self.precision
+        bucket = self.tod_bucket() if bucket is None else bucket
+        return (
+            f"rt:{self.namespace}:{bucket}:"
+            f"{round(a[0], p)},{round(a[1], p)}:{round(b[0], p)},{round(b[1], p)}"
+        )
+
+    # -- counters ----------------------------------------------------------
+
+    def _count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            c = dict(self.counters)
+        lookups = c["l1_hits"] + c["l2_hits"] + c["misses"]
+        c["hit_rate"] = round((c["l1_hits"] + c["l2_hits"]) / lookups, 4) if lookups else 0.0
+        c["l2_avg_ms"] = round(c["l2_ms"] / c["l2_calls"], 3) if c["l2_calls"] else 0.0
+        c["l2_ms"] = round(c["l2_ms"], 3)
+        c["l1_size"] = len(self.l1)
+        return c
+
+    # -- L2 access -----------------------------------------------------------
+
+    def _l2_ready(self) -> bool:
+        return self.l2 is not None and time.monotonic() >= self._l2_down_until
+
+    def _l2_call(self, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception as e:
+            self._count("l2_errors")
+            self._l2_down_until = time.monotonic() + self.l2_cooldown_s
+            log.warning("route cache L2 error, skipping L2 for %.0fs: %s", self.l2_cooldown_s, e)
+            return None
+        finally:
+            with self._lock:
+                self.counters["l2_calls"] += 1
+                self.counters["l2_ms"] += (time.perf_counter() - t0) * 1000.0
+
+    # -- API ---------------------------------------------------------------
+
+    def get(self, a: LatLng, b: LatLng) -> Optional[int]:
+        return self.get_many([(a, b)]).get((a, b))
+
+    def set(self, a: LatLng, b: LatLng, t_s: int) -> None:
+        self.set_many({(a, b): t_s})
+
+    def get_many(self, pairs: Iterable[Pair]) -> Dict[Pair, int]:
+        """Cached times for ``pairs``: L1 first, then one batched L2 read."""
+        bucket = self.tod_bucket()
+        out: Dict[Pair, int] = {}
+        l2_keys: Dict[str, List[Pair]] = {}
+        l1_hits = l2_hits = 0
+        for pair in pairs:
+            if pair in out:
+                continue
+            k = self.key(pair[0], pair[1], bucket=bucket)
+            v = self.l1.get(k)
+            if v is not None:
+                out[pair] = int(v)
+                l1_hits += 1
+            else:
+                l2_keys.setdefault(k, []).append(pair)
+
+        if l2_keys and self._l2_ready():
+            keys = list(l2_keys)
+            values = self._l2_call(self.l2.get_many, keys)
+            if values is not None:
+                for k, v in zip(keys, values):
+                    if v is None:
+                        continue
+                    self.l1.set(k, int(v))
+                    for pair in l2_keys.pop(k):
+                        out[pair] = int(v)
+                        l2_hits += 1
+        misses = sum(len(p) for p in l2_keys.values())
+        with self._lock:
+            self.counters["l1_hits"] += l1_hits
+            self.counters["l2_hits"] += l2_hits
+            self.counters["misses"] += misses
+        return out
+
+    def set_many(self, items: Dict[Pair, int]) -> None:
+        """Write-through to L1 and (one pipelined call) L2."""
+        if not items:
+            return
+        bucket = self.tod_bucket()
+        by_key = {self.key(a, b, bucket=bucket): int(t) for (a, b), t in items.items()}
+        for k, v in by_key.items():
+            self.l1.set(k, v)
+        self._count("sets", len(by_key))
+        if self._l2_ready():
+            self._l2_call(self.l2.set_many, by_key, self.l2_ttl_s)
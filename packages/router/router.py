@@ -1,8 +1,14 @@
 from __future__ import annotations
+import logging
 import os
 import math
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
 from packages.router.cache import TTLCache
+from packages.router.speed_model import speed_model
+
+log = logging.getLogger(__name__)
+
 
 def _haversine_m(lat1, lon1, lat2, lon2) -> float:
     R = 6371000.0
@@ -12,23 +18,72 @@ def _haversine_m(lat1, lon1, lat2, lon2) -> float:
     a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dl/2)**2
     return 2*R*math.asin(math.sqrt(a))
 
+def haversine_time_matrix(
+    sources: Sequence[Tuple[float, float]],
+    destinations: Sequence[Tuple[float, float]],
+    *,
+    ts: Optional[float] = None,
+) -> np.ndarray:
+    """Vectorized haversine travel times (seconds, int64) for sources x destinations.
+
+    Same speed model (the source's zone and hour of week at ``ts``, default
+    now) and clamping as ``Router.route_time_latlng``.
+    """
+    src_deg = np.asarray(sources, dtype=np.float64).reshape(-1, 2)
+    mps = speed_model().speeds_mps(src_deg[:, 0], src_deg[:, 1], ts)
+    src = np.radians(src_deg)
+    dst = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    dphi = dst[None, :, 0] - src[:, None, 0]
+    dl = dst[None, :, 1] - src[:, None, 1]
+    a = np.sin(dphi / 2) ** 2 + np.cos(src[:, None, 0]) * np.cos(dst[None, :, 0]) * np.sin(dl / 2) ** 2
+    dist_m = 2 * 6371000.0 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    t_s = np.trunc(dist_m / mps[:, None]).astype(np.int64)
+    return np.clip(t_s, 5, 60 * 60)
+
 class Router:
     """Routing interface.
 
-    MVP default uses a haversine-based travel time approximation.
-    Set ROUTER_MODE=OSRM for real road-graph routing via OSRM.
+    MVP default uses a haversine-based travel time approximation with the
+    time-of-day speed profiles in ``packages.router.speed_model``.
+    Set ROUTER_MODE=OSRM for real road-graph routing via OSRM, or
+    ROUTER_MODE=LOCAL_GRAPH to route in-process over a preprocessed graph
+    (see ``packages.router.local_graph``; haversine if the graph is missing).
+
+    ``local_graph=False`` keeps LOCAL_GRAPH mode on haversine (the FAST
+    loop, whose tick is too short for in-process searches);
+    ``search_budget=False`` lifts the local graph's per-window search
+    budget (offline table builds).
     """
-    def __init__(self, *, ttl_s: int = 30, max_items: int = 50_000):
+    def __init__(
+        self,
+        *,
+        ttl_s: int = 30,
+        max_items: int = 50_000,
+        local_graph: bool = True,
+        search_budget: bool = True,
+    ):
         self.mode = os.getenv("ROUTER_MODE", "HAVERSINE").upper()
         self.cache = TTLCache(max_items=max_items, ttl_s=ttl_s)
-        self._osrm = None
+        self._engine = None
         if self.mode == "OSRM":
             from packages.router.osrm import OSRMRouter
-            self._osrm = OSRMRouter(ttl_s=ttl_s, max_items=max_items)
+            self._engine = OSRMRouter(ttl_s=ttl_s, max_items=max_items)
+        elif self.mode == "LOCAL_GRAPH" and local_graph:
+            from packages.router.local_graph import LocalGraphRouter
+            kwargs = {} if search_budget else {"budget_s": 0.0}
+            try:
+                self._engine = LocalGraphRouter.from_env(ttl_s=ttl_s, max_items=max_items, **kwargs)
+            except (OSError, ValueError, KeyError) as e:
+                log.warning("road graph unavailable, using haversine: %s", e)
+
+    @property
+    def engine(self) -> str:
+        """Engine actually answering queries: OSRM, LOCAL_GRAPH or HAVERSINE."""
+        return self.mode if self._engine is not None else "HAVERSINE"
 
     def route_time_latlng(self, a: Tuple[float,float], b: Tuple[float,float]) -> int:
-        if self._osrm is not None:
-            return self._osrm.route_time_latlng(a, b)
+        if self._engine is not None:
+            return self._engine.route_time_latlng(a, b)
 
         key = ("t", round(a[0], 6), round(a[1], 6), round(b[0], 6), round(b[1], 6), self.mode)
         cached = self.cache.get(key)
@@ -39,26 +94,44 @@ class Router:
         lat2, lon2 = b
         dist_m = _haversine_m(lat1, lon1, lat2, lon2)
 
-        # assume 35 mph average, with a road factor
-        mph = 35.0
-        road_factor = 1.25
-        mps = (mph * 1609.34) / 3600.0
-        t_s = int((dist_m / mps) * road_factor)
+        # effective speed (road factor included) for this zone and hour of week
+        t_s = int(dist_m / speed_model().speed_mps(lat1, lon1))
 
         # clamp to sane range
         t_s = max(5, min(t_s, 60 * 60))
         self.cache.set(key, t_s)
         return t_s
 
+    def cache_stats(self) -> dict:
+        """Route-time cache counters (hits/misses per tier, L2 latency)."""
+        if self._engine is not None:
+            return self._engine.cache_stats()
+        return {"l1_size": len(self.cache)}
+
     def batch_matrix(self, points: list) -> list:
-        """NxN travel time matrix. Delegates to OSRM if available."""
-        if self._osrm is not None:
-            return self._osrm.batch_matrix(points)
+        """NxN travel time matrix. Delegates to the routing engine if available."""
+        if self._engine is not None:
+            return self._engine.batch_matrix(points)
         # Haversine fallback
-        n = len(points)
-        matrix = [[0] * n for _ in range(n)]
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    matrix[i][j] = self.route_time_latlng(points[i], points[j])
-        return matrix
+        if not points:
+            return []
+        m = haversine_time_matrix(points, points)
+        np.fill_diagonal(m, 0)
+        return m.tolist()
+
+    def matrix(
+        self,
+        sources: Sequence[Tuple[float, float]],
+        destinations: Sequence[Tuple[float, float]],
+    ) -> List[List[int]]:
+        """len(sources) x len(destinations) travel time matrix.
+
+        Delegates to OSRM (``sources=``/``destinations=`` table request) or
+        the local graph when available; otherwise a vectorized haversine
+        estimate.
+        """
+        if self._engine is not None:
+            return self._engine.matrix(sources, destinations)
+        if not sources or not destinations:
+            return [[] for _ in sources]
+        return haversine_time_matrix(sources, destinations).tolist()
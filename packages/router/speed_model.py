@@ -0,0 +1,287 @@
+"""Time-of-day speed profiles for haversine-based ETAs.
+
+Every straight-line ETA (``Router`` in HAVERSINE mode and its fallbacks,
+candidate generation, the batch loop) converts metres to seconds through
+one ``SpeedModel``: an *effective* speed -- straight-line metres per
+second of actual driving, so the road factor is folded in -- looked up by
+zone and hour of week.
+
+Zones are fixed lat/lng cells (``SPEED_ZONE_DEG``, ~5.5 km).  The table is
+``float32[n_zones + 1, 168]``; the last row is the all-zone profile used
+for zones without data.  Hour of week is Monday 00:00 = 0 in
+``SPEED_PROFILE_TZ``.
+
+Profiles are learned from completed deliveries (``learn_speed_profiles``:
+store -> drop straight-line distance over TASK_STARTED -> arrival time) by
+the worker and written to ``SPEED_PROFILE_PATH``; processes load the file
+once and re-check its mtime every ``check_s``.  Without a file every cell
+is the historical 35 mph / 1.25 road-factor speed.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+SPEED_PROFILE_PATH = os.getenv("SPEED_PROFILE_PATH", os.path.join("var", "speed_profile.npz"))
+ZONE_DEG = float(os.getenv("SPEED_ZONE_DEG", "0.05"))
+TZ = os.getenv("SPEED_PROFILE_TZ", "America/Chicago")
+MIN_SAMPLES = int(os.getenv("SPEED_PROFILE_MIN_SAMPLES", "8"))
+HOURS_PER_WEEK = 168
+
+# 35 mph average over a 1.25 road factor: the model used before profiles.
+_MPH = 35.0
+_ROAD_FACTOR = 1.25
+DEFAULT_MPS = (_MPH * 1609.34) / 3600.0 / _ROAD_FACTOR
+_MIN_MPS, _MAX_MPS = 2.0, 35.0
+
+
+def zone_keys(lats, lngs, *, zone_deg: float = ZONE_DEG) -> np.ndarray:
+    """int64 zone key per point (row/col of the ``zone_deg`` grid, packed)."""
+    ky = np.floor(np.asarray(lats, dtype=np.float64) / zone_deg).astype(np.int64)
+    kx = np.floor(np.asarray(lngs, dtype=np.float64) / zone_deg).astype(np.int64)
+    return (ky << 32) + (kx & 0xFFFFFFFF)
+
+
+class SpeedModel:
+    """Effective speed (m/s) by zone x hour-of-week."""
+
+    def __init__(
+        self,
+        keys: Optional[np.ndarray] = None,
+        speeds: Optional[np.ndarray] = None,
+        *,
+        zone_deg: float = ZONE_DEG,
+        tz: str = TZ,
+    ):
+        self.keys = np.asarray(keys if keys is not None else [], dtype=np.int64)
+        if speeds is None:
+            speeds = np.full((len(self.keys) + 1, HOURS_PER_WEEK), DEFAULT_MPS, dtype=np.float32)
+        self.speeds = np.asarray(speeds, dtype=np.float32)
+        if self.speeds.shape != (len(self.keys) + 1, HOURS_PER_WEEK):
+            raise ValueError(f"speed table shape {self.speeds.shape} does not match {len(self.keys)} zones")
+        if len(self.keys) > 1 and np.any(np.diff(self.keys) <= 0):
+            raise ValueError("zone keys must be sorted and unique")
+        self.zone_deg = float(zone_deg)
+        self.tz = ZoneInfo(tz)
+
+    @classmethod
+    def load(cls, path: str) -> "SpeedModel":
+        with np.load(path) as z:
+            return cls(z["keys"], z["speeds"], zone_deg=float(z["zone_deg"]), tz=str(z["tz"]))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, keys=self.keys, speeds=self.speeds, zone_deg=self.zone_deg, tz=str(self.tz.key))
+        os.replace(tmp, path)
+
+    def hour_of_week(self, ts: Optional[float] = None) -> int:
+        now = datetime.fromtimestamp(ts if ts is not None else time.time(), self.tz)
+        return now.weekday() * 24 + now.hour
+
+    def _rows(self, lats, lngs) -> np.ndarray:
+        keys = zone_keys(lats, lngs, zone_deg=self.zone_deg)
+        global_row = len(self.keys)
+        if not len(self.keys):
+            return np.full(keys.shape, global_row, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, pos, global_row)
+
+    def speeds_mps(self, lats, lngs, ts: Optional[float] = None) -> np.ndarray:
+        """float64 effective speed per point at ``ts`` (default: now)."""
+        return self.speeds[self._rows(lats, lngs), self.hour_of_week(ts)].astype(np.float64)
+
+    def speed_mps(self, lat: float, lng: float, ts: Optional[float] = None) -> float:
+        return float(self.speeds_mps([lat], [lng], ts)[0])
+
+
+# ----------------------------------------------------------------------
+# Learning
+# ----------------------------------------------------------------------
+
+def build_speed_model(
+    lats: Sequence[float],
+    lngs: Sequence[float],
+    hours: Sequence[int],
+    dist_m: Sequence[float],
+    dur_s: Sequence[float],
+    *,
+    zone_deg: float = ZONE_DEG,
+    tz: str = TZ,
+    min_samples: int = MIN_SAMPLES,
+) -> SpeedModel:
+    """Median effective speed per zone x hour-of-week from trip samples.
+
+    ``lats``/``lngs`` are trip origins and ``hours`` their hour of week.
+    Sparse cells borrow in order: the zone's all-week median scaled by the
+    global hour-of-week shape, then the global hour-of-week median, then
+    ``DEFAULT_MPS``.
+    """
+    dist = np.asarray(dist_m, dtype=np.float64)
+    dur = np.asarray(dur_s, dtype=np.float64)
+    ok = (dur > 0) & (dist > 0)
+    speed = np.divide(dist, dur, out=np.zeros_like(dist), where=ok)
+    ok &= (speed >= _MIN_MPS) & (speed <= _MAX_MPS)
+    keys = zone_keys(lats, lngs, zone_deg=zone_deg)[ok]
+    how = np.asarray(hours, dtype=np.int64)[ok]
+    speed = speed[ok]
+
+    global_all = float(np.median(speed)) if len(speed) >= min_samples else DEFAULT_MPS
+    global_hour = np.full(HOURS_PER_WEEK, global_all)
+    for h in range(HOURS_PER_WEEK):
+        s = speed[how == h]
+        if len(s) >= min_samples:
+            global_hour[h] = np.median(s)
+    shape = global_hour / global_all
+
+    uniq = np.unique(keys)
+    zone_rows: List[np.ndarray] = []
+    kept: List[int] = []
+    for k in uniq:
+        in_zone = keys == k
+        if in_zone.sum() < min_samples:
+            continue
+        zs, zh = speed[in_zone], how[in_zone]
+        row = float(np.median(zs)) * shape
+        for h in np.unique(zh):
+            s = zs[zh == h]
+            if len(s) >= min_samples:
+                row[h] = np.median(s)
+        kept.append(int(k))
+        zone_rows.append(row)
+    table = np.vstack(zone_rows + [global_hour]).astype(np.float32)
+    return SpeedModel(np.asarray(kept, dtype=np.int64), np.clip(table, _MIN_MPS, _MAX_MPS), zone_deg=zone_deg, tz=tz)
+
+
+def completed_trip_samples(db, *, days: int = 28) -> Dict[str, np.ndarray]:
+    """Store -> drop trips of completed deliveries in the last ``days``.
+
+    Duration runs from TASK_STARTED (pickup) to the doorstep ID check, or to
+    TASK_COMPLETED when no check was recorded, so handoff time is excluded
+    where it can be.
+    """
+    from packages.db.models import CustomerAddress, DeliveryTask, Order, OrderEvent, Store
+    from packages.router.router import _haversine_m
+
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    tasks = (
+        db.query(DeliveryTask.order_id, Store.lat, Store.lng, CustomerAddress.lat, CustomerAddress.lng)
+        .join(Order, Order.id == DeliveryTask.order_id)
+        .join(Store, Store.id == Order.store_id)
+        .join(CustomerAddress, CustomerAddress.id == Order.address_id)
+        .filter(DeliveryTask.status == "COMPLETED", DeliveryTask.updated_at >= since)
+        .all()
+    )
+    coords = {
+        r[0]: tuple(float(v) for v in r[1:])
+        for r in tasks if None not in r[1:]
+    }
+    events = (
+        db.query(OrderEvent.order_id, OrderEvent.event_type, OrderEvent.ts)
+        .filter(
+            OrderEvent.order_id.in_(list(coords)),
+            OrderEvent.event_type.in_(["TASK_STARTED", "DOORSTEP_ID_CHECK_STARTED", "TASK_COMPLETED"]),
+        )
+        .order_by(OrderEvent.ts)
+        .all()
+    ) if coords else []
+    ts: Dict[str, Dict[str, datetime]] = {}
+    for order_id, event_type, at in events:
+        ts.setdefault(order_id, {}).setdefault(event_type, at)
+
+    tz = ZoneInfo(TZ)
+    out: Dict[str, list] = {"lats": [], "lngs": [], "hours": [], "dist_m": [], "dur_s": []}
+    for order_id, seen in ts.items():
+        start = seen.get("TASK_STARTED")
+        end = seen.get("DOORSTEP_ID_CHECK_STARTED") or seen.get("TASK_COMPLETED")
+        if start is None or end is None or end <= start:
+            continue
+        slat, slng, dlat, dlng = coords[order_id]
+        local = start.astimezone(tz) if start.tzinfo else start.replace(tzinfo=timezone.utc).astimezone(tz)
+        out["lats"].append(slat)
+        out["lngs"].append(slng)
+        out["hours"].append(local.weekday() * 24 + local.hour)
+        out["dist_m"].append(_haversine_m(slat, slng, dlat, dlng))
+        out["dur_s"].append((end - start).total_seconds())
+    return {k: np.asarray(v) for k, v in out.items()}
+
+
+def learn_speed_profiles(db, *, path: str = SPEED_PROFILE_PATH, days: int = 28) -> Dict:
+    """Fit profiles from recent deliveries and publish them to ``path``."""
+    t0 = time.perf_counter()
+    samples = completed_trip_samples(db, days=days)
+    model = build_speed_model(**samples)
+    model.save(path)
+    return {
+        "samples": int(len(samples["dur_s"])),
+        "zones": int(len(model.keys)),
+        "build_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+# ----------------------------------------------------------------------
+# Shared instance
+# ----------------------------------------------------------------------
+
+class _SharedModel:
+    """Loads ``SPEED_PROFILE_PATH`` once and re-checks its mtime every ``check_s``."""
+
+    def __init__(self, path: str, *, check_s: float = 300.0):
+        self.path = path
+        self.check_s = check_s
+        self.model = SpeedModel()
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> SpeedModel:
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_s
+                    self._reload()
+        return self.model
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self.model = SpeedModel.load(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("speed profile %s unreadable, keeping current model: %s", self.path, e)
+            return
+        self._mtime = mtime
+        log.info("loaded speed profile %s (%d zones)", self.path, len(self.model.keys))
+
+
+_shared: Optional[_SharedModel] = None
+_shared_lock = threading.Lock()
+
+
+def speed_model() -> SpeedModel:
+    """Process-wide speed model (defaults until a profile file exists)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = _SharedModel(SPEED_PROFILE_PATH)
+    return _shared.get()
+
+
+def travel_time_s(dist_m: float, lat: float, lng: float, ts: Optional[float] = None) -> int:
+    """Seconds to cover straight-line ``dist_m`` starting near (lat, lng)."""
+    return int(dist_m / speed_model().speed_mps(lat, lng, ts))
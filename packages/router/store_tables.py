@@ -0,0 +1,334 @@
+"""Precomputed store -> area travel-time tables in memory-mapped arrays.
+
+Every pickup starts at one of a small set of stores, so instead of routing
+each driver->store and store->drop leg, a background job
+(``refresh_store_travel_tables`` in the worker) computes a dense grid of
+travel times from every active store to the area around it and writes it
+to disk.  Dispatch and order tracking then resolve those legs with an
+array lookup.
+
+Each store gets a ``side x side`` square grid of ``cell_m`` cells centred
+on the store (local equirectangular metres), so a point maps to its cell
+arithmetically -- no H3 dependency and no per-cell dictionary.  Times are
+uint16 seconds; ``UNREACHABLE`` marks cells the router could not reach.
+Driver->store legs use the store->cell time (roads treated as symmetric at
+this resolution).
+
+On-disk layout in ``STORE_TT_DIR``::
+
+    store_tt_<version>.u16    raw (n_stores, side, side) uint16
+    store_tt_<version>.json   stores [{id, lat, lng}], side, cell_m, built_at,
+                              engine, hour_of_week
+    store_tt_current.json     {"version": ...}, swapped atomically
+
+Readers (``StoreTravelTimes``) re-check the pointer every ``check_s`` and
+re-map when a new version lands; old versions are pruned by the writer.
+
+Tables built from a road engine (OSRM, LOCAL_GRAPH) are served until the
+next rebuild.  Tables built from the haversine speed model are only a
+snapshot of one hour-of-week speed bucket, so readers ignore them once
+the bucket changes and the worker rebuilds them (``tables_stale``).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+STORE_TT_DIR = os.getenv("STORE_TT_DIR", os.path.join("var", "store_tt"))
+RADIUS_M = float(os.getenv("STORE_TT_RADIUS_M", "12000"))
+CELL_M = float(os.getenv("STORE_TT_CELL_M", "250"))
+UNREACHABLE = np.iinfo(np.uint16).max
+_M_PER_DEG_LAT = 111_320.0
+_CURRENT = "store_tt_current.json"
+_KEEP_VERSIONS = 2
+# A store whose coordinates moved further than this since the build is stale.
+_STORE_MATCH_DEG = 1e-4
+# Engine name of tables that follow the hour-of-week speed model.
+_TIME_BUCKETED = "HAVERSINE"
+
+LatLng = Tuple[float, float]
+MatrixFn = Callable[[Sequence[LatLng], Sequence[LatLng]], List[List[int]]]
+
+
+def _grid_side(radius_m: float, cell_m: float) -> int:
+    return 2 * int(math.ceil(radius_m / cell_m)) + 1
+
+
+def grid_points(lat0: float, lng0: float, *, side: int, cell_m: float) -> np.ndarray:
+    """(side*side, 2) lat/lng cell centres, row-major from the south-west corner."""
+    half = side // 2
+    offs = (np.arange(side) - half) * cell_m
+    dlat = offs / _M_PER_DEG_LAT
+    dlng = offs / (_M_PER_DEG_LAT * max(0.01, math.cos(math.radians(lat0))))
+    lat = np.repeat(lat0 + dlat, side)
+    lng = np.tile(lng0 + dlng, side)
+    return np.column_stack([lat, lng])
+
+
+def _default_router():
+    from packages.router.router import Router
+    return Router(search_budget=False)
+
+
+def _hour_of_week(ts: Optional[float] = None) -> int:
+    from packages.router.speed_model import speed_model
+    return speed_model().hour_of_week(ts)
+
+
+# ----------------------------------------------------------------------
+# Build
+# ----------------------------------------------------------------------
+
+def write_store_tables(
+    stores: Sequence[dict],
+    *,
+    directory: str = STORE_TT_DIR,
+    radius_m: float = RADIUS_M,
+    cell_m: float = CELL_M,
+    matrix_fn: Optional[MatrixFn] = None,
+    engine: str = "CUSTOM",
+) -> Dict:
+    """Compute and publish tables for ``stores`` (dicts with id/lat/lng).
+
+    Without ``matrix_fn`` the tables come from ``Router.matrix`` and
+    ``engine`` is the router's actual engine; pass ``engine="HAVERSINE"``
+    with a custom ``matrix_fn`` whose times follow the speed buckets.
+    """
+    if matrix_fn is None:
+        router = _default_router()
+        matrix_fn, engine = router.matrix, router.engine
+    built_at = time.time()
+    side = _grid_side(radius_m, cell_m)
+    os.makedirs(directory, exist_ok=True)
+    version = str(time.time_ns())
+    data_path = os.path.join(directory, f"store_tt_{version}.u16")
+    meta_path = os.path.join(directory, f"store_tt_{version}.json")
+
+    t0 = time.perf_counter()
+    n = len(stores)
+    arr = np.memmap(data_path, dtype=np.uint16, mode="w+", shape=(max(n, 1), side, side))
+    for i, s in enumerate(stores):
+        cells = grid_points(s["lat"], s["lng"], side=side, cell_m=cell_m)
+        row = np.asarray(matrix_fn([(s["lat"], s["lng"])], [tuple(p) for p in cells])[0], dtype=np.int64)
+        row = np.where((row < 0) | (row >= 9999), UNREACHABLE, np.minimum(row, UNREACHABLE - 1))
+        arr[i] = row.reshape(side, side).astype(np.uint16)
+    arr.flush()
+    del arr
+
+    meta = {
+        "version": version,
+        "side": side,
+        "cell_m": cell_m,
+        "radius_m": radius_m,
+        "built_at_ms": int(built_at * 1000),
+        "engine": engine,
+        "hour_of_week": _hour_of_week(built_at),
+        "stores": [{"id": s["id"], "lat": s["lat"], "lng": s["lng"]} for s in stores],
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    tmp = os.path.join(directory, _CURRENT + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp, os.path.join(directory, _CURRENT))
+    _prune(directory, keep=version)
+    return {
+        "version": version, "stores": n, "side": side, "engine": engine,
+        "bytes": n * side * side * 2, "build_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+def _prune(directory: str, *, keep: str) -> None:
+    versions = sorted(
+        {f.split("_")[2].split(".")[0] for f in os.listdir(directory)
+         if f.startswith("store_tt_") and f != _CURRENT and not f.endswith(".tmp")},
+        key=int,
+    )
+    for v in versions[:-_KEEP_VERSIONS]:
+        if v == keep:
+            continue
+        for ext in (".u16", ".json"):
+            try:
+                os.remove(os.path.join(directory, f"store_tt_{v}{ext}"))
+            except OSError:
+                pass
+
+
+def active_stores(db) -> List[dict]:
+    from packages.db.models import Store
+
+    rows = (
+        db.query(Store.id, Store.lat, Store.lng)
+        .filter(Store.status == "ACTIVE", Store.lat.isnot(None), Store.lng.isnot(None))
+        .order_by(Store.id)
+        .all()
+    )
+    return [{"id": r.id, "lat": float(r.lat), "lng": float(r.lng)} for r in rows]
+
+
+def build_store_tables(db, **kwargs) -> Dict:
+    """Refresh the tables for every active store with coordinates."""
+    return write_store_tables(active_stores(db), **kwargs)
+
+
+def tables_stale(directory: str = STORE_TT_DIR, *, max_age_s: float, now: Optional[float] = None) -> bool:
+    """True when the published tables are missing, older than ``max_age_s``,
+    or follow the speed model and were built in another hour-of-week bucket."""
+    now = time.time() if now is None else now
+    try:
+        with open(os.path.join(directory, _CURRENT)) as f:
+            version = json.load(f)["version"]
+        with open(os.path.join(directory, f"store_tt_{version}.json")) as f:
+            meta = json.load(f)
+        built_at = meta["built_at_ms"] / 1000.0
+    except (OSError, ValueError, KeyError):
+        return True
+    if now - built_at >= max_age_s:
+        return True
+    return meta.get("engine", _TIME_BUCKETED) == _TIME_BUCKETED and meta.get("hour_of_week") != _hour_of_week(now)
+
+
+# ----------------------------------------------------------------------
+# Lookup
+# ----------------------------------------------------------------------
+
+class _Mapped:
+    """One published version; swapped as a whole so lookups never mix versions."""
+
+    def __init__(self, version: str, meta: dict, arr: np.ndarray):
+        stores = meta["stores"]
+        self.version = version
+        self.arr = arr
+        self.side = int(meta["side"])
+        self.cell_m = float(meta["cell_m"])
+        self.engine = meta.get("engine", _TIME_BUCKETED)
+        # Hour-of-week bucket the tables are valid for; None = any.
+        self.hour_of_week = meta.get("hour_of_week", -1) if self.engine == _TIME_BUCKETED else None
+        self.store_idx = {s["id"]: i for i, s in enumerate(stores)}
+        self.lat = np.array([s["lat"] for s in stores], dtype=np.float64)
+        self.lng = np.array([s["lng"] for s in stores], dtype=np.float64)
+        self.cos = np.maximum(0.01, np.cos(np.radians(self.lat)))
+
+
+class StoreTravelTimes:
+    """Read side: memory-mapped tables with store-id lookups."""
+
+    def __init__(self, directory: str = STORE_TT_DIR, *, check_s: float = 30.0):
+        self.directory = directory
+        self.check_s = check_s
+        self._mapped: Optional[_Mapped] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._mapped.version if self._mapped is not None else None
+
+    @property
+    def loaded(self) -> bool:
+        """A published version is mapped and valid for the current speed bucket."""
+        self._maybe_reload()
+        return self._current() is not None
+
+    def _current(self) -> Optional[_Mapped]:
+        m = self._mapped
+        if m is None or m.hour_of_week is None:
+            return m
+        return m if m.hour_of_week == _hour_of_week() else None
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_s
+            try:
+                with open(os.path.join(self.directory, _CURRENT)) as f:
+                    version = json.load(f)["version"]
+                if version == self.version:
+                    return
+                with open(os.path.join(self.directory, f"store_tt_{version}.json")) as f:
+                    meta = json.load(f)
+                side = int(meta["side"])
+                arr = np.memmap(
+                    os.path.join(self.directory, f"store_tt_{version}.u16"),
+                    dtype=np.uint16, mode="r", shape=(max(len(meta["stores"]), 1), side, side),
+                )
+                mapped = _Mapped(version, meta, arr)
+            except (OSError, ValueError, KeyError) as e:
+                if self.version is None:
+                    log.debug("store travel tables unavailable: %s", e)
+                else:
+                    log.warning("store travel tables reload failed, keeping %s: %s", self.version, e)
+                return
+            self._mapped = mapped
+
+    def lookup_many(
+        self,
+        store_ids: Sequence[Optional[str]],
+        store_lats: Sequence[float],
+        store_lngs: Sequence[float],
+        lats: Sequence[float],
+        lngs: Sequence[float],
+    ) -> np.ndarray:
+        """Store <-> point seconds per row; -1 where the table cannot answer.
+
+        Rows miss when the store is unknown, its coordinates moved since
+        the build, the point is outside the grid, or the cell is unreachable;
+        every row misses when haversine-built tables are from another
+        hour-of-week bucket.
+        """
+        self._maybe_reload()
+        n = len(store_ids)
+        out = np.full(n, -1, dtype=np.int64)
+        m = self._current()
+        if m is None or n == 0:
+            return out
+        idx = np.array([m.store_idx.get(s, -1) for s in store_ids], dtype=np.int64)
+        known = idx >= 0
+        if not known.any():
+            return out
+        slat = np.asarray(store_lats, dtype=np.float64)
+        slng = np.asarray(store_lngs, dtype=np.float64)
+        lat = np.asarray(lats, dtype=np.float64)
+        lng = np.asarray(lngs, dtype=np.float64)
+        k = np.where(known, idx, 0)
+        lat0, lng0 = m.lat[k], m.lng[k]
+        same_store = (np.abs(slat - lat0) <= _STORE_MATCH_DEG) & (np.abs(slng - lng0) <= _STORE_MATCH_DEG)
+        half = m.side // 2
+        row = np.rint((lat - lat0) * _M_PER_DEG_LAT / m.cell_m).astype(np.int64) + half
+        col = np.rint((lng - lng0) * _M_PER_DEG_LAT * m.cos[k] / m.cell_m).astype(np.int64) + half
+        ok = known & same_store & (row >= 0) & (row < m.side) & (col >= 0) & (col < m.side)
+        if ok.any():
+            t = m.arr[k[ok], row[ok], col[ok]].astype(np.int64)
+            t[t == UNREACHABLE] = -1
+            out[ok] = t
+        return out
+
+    def lookup(self, store_id: str, store_lat: float, store_lng: float, lat: float, lng: float) -> Optional[int]:
+        t = int(self.lookup_many([store_id], [store_lat], [store_lng], [lat], [lng])[0])
+        return t if t >= 0 else None
+
+
+_shared: Optional[StoreTravelTimes] = None
+_shared_lock = threading.Lock()
+
+
+def store_travel_times() -> StoreTravelTimes:
+    """Process-wide reader over ``STORE_TT_DIR``."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = StoreTravelTimes()
+        return _shared
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark: sparse assignment solver vs greedy (and OR-Tools if installed).
+
+Builds random top-K candidate graphs the way the FAST loop does -- drivers
+and jobs scattered over a region, each job linked to its K nearest drivers
+-- and reports the median time of ``assignment.solve_sparse_assignment``.  Every instance is
+checked against OR-Tools ``solve_max_flow_with_min_cost`` when OR-Tools is
+installed; the greedy-by-cost baseline shows what the old fallback left on
+the table.
+
+Usage:
+    python -m scripts.bench_assignment
+    python -m scripts.bench_assignment --sizes 1000x1000 1000x3000 --k 10 20 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from packages.dispatch.assignment import solve_sparse_assignment
+from packages.dispatch.solver_mcf import _ortools_mcf, _solve_ortools
+
+
+def build(n_jobs, n_drivers, k, *, seed=0):
+    """(rows=jobs, cols=drivers, costs) for the K nearest drivers of each job."""
+    rng = np.random.default_rng(seed)
+    jobs = rng.random((n_jobs, 2))
+    drivers = rng.random((n_drivers, 2))
+    k = min(k, n_drivers)
+    d = np.linalg.norm(jobs[:, None, :] - drivers[None, :, :], axis=2)
+    cols = np.argpartition(d, k - 1, axis=1)[:, :k]
+    rows = np.repeat(np.arange(n_jobs), k)
+    cols = cols.ravel()
+    costs = (d[rows, cols] * 100_000).astype(np.int64) + rng.integers(0, 2_000, len(rows))
+    return rows, cols, costs
+
+
+def greedy(rows, cols, costs):
+    used_r, used_c, card, total = set(), set(), 0, 0
+    for a in np.argsort(costs, kind="stable").tolist():
+        r, c = int(rows[a]), int(cols[a])
+        if r in used_r or c in used_c:
+            continue
+        used_r.add(r); used_c.add(c)
+        card += 1
+        total += int(costs[a])
+    return card, total
+
+
+def ortools(mcf_mod, rows, cols, costs):
+    comp = [(f"j{r}", f"d{c}", int(w)) for r, c, w in zip(rows.tolist(), cols.tolist(), costs.tolist())]
+    out = _solve_ortools(mcf_mod, comp)
+    return len(out), sum(m["cost"] for m in out)
+
+
+def _median_of(fn, repeat):
+    """Median wall time over ``repeat`` runs: single best-of runs hide the noise."""
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", nargs="+", default=["200x200", "1000x1000", "1000x3000", "2000x2000"])
+    ap.add_argument("--k", type=int, nargs="+", default=[10, 20])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seeds", type=int, default=3)
+    args = ap.parse_args()
+    mcf_mod = _ortools_mcf()
+
+    print(f"{'jobs x drivers':>15} {'k':>3} {'median_ms':>10} {'matched':>8} {'greedy_matched':>15} "
+          f"{'greedy_gap%':>12} {'ortools_ms':>11} {'vs_ortools':>11}")
+    for size in args.sizes:
+        n_jobs, n_drivers = (int(x) for x in size.split("x"))
+        for k in args.k:
+            for seed in range(args.seeds):
+                rows, cols, costs = build(n_jobs, n_drivers, k, seed=seed)
+                t, (match, total) = _median_of(
+                    lambda: solve_sparse_assignment(n_jobs, n_drivers, rows, cols, costs), args.repeat,
+                )
+                card = int((match >= 0).sum())
+                g_card, g_total = greedy(rows, cols, costs)
+                # Cost gap only means something when greedy matched as many.
+                gap = f"{(g_total - total) / total * 100:.2f}" if g_card == card and total else "-"
+                ot_ms, verdict = "-", "n/a"
+                if mcf_mod is not None:
+                    t_ot, (o_card, o_total) = _median_of(lambda: ortools(mcf_mod, rows, cols, costs), 1)
+                    ot_ms = f"{t_ot * 1e3:.1f}"
+                    verdict = "same" if (o_card, o_total) == (card, total) else f"DIFF {o_total - total:+d}"
+                print(f"{size:>15} {k:>3} {t * 1e3:>10.1f} {card:>8} {g_card:>15} "
+                      f"{gap:>12} {ot_ms:>11} {verdict:>11}")
+
+
+if __name__ == "__main__":
+    main()
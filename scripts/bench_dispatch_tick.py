@@ -0,0 +1,107 @@
+"""
+Micro-benchmark: dispatch tick cost as the number of active tasks grows.
+
+Builds synthetic snapshots with a fixed number of open jobs and drivers and
+N active tasks, then times the DB-free FAST tick (``plan_fast_tick``) and
+the BATCH loop's per-cluster driver selection.  With the snapshot task
+lookups both should grow linearly in N (constant us/task).
+
+Usage:
+    python -m scripts.bench_dispatch_tick
+    python -m scripts.bench_dispatch_tick --tasks 1000 2000 5000 10000 --repeat 3
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("ROUTER_MODE", "HAVERSINE")
+
+from packages.dispatch.batch_loop import _cluster_jobs, _pick_best_driver
+from packages.dispatch.loops import plan_fast_tick
+from packages.dispatch.snapshot import snapshot_dict
+
+
+def _driver(i, rng):
+    return {
+        "driver_id": f"d{i}",
+        "lat": 32.70 + rng.random() * 0.3,
+        "lng": -97.00 + rng.random() * 0.3,
+        "status": "IDLE",
+        "zone_id": None,
+        "eligibility": {"insurance_verified": True, "registration_verified": True},
+        "metrics": {"accept_rate_7d": 0.7},
+    }
+
+
+def _job(i, rng):
+    return {
+        "order_id": f"o{i}",
+        "job_id": f"job_o{i}",
+        "pickup_lat": 32.70 + rng.random() * 0.3,
+        "pickup_lng": -97.00 + rng.random() * 0.3,
+        "drop_lat": 32.70 + rng.random() * 0.3,
+        "drop_lng": -97.00 + rng.random() * 0.3,
+        "ready_at_ms": 0,
+        "deadline_ms": 45 * 60 * 1000,
+        "state": "PENDING_DISPATCH",
+        "pricing": {"payout_cents_est": 800},
+        "approx_eta_drop_s": 600,
+    }
+
+
+def build(n_tasks, *, n_open_jobs, n_drivers, seed=0):
+    rng = random.Random(seed)
+    drivers = [_driver(i, rng) for i in range(n_drivers)]
+    # Jobs that already hold a live offer (filtered out) plus the open ones.
+    jobs = [_job(i, rng) for i in range(n_tasks + n_open_jobs)]
+    tasks = [
+        {"task_id": f"t{i}", "order_id": f"o{i}", "status": "OFFERED",
+         "offered_to_driver_id": f"busy{i}", "offer_expires_at_ms": None}
+        for i in range(n_tasks)
+    ]
+    return snapshot_dict(region_id="bench", now_ms=0, drivers=drivers, jobs=jobs, tasks=tasks, stats={})
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--tasks", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    ap.add_argument("--open-jobs", type=int, default=200)
+    ap.add_argument("--drivers", type=int, default=500)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'tasks':>8} {'fast_ms':>10} {'batch_ms':>10} {'fast_us/task':>13} {'batch_us/task':>14}")
+    for n in args.tasks:
+        snap = build(n, n_open_jobs=args.open_jobs, n_drivers=args.drivers)
+
+        def fast():
+            snap.pop("lookups", None)  # include building the lookups
+            plan_fast_tick(snap)
+
+        def batch():
+            snap.pop("lookups", None)
+            clusters = _cluster_jobs(snap["jobs"][n:])
+            assigned = set()
+            for c in clusters:
+                d = _pick_best_driver(snap, snap["drivers"], c, assigned)
+                if d is not None:
+                    assigned.add(d["driver_id"])
+
+        t_fast = _best_of(fast, args.repeat)
+        t_batch = _best_of(batch, args.repeat)
+        print(f"{n:>8} {t_fast * 1e3:>10.1f} {t_batch * 1e3:>10.1f} {t_fast / n * 1e6:>13.1f} {t_batch / n * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
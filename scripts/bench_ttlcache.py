@@ -0,0 +1,143 @@
+"""
+Micro-benchmark: TTLCache ops/sec versus the previous OrderedDict cache.
+
+Workloads (keys are route-style tuples):
+  get_hit   -- every get hits
+  set       -- inserts past capacity (eviction on every write for the old cache)
+  mixed     -- 90% get / 10% set over a key space 2x the capacity
+  mixed_mt  -- ``mixed`` from N threads sharing one cache (the old class is
+               not thread-safe; it is run unlocked, as it was used)
+
+Usage:
+    python -m scripts.bench_ttlcache
+    python -m scripts.bench_ttlcache --ops 500000 --threads 8 --repeat 9
+
+Each workload runs ``--repeat`` times, alternating the two caches, and the
+median ops/sec is reported.
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from packages.router.cache import TTLCache
+
+
+class LegacyTTLCache:
+    """The pre-rewrite cache, kept here as the benchmark baseline."""
+    def __init__(self, max_items: int = 50_000, ttl_s: int = 30):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._data: OrderedDict[Any, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any) -> Optional[Any]:
+        now = time.time()
+        item = self._data.get(key)
+        if not item:
+            return None
+        ts, val = item
+        if now - ts > self.ttl_s:
+            try:
+                del self._data[key]
+            except KeyError:
+                pass
+            return None
+        self._data.move_to_end(key, last=True)
+        return val
+
+    def set(self, key: Any, val: Any) -> None:
+        now = time.time()
+        self._data[key] = (now, val)
+        self._data.move_to_end(key, last=True)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+
+def _keys(n, seed=0):
+    rng = random.Random(seed)
+    return [("t", round(30 + rng.random(), 5), round(-97 + rng.random(), 5),
+             round(30 + rng.random(), 5), round(-97 + rng.random(), 5)) for _ in range(n)]
+
+
+def bench_get_hit(cls, ops, cap):
+    c = cls(max_items=cap, ttl_s=600)
+    keys = _keys(cap)
+    for k in keys:
+        c.set(k, 123)
+    t0 = time.perf_counter()
+    for i in range(ops):
+        c.get(keys[i % cap])
+    return ops / (time.perf_counter() - t0)
+
+
+def bench_set(cls, ops, cap):
+    c = cls(max_items=cap, ttl_s=600)
+    keys = _keys(ops)
+    t0 = time.perf_counter()
+    for k in keys:
+        c.set(k, 123)
+    return ops / (time.perf_counter() - t0)
+
+
+def _mixed(c, keys, ops, seed):
+    rng = random.Random(seed)
+    n = len(keys)
+    for _ in range(ops):
+        k = keys[rng.randrange(n)]
+        if rng.random() < 0.9:
+            c.get(k)
+        else:
+            c.set(k, 123)
+
+
+def bench_mixed(cls, ops, cap):
+    c = cls(max_items=cap, ttl_s=600)
+    keys = _keys(cap * 2)
+    t0 = time.perf_counter()
+    _mixed(c, keys, ops, 1)
+    return ops / (time.perf_counter() - t0)
+
+
+def bench_mixed_mt(cls, ops, cap, threads):
+    c = cls(max_items=cap, ttl_s=600)
+    keys = _keys(cap * 2)
+    per = ops // threads
+    ts = [threading.Thread(target=_mixed, args=(c, keys, per, s)) for s in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return per * threads / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--ops", type=int, default=300_000)
+    ap.add_argument("--capacity", type=int, default=50_000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rows = [
+        ("get_hit", lambda cls: bench_get_hit(cls, args.ops, args.capacity)),
+        ("set", lambda cls: bench_set(cls, args.ops, args.capacity)),
+        ("mixed", lambda cls: bench_mixed(cls, args.ops, args.capacity)),
+        (f"mixed_mt{args.threads}", lambda cls: bench_mixed_mt(cls, args.ops, args.capacity, args.threads)),
+    ]
+    print(f"{'workload':>10} {'legacy ops/s':>14} {'ttlcache ops/s':>15} {'speedup':>8}")
+    for name, fn in rows:
+        olds, news = [], []
+        for _ in range(args.repeat):
+            olds.append(fn(LegacyTTLCache))
+            news.append(fn(TTLCache))
+        old, new = statistics.median(olds), statistics.median(news)
+        print(f"{name:>10} {old:>14,.0f} {new:>15,.0f} {new / old:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Build a LOCAL_GRAPH road graph (.npz CSR arrays) from CSV exports.
+
+Inputs (headers required):
+  nodes.csv   id,lat,lng
+  edges.csv   from,to,seconds[,oneway]   (oneway 0/false adds the reverse edge)
+
+Node ids may be any strings (e.g. OSM node ids); they are renumbered 0..n-1.
+
+Usage:
+    python -m scripts.build_road_graph nodes.csv edges.csv var/road_graphs/osm-texas.npz
+"""
+
+import argparse
+import csv
+import os
+
+from packages.router.local_graph import RoadGraph
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("nodes")
+    ap.add_argument("edges")
+    ap.add_argument("out")
+    args = ap.parse_args()
+
+    index, lat, lng = {}, [], []
+    with open(args.nodes, newline="") as f:
+        for row in csv.DictReader(f):
+            index[row["id"]] = len(lat)
+            lat.append(float(row["lat"]))
+            lng.append(float(row["lng"]))
+
+    edges, skipped = [], 0
+    with open(args.edges, newline="") as f:
+        for row in csv.DictReader(f):
+            u, v = index.get(row["from"]), index.get(row["to"])
+            if u is None or v is None:
+                skipped += 1
+                continue
+            t = float(row["seconds"])
+            edges.append((u, v, t))
+            if str(row.get("oneway", "1")).strip().lower() in ("0", "false", "no"):
+                edges.append((v, u, t))
+
+    graph = RoadGraph.from_edges(lat, lng, edges)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    graph.save(args.out)
+    print(f"wrote {args.out}: {len(graph)} nodes, {len(graph.indices)} edges ({skipped} skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Trained acceptance model: fitting, artifacts, hot reload, batch parity."""
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from packages.db.base import Base
+from packages.db.models import OfferLog
+from packages.predictions import acceptance_model as am
+from packages.predictions.acceptance import acceptance_inputs, feature_matrix, p_accept
+
+TRUE_INTERCEPT = 0.5
+TRUE_COEF = np.array([0.9, -0.4, 0.05, 0.3, -0.8, -2.0])
+
+
+def _raw(rng, n):
+    return {
+        "accept_rate_7d": rng.uniform(0.1, 0.9, n),
+        "cancel_rate_7d": rng.uniform(0.0, 0.8, n),
+        "recent_timeouts": rng.integers(0, 4, n),
+        "payout_cents": rng.integers(400, 2500, n),
+        "eta_pu_s": rng.integers(60, 900, n),
+        "total_trip_s": rng.integers(900, 3000, n),
+    }
+
+
+def _features(raw):
+    return feature_matrix(
+        raw["accept_rate_7d"], raw["cancel_rate_7d"], raw["recent_timeouts"], raw["payout_cents"],
+        eta_pu_s=raw["eta_pu_s"], total_trip_s=raw["total_trip_s"],
+    )
+
+
+def _labels(rng, X):
+    p = 1.0 / (1.0 + np.exp(-(TRUE_INTERCEPT + X @ TRUE_COEF)))
+    return (rng.random(len(p)) < p).astype(np.float64)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_heuristic_model_matches_scalar_reference():
+    d = {"metrics": {"accept_rate_7d": 0.7, "cancel_rate_7d": 0.1, "recent_timeouts": 1}}
+    j = {"pricing": {"payout_cents_est": 1200}}
+    inputs = acceptance_inputs(d, j, eta_pu_s=300, total_trip_s=1500)
+    batch = am.HEURISTIC_MODEL.predict_batch(
+        [inputs["accept_rate_7d"]], [inputs["cancel_rate_7d"]], [inputs["recent_timeouts"]],
+        [inputs["payout_cents"]], eta_pu_s=[300], total_trip_s=[1500],
+    )
+    assert batch[0] == pytest.approx(p_accept(d, j, eta_pu_s=300, total_trip_s=1500))
+
+
+def test_fit_recovers_coefficients_and_beats_heuristic():
+    rng = np.random.default_rng(0)
+    X = _features(_raw(rng, 20_000))
+    y = _labels(rng, X)
+    model = am.fit_acceptance_model(X, y, l2=0.1)
+    assert model.intercept == pytest.approx(TRUE_INTERCEPT, abs=0.3)
+    assert np.allclose(model.coef, TRUE_COEF, rtol=0.2, atol=0.05)
+    assert model.metrics["holdout_log_loss"] < model.metrics["heuristic_log_loss"]
+
+
+def test_train_publish_and_hot_reload(db, tmp_path):
+    rng = np.random.default_rng(1)
+    raw = _raw(rng, 800)
+    y = _labels(rng, _features(raw))
+    created = datetime.now(timezone.utc)
+    for i in range(len(y)):
+        inputs = {k: v[i].item() for k, v in raw.items()}
+        db.add(OfferLog(id=f"l{i}", task_id=f"t{i}", order_id=f"o{i}", driver_id="d",
+                        created_at=created, outcome="ACCEPTED" if y[i] else rng.choice(["REJECTED", "TIMEOUT"]),
+                        features_json={"acceptance": inputs}))
+    db.add(OfferLog(id="old", task_id="t", order_id="o", driver_id="d", outcome="ACCEPTED", features_json={}))
+    db.add(OfferLog(id="open", task_id="t", order_id="o", driver_id="d", outcome=None,
+                    features_json={"acceptance": {k: v[0].item() for k, v in raw.items()}}))
+    db.commit()
+
+    X, labels = am.training_rows(db)
+    assert X.shape == (800, 6) and labels.sum() == y.sum()
+
+    store = am.AcceptanceModelStore(str(tmp_path), check_s=0)
+    assert store.get() is am.HEURISTIC_MODEL
+    result = am.train_acceptance_model(db, directory=str(tmp_path), min_rows=100)
+    assert result["published"] is True
+    current = store.get()
+    assert current.version == result["version"]
+    assert current.predict(X[:5]).shape == (5,)
+
+    # A newer artifact is picked up on the next check; a broken pointer keeps the old one.
+    newer = am.AcceptanceModel(version=str(int(result["version"]) + 1), intercept=0.0, coef=[0.0] * 6)
+    am.publish_model(newer, directory=str(tmp_path))
+    assert store.get().version == newer.version
+    (tmp_path / "acceptance_current.json").write_text('{"version": "missing"}')
+    assert store.get().version == newer.version
+
+
+def test_train_skips_without_enough_rows(db, tmp_path):
+    result = am.train_acceptance_model(db, directory=str(tmp_path))
+    assert result["published"] is False
+    assert not (tmp_path / "acceptance_current.json").exists()
@@ -0,0 +1,66 @@
+"""TTLCache: expiry, byte budget and thread safety."""
+import threading
+
+from packages.router import cache as cache_mod
+from packages.router.cache import TTLCache
+
+
+class _Clock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_entries_expire_and_generations_are_swept(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_mod.time, "monotonic", clock)
+    c = TTLCache(max_items=100, ttl_s=10)
+    for i in range(20):
+        c.set(i, i * 2)
+    assert c.get(3) == 6
+    clock.t += 9.9
+    assert c.get(3) == 6
+    clock.t += 0.2
+    assert c.get(3) is None
+    clock.t += 10 / 8  # past the end of the write generation
+    c.set("fresh", 1)  # new generation: the expired ones are dropped in one sweep
+    assert len(c) == 1
+    assert c.nbytes > 0
+
+
+def test_byte_budget_evicts_oldest_first():
+    c = TTLCache(max_items=10_000, ttl_s=60, max_bytes=20_000)
+    for i in range(200):
+        c.set(i, "x" * 100)
+    assert c.nbytes <= 20_000
+    assert c.get(199) is not None
+    assert c.get(0) is None
+
+
+def test_item_cap_and_overwrite():
+    c = TTLCache(max_items=3, ttl_s=60)
+    for k in "abcd":
+        c.set(k, k)
+    assert len(c) <= 3 and c.get("d") == "d"
+    c.set("d", "D")
+    assert c.get("d") == "D" and len(c) <= 3
+
+
+def test_concurrent_access_keeps_accounting_consistent():
+    c = TTLCache(max_items=50_000, ttl_s=60, max_bytes=200_000)
+
+    def work(seed):
+        for i in range(5_000):
+            k = (seed * 7 + i) % 3_000
+            if c.get(k) is None:
+                c.set(k, [k] * 4)
+
+    threads = [threading.Thread(target=work, args=(s,)) for s in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert c.nbytes <= 200_000
+    assert c.nbytes == sum(item[1] for sh in c._shards for item in sh.data.values())
@@ -4,12 +4,21 @@ These tests exercise candidate generation, cost computation, the MCF solver,
 batch loop clustering, and the acceptance heuristic — all without a database.
 """
 import math
+import random
+
+import numpy as np
 import pytest
 
-from packages.dispatch.candidates import generate_candidates_topk, _haversine_m
-from packages.dispatch.costs import compute_cost
-from packages.dispatch.solver_mcf import solve_min_cost_flow
-from packages.dispatch.batch_loop import _cluster_jobs, _nn_order_stops, _pick_best_driver
+from packages.dispatch.assignment import solve_sparse_assignment
+from packages.dispatch.candidates import generate_candidates_topk, _generate_candidates_scalar, _haversine_m
+from packages.dispatch.costs import compute_cost, compute_costs_batch
+from packages.dispatch.ortools_wrapper import (
+    _exact_route, _solve_pdptw_insertion, pdp_route_cost, solve_route_indices, solve_vrp_with_stats,
+    vrp_route_cost,
+)
+from packages.dispatch.solver_mcf import AssignmentSolver, components, solve_min_cost_flow
+from packages.dispatch import batch_loop, ortools_wrapper
+from packages.dispatch.batch_loop import _TickBudget, _cluster_jobs, _nn_order_stops, _pick_best_driver, _plan_joint
 from packages.predictions.acceptance import p_accept
 
 
@@ -151,6 +160,196 @@ def test_candidates_skips_offline_driver():
     assert edges == []
 
 
+def test_candidates_skip_driver_with_outstanding_offer():
+    tasks = [{"order_id": "ord_9", "status": "OFFERED", "offered_to_driver_id": "d1"}]
+    snap = _snapshot(drivers=[_driver("d1"), _driver("d2", lat=30.30)], jobs=[_job()], tasks=tasks)
+    for vectorized in (True, False):
+        edges = generate_candidates_topk(snap, k_prime=10, k=5, vectorized=vectorized)
+        assert [e["driver_id"] for e in edges] == ["d2"]
+
+
+def test_task_lookups():
+    from packages.dispatch.lookups import build_task_lookups, task_lookups
+    tasks = [
+        {"task_id": "t1", "order_id": "o1", "status": "OFFERED", "offered_to_driver_id": "d1"},
+        {"task_id": "t2", "order_id": "o2", "status": "ACCEPTED", "offered_to_driver_id": "d2", "driver_id": "d2"},
+        {"task_id": "t3", "order_id": "o3", "status": "EXPIRED", "offered_to_driver_id": "d3"},
+    ]
+    lk = build_task_lookups(tasks)
+    assert lk["active_order_ids"] == {"o1", "o2"}
+    assert lk["busy_driver_ids"] == {"d1", "d2"}
+    assert [t["task_id"] for t in lk["tasks_by_driver"]["d2"]] == ["t2"]
+    snap = _snapshot(tasks=tasks)
+    assert task_lookups(snap) is task_lookups(snap)
+
+
+def _random_metro(seed=7, n_drivers=300, n_jobs=80):
+    import random
+    rng = random.Random(seed)
+    drivers = [
+        _driver(f"d{i}", lat=30.20 + rng.random() * 0.15, lng=-97.80 + rng.random() * 0.15,
+                status=rng.choice(["IDLE", "IDLE", "IDLE", "OFFLINE"]), ins=rng.random() > 0.1)
+        for i in range(n_drivers)
+    ]
+    # Duplicate positions exercise the tie-breaking order.
+    drivers += [_driver(f"dup{i}", lat=30.27, lng=-97.74) for i in range(5)]
+    jobs = [
+        _job(f"j{i}", order_id=f"ord_{i}", plat=30.20 + rng.random() * 0.15, plng=-97.80 + rng.random() * 0.15)
+        for i in range(n_jobs)
+    ]
+    tasks = [{"order_id": "ord_3", "status": "OFFERED"}, {"order_id": "ord_4", "status": "COMPLETED"}]
+    return _snapshot(drivers=drivers, jobs=jobs, tasks=tasks)
+
+
+def test_candidates_vectorized_matches_scalar():
+    snap = _random_metro()
+    for k_prime, k in ((100, 20), (3, 20), (100, 1), (1000, 1000)):
+        fast = generate_candidates_topk(snap, k_prime=k_prime, k=k, vectorized=True)
+        ref = _generate_candidates_scalar(snap, k_prime=k_prime, k=k, index=None)
+        assert fast == ref
+    assert not any(e["job_id"] == "j3" for e in fast)
+    assert any(e["job_id"] == "j4" for e in fast)
+
+
+def test_candidates_persistent_index_matches_full_scan():
+    pytest.importorskip("h3")
+    from packages.geo.h3_index import DriverH3Index
+    snap = _random_metro(seed=11)
+    index = DriverH3Index(res=8)
+    index.build(snap["drivers"])
+    snap["driver_index"] = index
+    # k_prime above the fleet size so ring expansion always reaches the radius.
+    via_index = generate_candidates_topk(snap, k_prime=10_000, k=10_000)
+    ref = _generate_candidates_scalar(snap, k_prime=10_000, k=10_000, index=None)
+    key = lambda e: (e["job_id"], e["driver_id"], e["eta_pu_s"])
+    assert sorted(via_index, key=key) == sorted(ref, key=key)
+
+
+def test_driver_index_move_insert_remove():
+    pytest.importorskip("h3")
+    from packages.geo.h3_index import DriverH3Index
+    index = DriverH3Index(res=8)
+    index.build([_driver("d1"), _driver("d_off", status="OFFLINE"), _driver("d_inel", ins=False)])
+    assert len(index) == 1 and "d1" in index
+    assert [d["driver_id"] for d in index.query_ring(30.27, -97.74, 0)] == ["d1"]
+
+    index.upsert(_driver("d1", lat=30.40, lng=-97.60))  # move
+    assert index.query_ring(30.27, -97.74, 1) == []
+    assert [d["driver_id"] for d in index.query_ring(30.40, -97.60, 0)] == ["d1"]
+
+    index.upsert(_driver("d2", lat=30.40, lng=-97.60))  # insert
+    index.upsert(_driver("d1", lat=30.40, lng=-97.60, status="ON_TASK"))  # no longer dispatchable
+    assert [d["driver_id"] for d in index.query_ring(30.40, -97.60, 0)] == ["d2"]
+    index.remove("d2")
+    assert len(index) == 0 and index.map == {}
+
+
+def test_driver_index_query_nearby_stops_early():
+    pytest.importorskip("h3")
+    from packages.geo.h3_index import DriverH3Index
+    index = DriverH3Index(res=8)
+    index.build([_driver("near", lat=30.2700, lng=-97.7400), _driver("far", lat=30.2900, lng=-97.7400)])
+    assert [d["driver_id"] for d in index.query_nearby(30.27, -97.74, min_count=1, max_k=10)] == ["near"]
+    found = index.query_nearby(30.27, -97.74, min_count=5, max_k=10)
+    assert sorted(d["driver_id"] for d in found) == ["far", "near"]
+    assert index.rings_for_radius(6000) >= 7
+
+
+def test_grid_index_matches_full_scan():
+    from packages.geo.grid_index import DriverGridIndex
+    snap = _random_metro(seed=13)
+    index = DriverGridIndex(cell_m=500)
+    index.build(snap["drivers"])
+    snap["driver_index"] = index
+    via_index = generate_candidates_topk(snap, k_prime=10_000, k=10_000)
+    ref = _generate_candidates_scalar(snap, k_prime=10_000, k=10_000, index=None)
+    key = lambda e: (e["job_id"], e["driver_id"], e["eta_pu_s"])
+    assert sorted(via_index, key=key) == sorted(ref, key=key)
+
+
+def test_grid_index_move_insert_remove():
+    from packages.geo.grid_index import DriverGridIndex
+    index = DriverGridIndex(cell_m=500)
+    index.build([_driver("d1"), _driver("d_off", status="OFFLINE")])
+    assert len(index) == 1
+    assert [d["driver_id"] for d in index.query_ring(30.27, -97.74, 0)] == ["d1"]
+    index.upsert(_driver("d1", lat=30.40, lng=-97.60))
+    assert index.query_ring(30.27, -97.74, 2) == []
+    assert [d["driver_id"] for d in index.query_ring(30.40, -97.60, 0)] == ["d1"]
+    index.remove("d1")
+    assert len(index) == 0 and index.map == {}
+
+
+def test_grid_index_ring_covers_radius():
+    from packages.geo.grid_index import DriverGridIndex
+    index = DriverGridIndex(cell_m=500)
+    # 2.9 km due east and due north of the query point.
+    east = _driver("east", lat=30.27, lng=-97.74 + 2900 / (111_320 * math.cos(math.radians(30.27))))
+    north = _driver("north", lat=30.27 + 2900 / 111_320, lng=-97.74)
+    index.build([east, north])
+    k = index.rings_for_radius(3000)
+    assert sorted(d["driver_id"] for d in index.query_ring(30.27, -97.74, k)) == ["east", "north"]
+    assert sorted(d["driver_id"] for d in index.query_nearby(30.27, -97.74, min_count=2, max_k=k)) == ["east", "north"]
+    assert index.query_nearby(30.27, -97.74, min_count=1, max_k=1) == []
+
+
+def test_new_driver_index_falls_back_to_grid(monkeypatch):
+    import sys
+    from packages.geo.grid_index import DriverGridIndex
+    from packages.geo.h3_index import new_driver_index
+    monkeypatch.setitem(sys.modules, "h3", None)
+    assert isinstance(new_driver_index(res=8), DriverGridIndex)
+
+
+# ── ETA Refinement ───────────────────────────────────────────────────
+
+class _CountingRouter:
+    """Stands in for an OSRM-mode Router; table cells are haversine times."""
+
+    mode = "OSRM"
+
+    def __init__(self):
+        from packages.router.router import Router
+        self._ref = Router()
+        self.table_calls = []
+        self.route_calls = 0
+
+    def route_time_latlng(self, a, b):
+        self.route_calls += 1
+        return self._ref.route_time_latlng(a, b)
+
+    def matrix(self, sources, destinations):
+        self.table_calls.append(len(sources) + len(destinations))
+        return [[self._ref.route_time_latlng(a, b) for b in destinations] for a in sources]
+
+
+def test_refine_edges_batches_router_calls(monkeypatch):
+    from packages.dispatch import eta
+    snap = _random_metro(seed=5, n_drivers=120, n_jobs=40)
+    edges = generate_candidates_topk(snap, k_prime=20, k=10)
+    assert len(edges) > 100
+
+    expected = {}
+    for e in edges:
+        d = next(x for x in snap["drivers"] if x["driver_id"] == e["driver_id"])
+        j = next(x for x in snap["jobs"] if x["job_id"] == e["job_id"])
+        pu = eta._router.route_time_latlng(eta._pt(d["lat"], d["lng"]), eta._pt(j["pickup_lat"], j["pickup_lng"]))
+        drop = eta._router.route_time_latlng(eta._pt(j["pickup_lat"], j["pickup_lng"]), eta._pt(j["drop_lat"], j["drop_lng"]))
+        expected[(e["driver_id"], e["job_id"])] = (pu, drop)
+
+    fake = _CountingRouter()
+    monkeypatch.setattr(eta, "_router", fake)
+    monkeypatch.setattr(eta, "MATRIX_MAX_POINTS", 40)
+    out = eta.refine_edges_with_router(snap, [dict(e) for e in edges])
+
+    assert fake.route_calls == 0
+    assert all(n <= 40 for n in fake.table_calls)
+    assert len(fake.table_calls) < len(edges) // 10
+    for e in out:
+        assert e["approx"] is False
+        assert (e["eta_pu_s"], e["eta_drop_s"]) == expected[(e["driver_id"], e["job_id"])]
+
+
 # ── Cost Computation ─────────────────────────────────────────────────
 
 def test_cost_returns_float():
@@ -162,6 +361,50 @@ def test_cost_returns_float():
     assert cost > 0
 
 
+def test_cost_batch_matches_per_edge_cost():
+    rng = random.Random(7)
+    drivers = []
+    for i in range(30):
+        d = _driver(f"d{i}")
+        d["zone_id"] = rng.choice([None, "z1", "z2"])
+        d["metrics"] = {
+            "accept_rate_7d": rng.random(), "cancel_rate_7d": rng.random() * 0.2,
+            "recent_timeouts": rng.randint(0, 3), "fairness_penalty": rng.random() * 50,
+        }
+        drivers.append(d)
+    jobs = []
+    for i in range(20):
+        j = _job(f"j{i}", f"ord_{i}")
+        j["zone_id"] = rng.choice([None, "z1", "z2"])
+        j["ready_at_ms"] = 1700000000000 + rng.randint(0, 900) * 1000
+        j["deadline_ms"] = 1700000000000 + rng.randint(300, 2400) * 1000
+        j["pricing"] = {"payout_cents_est": rng.randint(300, 3000)}
+        jobs.append(j)
+    snap = _snapshot(drivers=drivers, jobs=jobs)
+    snap["params"]["weights"].update({"lambda_fairness": 0.5, "mu_zone": 120.0})
+    snap["predictions"] = {"id_fail_risk": [
+        {"driver_id": f"d{i}", "order_id": f"ord_{i % 20}", "p_fail": 0.2, "expected_return_cost_s": 900}
+        for i in range(0, 30, 3)
+    ] + [{"driver_id": "d0", "order_id": "ord_0", "p_fail": 0.9}]}  # first row wins
+    edges = [
+        {"driver_id": d["driver_id"], "job_id": j["job_id"],
+         "eta_pu_s": rng.randint(30, 900), "eta_drop_s": rng.randint(200, 1500)}
+        for d in drivers for j in jobs
+    ] + [{"driver_id": "ghost", "job_id": "j0", "eta_pu_s": 60, "eta_drop_s": 60}]
+
+    out = compute_costs_batch(snap, [dict(e) for e in edges])
+    drv = {d["driver_id"]: d for d in drivers}
+    job = {j["job_id"]: j for j in jobs}
+    assert "cost" not in out[-1]
+    for e, got in zip(edges[:-1], out):
+        cost, debug = compute_cost(snap, drv[e["driver_id"]], job[e["job_id"]], e["eta_pu_s"], e["eta_drop_s"])
+        assert abs(got["cost"] - cost) <= 1
+        assert got["debug"]["total_time_s"] == debug["total_time_s"]
+        assert got["debug"]["lateness_s"] == debug["lateness_s"]
+        assert got["debug"]["risk_pen"] == pytest.approx(debug["risk_pen"])
+        assert got["debug"]["p_accept"] == pytest.approx(debug["p_accept"])
+
+
 # ── MCF Solver ───────────────────────────────────────────────────────
 
 def test_mcf_empty_inputs():
@@ -201,6 +444,168 @@ def test_mcf_no_edges():
     assert matches == []
 
 
+def _two_area_problem():
+    drivers = [_driver(f"d{i}") for i in range(5)] + [_driver("d_busy", status="ON_TASK")]
+    jobs = [_job(f"j{i}", order_id=f"ord_{i}") for i in range(5)]
+    edges = [
+        {"driver_id": "d0", "job_id": "j0", "cost": 10},
+        {"driver_id": "d1", "job_id": "j0", "cost": 5},
+        {"driver_id": "d1", "job_id": "j1", "cost": 7},
+        {"driver_id": "d2", "job_id": "j2", "cost": 3},
+        {"driver_id": "d3", "job_id": "j2", "cost": 4},
+        {"driver_id": "d_busy", "job_id": "j3", "cost": 1},   # not IDLE: dropped
+        {"driver_id": "d4", "job_id": "j_gone", "cost": 1},   # unknown job: dropped
+        {"driver_id": "d4", "job_id": "j4"},                  # unscored: dropped
+    ]
+    return drivers, jobs, edges
+
+
+def test_mcf_components_prune_isolated_nodes():
+    comps = components(*_two_area_problem())
+    assert sorted(len(c) for c in comps) == [2, 3]
+    nodes = {e[0] for c in comps for e in c} | {e[1] for c in comps for e in c}
+    assert nodes == {"d0", "d1", "d2", "d3", "j0", "j1", "j2"}
+
+
+def test_mcf_solves_components_and_reports_stats():
+    solver = AssignmentSolver()
+    matches = solver.solve(*_two_area_problem())
+    pairs = {(m["driver_id"], m["job_id"]) for m in matches}
+    assert ("d2", "j2") in pairs
+    area = {p for p in pairs if p[1] in ("j0", "j1")}
+    # Maximum matching first, even though d1 -> j0 alone is cheaper.
+    assert area == {("d0", "j0"), ("d1", "j1")}
+    assert len(solver.last_stats) == 2
+    assert all(c["ms"] >= 0 for c in solver.last_stats)
+
+
+def test_assignment_solver_is_per_region():
+    from packages.dispatch import loops
+
+    a, lock_a = loops._assignment_for("tx-dfw")
+    b, lock_b = loops._assignment_for("ca-sfo")
+    assert a is not b and lock_a is not lock_b
+    assert loops._assignment_for("tx-dfw")[0] is a
+
+    a.solve(*_two_area_problem())
+    b.solve([], [], [])
+    assert a.summary()["components"] == 2 and b.summary()["components"] == 0
+
+
+def _brute_force_matching(n_rows, n_cols, edges):
+    """(cardinality, cost) of the best max-cardinality matching, by enumeration."""
+    best_w = {}
+    for r, c, w in edges:
+        best_w[(r, c)] = min(w, best_w.get((r, c), w))
+    best = (0, 0)
+
+    def rec(r, used, card, cost):
+        nonlocal best
+        if r == n_rows:
+            if (card, -cost) > (best[0], -best[1]):
+                best = (card, cost)
+            return
+        rec(r + 1, used, card, cost)
+        for c in range(n_cols):
+            if c not in used and (r, c) in best_w:
+                rec(r + 1, used | {c}, card + 1, cost + best_w[(r, c)])
+
+    rec(0, frozenset(), 0, 0)
+    return best
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_sparse_assignment_matches_brute_force(seed):
+    rng = random.Random(seed)
+    n_rows, n_cols = rng.randint(1, 6), rng.randint(1, 6)
+    edges = [(r, c, rng.randint(0, 20)) for r in range(n_rows) for c in range(n_cols) if rng.random() < 0.5]
+    if not edges:
+        edges = [(0, 0, 1)]
+    rows, cols, costs = zip(*edges)
+    match, total = solve_sparse_assignment(n_rows, n_cols, rows, cols, costs)
+
+    matched = [(r, int(c)) for r, c in enumerate(match) if c >= 0]
+    assert len({c for _, c in matched}) == len(matched)
+    assert all((r, c) in {(e[0], e[1]) for e in edges} for r, c in matched)
+    assert (len(matched), total) == _brute_force_matching(n_rows, n_cols, edges)
+
+
+def _dense_hungarian(n_rows, n_cols, rows, cols, costs):
+    """(cardinality, cost) by the O(n^3) Hungarian method on the dense matrix.
+
+    Missing edges cost more than any full real matching, so minimising the
+    total maximises cardinality first, as ``solve_sparse_assignment`` does.
+    """
+    transpose = n_rows > n_cols
+    if transpose:
+        n_rows, n_cols, rows, cols = n_cols, n_rows, cols, rows
+    missing = (max(costs) + 1) * (n_rows + 1)
+    a = np.full((n_rows, n_cols), float(missing))
+    for r, c, w in zip(rows, cols, costs):
+        a[r, c] = min(a[r, c], w)
+    u, v = np.zeros(n_rows + 1), np.zeros(n_cols + 1)
+    p = np.zeros(n_cols + 1, dtype=int)  # column -> row (1-based, 0 = free)
+    for i in range(1, n_rows + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(n_cols + 1, np.inf)
+        way = np.zeros(n_cols + 1, dtype=int)
+        used = np.zeros(n_cols + 1, dtype=bool)
+        while p[j0]:
+            used[j0] = True
+            i0 = p[j0]
+            cur = a[i0 - 1] - u[i0] - v[1:]
+            better = ~used[1:] & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            free = np.flatnonzero(~used[1:]) + 1
+            j1 = free[np.argmin(minv[free])]
+            delta = minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    card, total = 0, 0
+    for j in range(1, n_cols + 1):
+        if p[j] and a[p[j] - 1, j - 1] < missing:
+            card += 1
+            total += a[p[j] - 1, j - 1]
+    return card, total
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("n_rows,n_cols,k", [(80, 80, 4), (60, 120, 6), (120, 60, 3)])
+def test_sparse_assignment_matches_dense_hungarian(seed, n_rows, n_cols, k):
+    # Top-K geometric graphs like the FAST loop's: long augmenting paths,
+    # several unmatched rows at K=3/4.
+    rng = np.random.default_rng(seed)
+    pr, pc = rng.random((n_rows, 2)), rng.random((n_cols, 2))
+    d = np.linalg.norm(pr[:, None] - pc[None], axis=2)
+    cols = np.argpartition(d, k - 1, axis=1)[:, :k].ravel()
+    rows = np.repeat(np.arange(n_rows), k)
+    costs = (d[rows, cols] * 10_000).astype(np.int64) + rng.integers(0, 50, len(rows))
+
+    match, total = solve_sparse_assignment(n_rows, n_cols, rows, cols, costs)
+    card, ref = _dense_hungarian(n_rows, n_cols, rows.tolist(), cols.tolist(), costs.tolist())
+    assert (int((match >= 0).sum()), total) == (card, ref)
+    # Same instance with float costs takes the unpacked heap path.
+    match, total = solve_sparse_assignment(n_rows, n_cols, rows, cols, costs + 0.25)
+    assert int((match >= 0).sum()) == card and total == pytest.approx(ref + 0.25 * card)
+
+
+def test_sparse_assignment_prefers_cardinality_over_cost():
+    # Two rows want column 0; row 1 is cheaper there but row 0 has nowhere else.
+    match, total = solve_sparse_assignment(2, 2, [0, 1, 1], [0, 0, 1], [5, 1, 9])
+    assert match.tolist() == [0, 1] and total == 14
+    # One column, two rows: the cheaper row wins, the other stays unmatched.
+    match, total = solve_sparse_assignment(2, 1, [0, 1], [0, 0], [5, 1])
+    assert match.tolist() == [-1, 0] and total == 1
+
+
 # ── Batch Loop: Clustering ───────────────────────────────────────────
 
 def test_cluster_empty():
@@ -222,6 +627,39 @@ def test_cluster_distant_jobs_separate():
     assert len(clusters) == 2
 
 
+def test_cluster_ignores_input_order():
+    rng = random.Random(3)
+    jobs = [
+        _job(f"j{i}", order_id=f"o{i}", plat=30.2 + rng.random() * 0.2, plng=-97.8 + rng.random() * 0.2)
+        for i in range(200)
+    ] + [_job("nowhere", order_id="on", plat=None, plng=None)]
+    clusters = _cluster_jobs(jobs)
+    shuffled = list(jobs)
+    rng.shuffle(shuffled)
+    assert _cluster_jobs(shuffled) == clusters
+    assert clusters[-1][0]["job_id"] == "nowhere"
+
+
+def test_cluster_seeds_claim_everything_in_radius():
+    rng = random.Random(4)
+    jobs = [
+        _job(f"j{i}", order_id=f"o{i}", plat=30.2 + rng.random() * 0.3, plng=-97.8 + rng.random() * 0.3)
+        for i in range(300)
+    ]
+    clusters = _cluster_jobs(jobs, radius_m=2000)
+    assert sorted(j["job_id"] for c in clusters for j in c) == sorted(j["job_id"] for j in jobs)
+
+    def dist(a, b):
+        return _haversine_m(a["pickup_lat"], a["pickup_lng"], b["pickup_lat"], b["pickup_lng"])
+
+    seeds = [c[0] for c in clusters]
+    for k, cluster in enumerate(clusters):
+        # Every member is within the radius of its seed...
+        assert all(dist(cluster[0], j) <= 2000 + 1e-6 for j in cluster)
+        # ...and was not in reach of any earlier seed.
+        assert all(dist(seed, j) > 2000 - 1e-6 for seed in seeds[:k] for j in cluster)
+
+
 # ── Batch Loop: NN Ordering ──────────────────────────────────────────
 
 def test_nn_single_job():
@@ -259,6 +697,14 @@ def test_pick_best_driver_skips_assigned():
     assert best["driver_id"] == "d1"
 
 
+def test_pick_best_driver_skips_busy():
+    snap = _snapshot(tasks=[{"order_id": "o9", "status": "OFFERED", "offered_to_driver_id": "d1"}])
+    d1 = _driver("d1", lat=30.28, lng=-97.74)
+    d2 = _driver("d2", lat=30.30, lng=-97.74)
+    best = _pick_best_driver(snap, [d1, d2], [_job("j1", plat=30.28, plng=-97.74)], set())
+    assert best["driver_id"] == "d2"
+
+
 def test_pick_best_driver_none_eligible():
     snap = _snapshot()
     d1 = _driver("d1", ins=False)
@@ -266,6 +712,249 @@ def test_pick_best_driver_none_eligible():
     assert best is None
 
 
+# ── Batch Loop: Joint Planning ───────────────────────────────────────
+
+def _line_matrix(points):
+    """Travel time = 60 s per unit of distance along a line."""
+    return [[abs(a - b) * 60 for b in points] for a in points]
+
+
+def test_pdp_route_cost_checks_capacity_order_and_horizon():
+    # Driver at 0; job 0 picks up at 1 and drops at 2; job 1 picks up at 3 and drops at 4.
+    tm = _line_matrix([0, 1, 2, 3, 4])
+    kw = dict(ready_s=[0, 0], due_s=[10_000, 10_000], horizon_s=10_000, service_s=0)
+    seq = [("pickup", 0), ("drop", 0), ("pickup", 1), ("drop", 1)]
+    assert pdp_route_cost(0, seq, tm, capacity=1, **kw) == (240, 0)
+    both = [("pickup", 0), ("pickup", 1), ("drop", 0), ("drop", 1)]
+    assert pdp_route_cost(0, both, tm, capacity=1, **kw) is None
+    assert pdp_route_cost(0, both, tm, capacity=2, **kw) == (360, 0)
+    assert pdp_route_cost(0, [("drop", 0), ("pickup", 0)], tm, capacity=1, **kw) is None
+    assert pdp_route_cost(0, seq, tm, capacity=1, **{**kw, "horizon_s": 200}) is None
+    late = pdp_route_cost(0, seq, tm, capacity=1, **{**kw, "due_s": [60, 60]})
+    assert late == (240, (120 - 60) + (240 - 60))
+
+
+def test_pdp_insertion_routes_each_driver_to_its_side():
+    # Drivers at 0 and 10; jobs near each end.
+    tm = _line_matrix([0, 10, 1, 2, 9, 8])
+    routes = _solve_pdptw_insertion(2, tm, [0, 0], [10_000, 10_000], [1, 1], 10_000, 0)
+    assert routes == [[("pickup", 0), ("drop", 0)], [("pickup", 1), ("drop", 1)]]
+    # Zero capacity: nothing fits anywhere.
+    assert _solve_pdptw_insertion(2, tm, [0, 0], [10_000, 10_000], [0, 0], 10_000, 0) == [[], []]
+
+
+def test_plan_joint_uses_several_drivers_per_partition():
+    drivers = [_driver(f"d{i}", lat=30.27 + 0.01 * i, lng=-97.74) for i in range(3)]
+    jobs = [
+        _job(f"j{i}", order_id=f"o{i}", plat=30.27 + 0.01 * i, plng=-97.735, dlat=30.28 + 0.01 * i, dlng=-97.73)
+        for i in range(3)
+    ]
+    snap = _snapshot(drivers, jobs)
+    routes, stats = _plan_joint(snap, jobs, drivers)
+    assert stats["partitions"] == 1
+    assert stats["jobs_routed"] == 3 and stats["baseline_jobs_routed"] >= 1
+    assert len({r["driver_id"] for r in routes}) == len(routes) > 1
+    routed = [j["job_id"] for r in routes for j in r["ordered_jobs"]]
+    assert sorted(routed) == ["j0", "j1", "j2"]
+
+
+# ── VRP time budget and warm starts ─────────────────────────────────
+
+@pytest.mark.parametrize("seed", range(20))
+def test_exact_route_matches_brute_force(seed):
+    import itertools
+    rng = random.Random(seed)
+    n = rng.randint(0, 7)
+    tm = [[0 if i == j else rng.randint(1, 900) for j in range(n + 1)] for i in range(n + 1)]
+    best = min((vrp_route_cost(tm, 0, p) for p in itertools.permutations(range(1, n + 1))), default=0)
+    route = _exact_route(tm)
+    assert sorted(route) == list(range(1, n + 1))
+    assert vrp_route_cost(tm, 0, route) == best
+
+
+def test_solve_vrp_warm_start_keeps_previous_order_and_adds_new_jobs():
+    # Driver at 0, twelve stops along a line: too many to solve exactly.
+    points = [0] + list(range(1, 13))
+    tm = _line_matrix(points)
+    jobs = [{"job_id": f"j{i}"} for i in range(12)]
+    driver = {"driver_id": "d1"}
+    previous = [{"job_id": f"j{i}"} for i in range(11)] + [{"job_id": "gone"}]
+    routes, stats = solve_vrp_with_stats([driver], jobs, tm, time_limit_s=0.0, initial_routes=[previous])
+    assert stats["warm"] and stats["engine"] in ("warm", "nn")
+    assert [j["job_id"] for j in routes[0]] == [f"j{i}" for i in range(12)]
+    assert stats["objective_s"] == 12 * 60 and stats["improvement_s"] == 0
+
+    # A bad seed is not kept when nearest-neighbor does better.
+    backwards = [list(reversed(jobs))]
+    routes, stats = solve_vrp_with_stats([driver], jobs, tm, time_limit_s=0.0, initial_routes=backwards)
+    assert stats["objective_s"] == 12 * 60
+    assert stats["improvement_s"] == stats["initial_s"] - 12 * 60 > 0
+
+
+def test_solve_vrp_keeps_seed_over_worse_ortools_result(monkeypatch):
+    points = [0] + list(range(1, 13))
+    tm = _line_matrix(points)
+    jobs = [{"job_id": f"j{i}"} for i in range(12)]
+    seen = {}
+
+    def worse(drivers, jobs, time_matrix, *, time_limit_s, initial_routes, horizon_s):
+        seen["horizon_s"] = horizon_s
+        return [list(reversed(jobs))]
+
+    monkeypatch.setattr(ortools_wrapper, "_solve_vrp_ortools", worse)
+    routes, stats = solve_vrp_with_stats([{"driver_id": "d1"}], jobs, tm, initial_routes=[jobs], horizon_s=600)
+    assert seen["horizon_s"] == 600
+    assert stats["engine"] == "warm" and [j["job_id"] for j in routes[0]] == [f"j{i}" for i in range(12)]
+    assert stats["improvement_s"] == 0
+
+
+def test_solve_vrp_small_route_is_exact():
+    tm = _line_matrix([0, 3, 1, 2])
+    jobs = [{"job_id": "a"}, {"job_id": "b"}, {"job_id": "c"}]
+    routes, stats = solve_vrp_with_stats([{"driver_id": "d1"}], jobs, tm)
+    assert stats["engine"] == "exact"
+    assert [j["job_id"] for j in routes[0]] == ["b", "c", "a"]
+
+
+def test_tick_budget_splits_by_weight_and_rolls_over(monkeypatch):
+    monkeypatch.setattr(batch_loop, "BATCH_VRP_TIME_LIMIT_S", 100.0)
+    budget = _TickBudget([10, 0, 30], total_s=8.0)
+    assert budget.take(10) == pytest.approx(2.0, abs=0.05)
+    assert budget.take(0) == 0.0
+    # Nothing was actually spent, so the last solve gets everything left.
+    assert budget.take(30) == pytest.approx(8.0, abs=0.05)
+    monkeypatch.setattr(batch_loop, "BATCH_VRP_TIME_LIMIT_S", 1.0)
+    assert _TickBudget([5], total_s=8.0).take(5) == 1.0
+
+
+def test_plan_clusters_seeds_each_driver_from_previous_tick(monkeypatch):
+    monkeypatch.setattr(batch_loop, "_previous_routes", {})
+    seen = []
+
+    def fake_solve(matrix, seed, time_limit_s):
+        seen.append(list(seed))
+        return solve_route_indices(matrix, seed, time_limit_s)
+
+    monkeypatch.setattr(batch_loop, "solve_route_indices", fake_solve)
+    drivers = [_driver("d1")]
+    jobs = [_job(f"j{i}", order_id=f"o{i}", plat=30.27 + 0.002 * i) for i in range(3)]
+    snap = _snapshot(drivers, jobs)
+    routes, stats = batch_loop._plan_clusters(snap, [jobs], drivers)
+    assert seen == [[]] and stats["vrp"]["solves"] == 1 and stats["vrp"]["exact"] == 1
+    routes, stats = batch_loop._plan_clusters(snap, [jobs], drivers)
+    assert [jobs[k] for k in seen[1]] == routes[0]["ordered_jobs"] and stats["vrp"]["warm"] == 1
+
+
+def _cluster_work(n_clusters=3, size=4):
+    drivers = [_driver(f"d{c}", lat=30.27 + 0.05 * c) for c in range(n_clusters)]
+    clusters = [
+        [_job(f"j{c}_{i}", order_id=f"o{c}_{i}", plat=30.27 + 0.05 * c + 0.003 * i) for i in range(size)]
+        for c in range(n_clusters)
+    ]
+    return drivers, clusters
+
+
+def test_reconcile_merges_in_cluster_order_and_resolves_conflicts():
+    drivers, clusters = _cluster_work()
+    work = [
+        batch_loop._ClusterSolve(driver=drivers[0], jobs=clusters[0], weight=0, matrix=None, seed=[]),
+        batch_loop._ClusterSolve(driver=drivers[0], jobs=clusters[1], weight=0, matrix=None, seed=[]),
+        batch_loop._ClusterSolve(driver=drivers[2], jobs=clusters[2], weight=0, matrix=None, seed=[]),
+    ]
+    stats = {"engine": "nn", "warm": False, "ms": 1.0, "objective_s": 60, "improvement_s": 0}
+    routes, solves = batch_loop._reconcile(work, [([3, 2, 1, 0], stats), ([0], stats), None])
+    assert [r["driver_id"] for r in routes] == ["d0", "d2"]  # d0 is only planned once
+    assert [j["job_id"] for j in routes[0]["ordered_jobs"]] == ["j0_3", "j0_2", "j0_1", "j0_0"]
+    # The failed solve falls back to nearest-neighbor from the driver.
+    assert [j["job_id"] for j in routes[1]["ordered_jobs"]] == [f"j2_{i}" for i in range(4)]
+    assert len(solves) == 1
+
+
+def test_plan_clusters_process_pool_matches_inline(monkeypatch):
+    drivers, clusters = _cluster_work()
+    jobs = [j for c in clusters for j in c]
+    snap = _snapshot(drivers, jobs)
+    monkeypatch.setattr(batch_loop, "_previous_routes", {})
+    inline, _ = batch_loop._plan_clusters(snap, clusters, drivers)
+
+    monkeypatch.setattr(batch_loop, "_previous_routes", {})
+    monkeypatch.setattr(batch_loop, "BATCH_WORKERS", 2)
+    try:
+        pooled, stats = batch_loop._plan_clusters(snap, clusters, drivers)
+    finally:
+        batch_loop._drop_pool()
+    assert pooled == inline and stats["vrp"]["solves"] == len(clusters)
+
+
+def test_plan_clusters_falls_back_inline_without_pool(monkeypatch):
+    class NoChildren:
+        def submit(self, *a, **kw):
+            raise AssertionError("daemonic processes are not allowed to have children")
+
+        def shutdown(self, **kw):
+            pass
+
+    drivers, clusters = _cluster_work(2)
+    snap = _snapshot(drivers, [j for c in clusters for j in c])
+    monkeypatch.setattr(batch_loop, "BATCH_WORKERS", 2)
+    monkeypatch.setattr(batch_loop, "_pool", NoChildren())
+    monkeypatch.setattr(batch_loop, "_pool_unavailable", False)
+    routes, stats = batch_loop._plan_clusters(snap, clusters, drivers)
+    assert len(routes) == 2 and stats["vrp"]["solves"] == 2
+    assert batch_loop._pool is None and batch_loop._solver_pool() is None
+
+
+def test_pooled_tick_waits_only_the_unscaled_budget(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    release = threading.Event()
+
+    def stuck_solve(matrix, seed, time_limit_s):
+        release.wait(10)
+        return None
+
+    drivers, clusters = _cluster_work()
+    snap = _snapshot(drivers, [j for c in clusters for j in c])
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(batch_loop, "_previous_routes", {})
+    monkeypatch.setattr(batch_loop, "BATCH_WORKERS", 4)
+    monkeypatch.setattr(batch_loop, "BATCH_TICK_BUDGET_S", 0.3)
+    monkeypatch.setattr(batch_loop, "_POOL_GRACE_S", 0.1)
+    monkeypatch.setattr(batch_loop, "_pool", pool)
+    monkeypatch.setattr(batch_loop, "_pool_unavailable", False)
+    monkeypatch.setattr(batch_loop, "solve_route_indices", stuck_solve)
+    try:
+        t0 = time.monotonic()
+        routes, stats = batch_loop._plan_clusters(snap, clusters, drivers)
+        elapsed = time.monotonic() - t0
+    finally:
+        release.set()
+        pool.shutdown(wait=True)
+    # 0.3 s budget + 0.1 s grace, not 0.3 s x 4 workers.
+    assert elapsed < 0.9
+    # Every cluster still gets a nearest-neighbor route.
+    assert len(routes) == len(clusters) and stats["vrp"]["solves"] == 0
+
+
+def test_worker_warns_when_batch_workers_cannot_start(monkeypatch, caplog):
+    from types import SimpleNamespace
+    from apps.worker import celery_app
+
+    def worker(pool, queues):
+        return SimpleNamespace(pool_cls=pool, app=SimpleNamespace(amqp=SimpleNamespace(
+            queues=SimpleNamespace(consume_from={q: None for q in queues}))))
+
+    monkeypatch.setattr(celery_app, "BATCH_WORKERS", 4)
+    with caplog.at_level("WARNING", logger=celery_app.logger.name):
+        celery_app._warn_batch_workers_ignored(worker("threads", ["batch"]))
+        celery_app._warn_batch_workers_ignored(worker("prefork", ["celery"]))
+        assert not caplog.records
+        celery_app._warn_batch_workers_ignored(worker("prefork", ["celery", "batch"]))
+    assert "DISPATCH_BATCH_WORKERS=4 is ignored" in caplog.text
+
+
 # ── Acceptance Probability ───────────────────────────────────────────
 
 def test_p_accept_in_range():
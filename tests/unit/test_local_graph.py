@@ -0,0 +1,170 @@
+"""In-process road-graph router (ROUTER_MODE=LOCAL_GRAPH) on a synthetic grid."""
+import heapq
+
+import numpy as np
+
+from packages.router.local_graph import LocalGraphRouter, RoadGraph
+from packages.router.router import Router
+
+LAT0, LNG0, STEP = 30.0, -97.0, 0.005  # ~550 m spacing
+
+
+def _grid(n=8, seed=0):
+    """n x n grid, two-way streets with random times plus one one-way shortcut."""
+    rng = np.random.default_rng(seed)
+    lat, lng, edges = [], [], []
+    for r in range(n):
+        for c in range(n):
+            lat.append(LAT0 + r * STEP)
+            lng.append(LNG0 + c * STEP)
+    for r in range(n):
+        for c in range(n):
+            u = r * n + c
+            if c + 1 < n:
+                edges.append((u, u + 1, float(rng.uniform(20, 60))))
+            if r + 1 < n:
+                edges.append((u, u + n, float(rng.uniform(20, 60))))
+    g = RoadGraph.from_edges(lat, lng, edges, bidirectional=True, graph_id="test")
+    g2 = RoadGraph.from_edges(lat, lng, edges + [(e[1], e[0], e[2]) for e in edges] + [(0, n * n - 1, 5.0)])
+    return g, g2
+
+
+def _dijkstra(g, s):
+    dist = {s: 0.0}
+    heap = [(0.0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for i in range(g.indptr[u], g.indptr[u + 1]):
+            v, nd = int(g.indices[i]), d + float(g.weights[i])
+            if nd < dist.get(v, float("inf")):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def test_bidirectional_matches_plain_dijkstra():
+    g, _ = _grid()
+    for s in (0, 9, 27, 63):
+        ref = _dijkstra(g, s)
+        for t in range(len(g)):
+            assert abs(g.shortest_time(s, t) - ref[t]) < 1e-3
+        many = g.times_from(s, range(len(g)))
+        assert all(abs(many[t] - ref[t]) < 1e-3 for t in range(len(g)))
+
+
+def test_one_way_edge_is_directional():
+    _, g = _grid()
+    assert g.shortest_time(0, len(g) - 1) == 5.0
+    assert g.shortest_time(len(g) - 1, 0) > 5.0
+    path = g.shortest_path(0, len(g) - 1)
+    assert path == [0, len(g) - 1]
+
+
+def test_path_is_consistent_with_time():
+    g, _ = _grid()
+    path = g.shortest_path(3, 60)
+    assert path[0] == 3 and path[-1] == 60
+    total = 0.0
+    for u, v in zip(path, path[1:]):
+        lo, hi = g.indptr[u], g.indptr[u + 1]
+        total += float(min(g.weights[i] for i in range(lo, hi) if g.indices[i] == v))
+    assert abs(total - g.shortest_time(3, 60)) < 1e-3
+
+
+def test_nearest_node_and_snap_limit():
+    g, _ = _grid()
+    node, d = g.nearest_node(LAT0 + 2 * STEP + 0.0004, LNG0 + 5 * STEP - 0.0004)
+    assert node == 2 * 8 + 5 and d < 100
+    assert g.nearest_node(LAT0 + 1.0, LNG0)[0] == -1
+
+
+def test_router_matrix_and_route_time(tmp_path, monkeypatch):
+    g, _ = _grid()
+    g.save(str(tmp_path / "test.npz"))
+    monkeypatch.setenv("ROAD_GRAPH_PATH", str(tmp_path / "test.npz"))
+    monkeypatch.setenv("ROUTER_MODE", "LOCAL_GRAPH")
+    r = Router()
+    assert isinstance(r._engine, LocalGraphRouter)
+
+    pts = [(LAT0, LNG0), (LAT0 + 7 * STEP, LNG0 + 7 * STEP), (LAT0 + 3 * STEP, LNG0 + 1 * STEP)]
+    far = (LAT0 + 1.0, LNG0 + 1.0)  # off the graph: haversine fallback
+    m = r.matrix(pts, pts + [far])
+    for i, a in enumerate(pts):
+        for j, b in enumerate(pts):
+            if i != j:
+                assert m[i][j] == r.route_time_latlng(a, b)
+    assert m[0][1] == int(round(g.shortest_time(0, 63)))
+    assert m[0][3] > 3000
+
+    bm = r.batch_matrix(pts)
+    assert [bm[i][i] for i in range(3)] == [0, 0, 0]
+    path = r._engine.route_path_latlng(pts[0], pts[1])
+    assert path[0] == pts[0] and len(path) == 15
+
+
+def test_router_falls_back_without_graph(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROAD_GRAPH_PATH", str(tmp_path / "missing.npz"))
+    monkeypatch.setenv("ROUTER_MODE", "LOCAL_GRAPH")
+    r = Router()
+    assert r._engine is None
+    assert r.route_time_latlng((LAT0, LNG0), (LAT0 + 0.01, LNG0)) > 5
+
+
+def test_disconnected_target_does_not_sweep_the_graph():
+    n = 60
+    lat = [LAT0 + (i // n) * STEP for i in range(n * n)] + [LAT0 + 0.5]
+    lng = [LNG0 + (i % n) * STEP for i in range(n * n)] + [LNG0 + 0.5]
+    edges = [(u, u + 1, 30.0) for u in range(n * n) if (u + 1) % n]
+    edges += [(u, u + n, 30.0) for u in range(n * n - n)]
+    g = RoadGraph.from_edges(lat, lng, edges, bidirectional=True)
+    island = n * n
+    assert g.component[island] != g.component[0]
+
+    times = g.times_from(0, [1, island])
+    assert times == {0 + 1: 30.0}
+    assert g.last_settled < 10  # not the 3600-node component
+    assert g.shortest_time(0, island) == float("inf")
+
+    # A reachable but far target is cut off at max_s.
+    assert g.times_from(0, [n * n - 1], max_s=120.0) == {}
+    assert g.last_settled <= 15
+
+
+def test_router_matrix_falls_back_for_island_targets():
+    g, _ = _grid()
+    lat = np.append(g.lat, LAT0 + 0.2)
+    lng = np.append(g.lng, LNG0)
+    indptr = np.append(g.indptr, g.indptr[-1])
+    island = RoadGraph(lat, lng, indptr, g.indices, g.weights)
+    r = LocalGraphRouter(island)
+    m = r.matrix([(LAT0, LNG0)], [(LAT0 + 0.2, LNG0), (LAT0 + STEP, LNG0)])
+    assert island.last_settled < len(island)
+    assert m[0][0] > 1000 and m[0][1] == int(round(island.shortest_time(0, 8)))
+
+
+def test_search_budget_falls_back_to_haversine():
+    g, _ = _grid()
+    r = LocalGraphRouter(g, budget_s=1e-9, window_s=60)
+    pts = [(LAT0, LNG0), (LAT0 + 7 * STEP, LNG0 + 7 * STEP)]
+    m = r.matrix(pts, pts)
+    # The first search runs and spends the budget; the second source does not.
+    assert m[0][1] == int(round(g.shortest_time(0, 63)))
+    assert m[1][0] == r._fallback(pts[1], pts[0])
+    assert r.cache_stats()["budget_skips"] == 1
+    assert r.route_time_latlng(pts[1], pts[0]) == r._fallback(pts[1], pts[0])
+
+    unlimited = LocalGraphRouter(g, budget_s=0)
+    assert unlimited.matrix(pts, pts)[1][0] == int(round(g.shortest_time(63, 0)))
+
+
+def test_fast_path_router_skips_local_graph(tmp_path, monkeypatch):
+    g, _ = _grid()
+    g.save(str(tmp_path / "test.npz"))
+    monkeypatch.setenv("ROAD_GRAPH_PATH", str(tmp_path / "test.npz"))
+    monkeypatch.setenv("ROUTER_MODE", "LOCAL_GRAPH")
+    assert Router().engine == "LOCAL_GRAPH"
+    fast = Router(local_graph=False)
+    assert fast._engine is None and fast.engine == "HAVERSINE"
+    assert Router(search_budget=False)._engine.budget.budget_s == 0
@@ -0,0 +1,86 @@
+"""Shared time-matrix cache keyed by location id."""
+import numpy as np
+
+from packages.router.matrix_service import TimeMatrixService
+from packages.router.router import haversine_time_matrix
+
+TS = 1_700_000_000.0
+LOCS = [
+    ("store:s1", 32.78, -96.80),
+    ("store:s2", 32.90, -97.05),
+    ("drop:o1", 32.80, -96.75),
+    ("cell:32750:-96900", 32.75, -96.90),
+]
+
+
+class CountingFill:
+    def __init__(self):
+        self.cells = 0
+
+    def __call__(self, src, dst):
+        self.cells += len(src) * len(dst)
+        return haversine_time_matrix(src, dst, ts=TS).tolist()
+
+
+def _expected(locs):
+    pts = [(lat, lng) for _, lat, lng in locs]
+    m = haversine_time_matrix(pts, pts, ts=TS)
+    same = np.array([[a[0] == b[0] for b in locs] for a in locs])
+    m[same] = 0
+    return m
+
+
+def test_matrix_matches_direct_computation_with_repeated_ids():
+    svc = TimeMatrixService()
+    locs = LOCS + [LOCS[0]]  # two orders from the same store
+    m = svc.matrix(locs, ts=TS)
+    assert m.shape == (5, 5) and m.dtype == np.int64
+    assert np.array_equal(m, _expected(locs))
+    assert m[0, 4] == 0 and m[4, 1] == m[0, 1]
+
+
+def test_only_unknown_rows_are_computed_on_later_calls():
+    fill = CountingFill()
+    svc = TimeMatrixService(fill=fill)
+    svc.matrix(LOCS[:3], ts=TS)
+    assert fill.cells == 9
+    svc.matrix(LOCS[:3], ts=TS)
+    assert fill.cells == 9 and svc.stats()["pair_hits"] == 9
+    m = svc.matrix(LOCS, ts=TS)  # one new location: its row and column
+    assert fill.cells == 9 + 4 + 3
+    assert np.array_equal(m, _expected(LOCS))
+
+
+def test_legs_between_locations_seen_in_different_calls():
+    svc = TimeMatrixService()
+    a, b, c = LOCS[:3]
+    svc.matrix([a, b], ts=TS)
+    svc.matrix([a, c], ts=TS)
+    assert np.array_equal(svc.matrix([b, c], ts=TS), _expected([b, c]))
+
+
+def test_moved_location_and_new_hour_are_recomputed():
+    fill = CountingFill()
+    svc = TimeMatrixService(fill=fill)
+    svc.matrix(LOCS, ts=TS)
+    moved = [LOCS[0], LOCS[1], LOCS[2], (LOCS[3][0], 32.70, -96.95)]
+    before = fill.cells
+    m = svc.matrix(moved, ts=TS)
+    assert fill.cells > before
+    assert np.array_equal(m, _expected(moved))
+
+    before = fill.cells
+    svc.matrix(moved, ts=TS + 3600)  # next hour-of-week bucket
+    assert fill.cells - before == 16
+
+
+def test_eviction_keeps_results_correct():
+    rng = np.random.default_rng(0)
+    svc = TimeMatrixService(max_locations=8)
+    for step in range(5):
+        locs = [(f"p{k}", 32.7 + 0.01 * k, -96.8 + 0.005 * k) for k in rng.choice(20, size=6, replace=False)]
+        assert np.array_equal(svc.matrix(locs, ts=TS), _expected(locs))
+        assert svc.stats()["locations"] <= 8
+    # More distinct places than the cache holds: computed directly.
+    big = [(f"q{k}", 32.7 + 0.01 * k, -96.8) for k in range(12)]
+    assert np.array_equal(svc.matrix(big, ts=TS), _expected(big))
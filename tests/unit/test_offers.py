@@ -0,0 +1,154 @@
+"""Unit tests for the bulk offer commit path and expiry sweeper (in-memory SQLite)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from packages.common.crypto import sha256_hex, stable_json
+from packages.db.base import Base
+from packages.db.models import Customer, CustomerAddress, DeliveryTask, Merchant, OfferLog, Order, OrderEvent, Store
+from packages.dispatch.expire import expire_offers
+from packages.dispatch.offers import create_offers_bulk
+from packages.dossier.writer import emit_order_event, last_event_hashes
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _seed(db, n_orders):
+    db.add(Merchant(id="m1", legal_name="M"))
+    db.add(Store(id="s1", merchant_id="m1", address="1 Main", lat="30.27", lng="-97.74"))
+    db.add(Customer(id="c1"))
+    db.add(CustomerAddress(id="a1", customer_id="c1", address="9 Elm", lat="30.30", lng="-97.70"))
+    for i in range(n_orders):
+        db.add(Order(id=f"o{i}", customer_id="c1", store_id="s1", address_id="a1",
+                     status="PAYMENT_AUTHORIZED", disclosure_version="v1"))
+    db.commit()
+
+
+def _snapshot():
+    return {"ts_ms": 1, "region_id": "tx-dfw", "params": {}}
+
+
+def test_bulk_offers_write_tasks_logs_and_chained_events(db):
+    _seed(db, 3)
+    head = emit_order_event(db, order_id="o1", actor_type="system", actor_id="oms",
+                            event_type="PAYMENT_AUTHORIZED", payload={})
+    offers = [
+        {"order_id": f"o{i}", "driver_id": f"d{i}", "edge_debug": {"eta_pu_s": 60 * (i + 1)}}
+        for i in range(3)
+    ]
+    created = create_offers_bulk(db, snapshot=_snapshot(), offers=offers, offer_ttl_s=30)
+    db.commit()
+
+    assert [(c["order_id"], c["driver_id"]) for c in created] == [("o0", "d0"), ("o1", "d1"), ("o2", "d2")]
+    tasks = {t.id: t for t in db.query(DeliveryTask).all()}
+    assert set(tasks) == {c["task_id"] for c in created}
+    assert all(t.status == "OFFERED" and t.offer_expires_at is not None for t in tasks.values())
+    logs = {log.task_id: log for log in db.query(OfferLog).all()}
+    assert logs[created[2]["task_id"]].features_json["edge_debug"] == {"eta_pu_s": 180}
+
+    events = {e.order_id: e for e in db.query(OrderEvent).filter(OrderEvent.event_type == "TASK_OFFERED")}
+    assert events["o0"].hash_prev is None
+    assert events["o1"].hash_prev == head.hash_self  # chained onto the existing head
+    e = events["o2"]
+    expected = sha256_hex(stable_json({
+        "order_id": e.order_id, "actor_type": e.actor_type, "actor_id": e.actor_id,
+        "event_type": e.event_type, "payload": e.payload, "hash_prev": e.hash_prev, "id": e.id,
+    }))
+    assert e.hash_self == expected
+    assert e.payload["task_id"] == created[2]["task_id"]
+
+
+def test_bulk_offers_use_fixed_number_of_statements(db):
+    _seed(db, 40)
+    offers = [{"order_id": f"o{i}", "driver_id": f"d{i}"} for i in range(40)]
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", _count)
+    try:
+        create_offers_bulk(db, snapshot=_snapshot(), offers=offers, offer_ttl_s=30)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", _count)
+    # Chain-head prefetch + one INSERT per table.
+    assert len(statements) == 4
+    db.commit()
+    assert db.query(OrderEvent).count() == 40
+
+
+def test_last_event_hashes_returns_latest_per_order(db):
+    _seed(db, 2)
+    emit_order_event(db, order_id="o0", actor_type="system", actor_id="oms", event_type="A", payload={})
+    db.commit()
+    latest = emit_order_event(db, order_id="o0", actor_type="system", actor_id="oms", event_type="B", payload={})
+    latest.ts = latest.ts.replace(year=latest.ts.year + 1)  # strictly newer than the first
+    db.commit()
+    assert last_event_hashes(db, ["o0", "o1"]) == {"o0": latest.hash_self}
+
+
+# ── Expiry sweeper ───────────────────────────────────────────────────
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+NOW_MS = int(NOW.timestamp() * 1000)
+
+
+def _seed_offers(db, n_expired, n_live=2):
+    _seed(db, n_expired + n_live)
+    for i in range(n_expired + n_live):
+        expires = NOW - timedelta(seconds=5) if i < n_expired else NOW + timedelta(seconds=30)
+        db.add(DeliveryTask(id=f"t{i}", order_id=f"o{i}", status="OFFERED", offered_to_driver_id=f"d{i}",
+                            offer_expires_at=expires, route_json={}))
+        db.add(OfferLog(id=f"l{i}", task_id=f"t{i}", order_id=f"o{i}", driver_id=f"d{i}",
+                        created_at=NOW - timedelta(seconds=35), features_json={}))
+    db.add(OfferLog(id="l_answered", task_id="t0", order_id="o0", driver_id="d0",
+                    created_at=NOW - timedelta(seconds=40), features_json={}, outcome="REJECTED"))
+    db.commit()
+
+
+def test_expire_offers_pages_through_backlog(db):
+    _seed_offers(db, n_expired=5)
+    out = expire_offers(db, now_ms=NOW_MS, limit=2)
+    db.commit()
+    assert out == {"expired_tasks": 5, "updated_offer_logs": 5, "pages": 3}
+
+    status = dict(db.query(DeliveryTask.id, DeliveryTask.status))
+    assert [status[f"t{i}"] for i in range(7)] == ["EXPIRED"] * 5 + ["OFFERED"] * 2
+    logs = {log.id: log for log in db.query(OfferLog)}
+    assert logs["l0"].outcome == "TIMEOUT" and logs["l0"].outcome_ms == NOW_MS
+    assert logs["l0"].response_latency_ms == pytest.approx(35_000, abs=1)
+    assert logs["l_answered"].outcome == "REJECTED"  # answered offers keep their outcome
+    assert logs["l6"].outcome is None
+
+    events = db.query(OrderEvent).filter(OrderEvent.event_type == "TASK_EXPIRED").all()
+    assert sorted(e.payload["task_id"] for e in events) == [f"t{i}" for i in range(5)]
+    assert expire_offers(db, now_ms=NOW_MS, limit=2)["expired_tasks"] == 0
+
+
+def test_expire_offers_uses_fixed_statements_per_page(db):
+    _seed_offers(db, n_expired=30)
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", _count)
+    try:
+        out = expire_offers(db, now_ms=NOW_MS, limit=500)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", _count)
+    assert out["expired_tasks"] == 30 and out["pages"] == 1
+    # Task UPDATE, offer-log UPDATE, event chain-head prefetch, event INSERT.
+    assert len(statements) == 4
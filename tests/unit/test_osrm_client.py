@@ -0,0 +1,178 @@
+"""OSRM clients against a local stub OSRM server (pooling, concurrency, coalescing)."""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from packages.router.osrm import OSRMRouter
+from packages.router.osrm_async import AsyncOSRMRouter
+
+
+class _StubOSRM(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay_s=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay_s = delay_s
+        self.lock = threading.Lock()
+        self.paths = []
+        self.client_ports = set()
+        self.active = 0
+        self.max_active = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.paths.append(self.path)
+            srv.client_ports.add(self.client_address[1])
+            srv.active += 1
+            srv.max_active = max(srv.max_active, srv.active)
+        try:
+            time.sleep(srv.delay_s)
+            parsed = urlparse(self.path)
+            if parsed.path.startswith("/route/"):
+                body = {"code": "Ok", "routes": [{"duration": 100 + len(parsed.path) % 7, "geometry": "abc"}]}
+            else:
+                qs = parse_qs(parsed.query)
+                src = qs["sources"][0].split(";")
+                dst = qs["destinations"][0].split(";")
+                body = {"code": "Ok", "durations": [[200.0 + int(s) * 10 + int(d) for d in dst] for s in src]}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with srv.lock:
+                srv.active -= 1
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(delay_s=0.0):
+        srv = _StubOSRM(delay_s=delay_s)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return srv
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+A, B = (30.27, -97.74), (30.30, -97.70)
+
+
+def test_sync_reuses_connections(stub):
+    srv = stub()
+    r = OSRMRouter(base_url=srv.url)
+    for i in range(5):
+        assert r.route_time_latlng(A, (30.30 + i / 100, -97.70)) > 0
+    assert len(srv.paths) == 5
+    assert len(srv.client_ports) == 1
+    r.close()
+
+
+def test_sync_coalesces_identical_requests(stub):
+    srv = stub(delay_s=0.2)
+    r = OSRMRouter(base_url=srv.url)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: r.route_time_latlng(A, B), range(8)))
+    assert len(set(results)) == 1
+    assert len(srv.paths) == 1
+    assert r.requests_sent == 1 and r.coalesced == 7
+    r.close()
+
+
+def test_sync_bounds_concurrency(stub):
+    srv = stub(delay_s=0.05)
+    r = OSRMRouter(base_url=srv.url, max_concurrency=2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: r.route_time_latlng(A, (30.30 + i / 100, -97.70)), range(8)))
+    assert len(srv.paths) == 8
+    assert srv.max_active <= 2
+    r.close()
+
+
+def test_sync_matrix_chunks_run_against_stub(stub, monkeypatch):
+    from packages.router import osrm
+    monkeypatch.setattr(osrm, "MAX_TABLE_POINTS", 4)
+    srv = stub()
+    r = OSRMRouter(base_url=srv.url)
+    sources = [(30.2 + i / 100, -97.7) for i in range(3)]
+    destinations = [(30.4 + j / 100, -97.6) for j in range(5)]
+    m = r.matrix(sources, destinations)
+    assert len(m) == 3 and all(len(row) == 5 for row in m)
+    assert all(v >= 200 for row in m for v in row)
+    assert all("/table/" in p for p in srv.paths) and len(srv.paths) > 1
+    # Fully cached: no requests and no thread pool.
+    sent = len(srv.paths)
+    r._executor.shutdown()
+    r._executor = None
+    assert r.matrix(sources, destinations) == m
+    assert len(srv.paths) == sent and r._executor is None
+    r.close()
+
+
+async def test_async_coalesces_and_bounds_concurrency(stub):
+    srv = stub(delay_s=0.1)
+    async with AsyncOSRMRouter(base_url=srv.url, max_concurrency=2) as r:
+        same = await asyncio.gather(*(r.route_time_latlng(A, B) for _ in range(10)))
+        assert len(set(same)) == 1
+        assert len(srv.paths) == 1 and r.coalesced == 9
+
+        await asyncio.gather(*(r.route_time_latlng(A, (30.30 + i / 100, -97.70)) for i in range(1, 7)))
+        assert len(srv.paths) == 7
+        assert srv.max_active <= 2
+        assert len(srv.client_ports) <= 2
+
+
+async def test_async_matrix_and_fallback(stub):
+    srv = stub()
+    async with AsyncOSRMRouter(base_url=srv.url) as r:
+        m = await r.matrix([A], [B, (30.35, -97.65)])
+        assert m == [[201, 202]]
+        assert await r.route_time_latlng(A, B) == 201  # cell cached by the matrix
+        assert len(srv.paths) == 1
+
+    async with AsyncOSRMRouter(base_url="http://127.0.0.1:9") as r:
+        t = await r.route_time_latlng(A, B)
+        assert t == OSRMRouter._haversine_fallback(A, B)
+
+
+async def test_tracking_routes_legs_the_store_tables_miss(stub, monkeypatch):
+    from apps.api.routers import orders
+    srv = stub()
+    r = AsyncOSRMRouter(base_url=srv.url)
+    monkeypatch.setattr(orders, "shared_async_osrm", lambda: r)
+    view = {
+        "store": {"lat": A[0], "lng": A[1]},
+        "driver": {"lat": 30.25, "lng": -97.75},
+        "delivery": {"lat": B[0], "lng": B[1]},
+        "eta": {"driver_to_store_s": 90, "store_to_drop_s": None},
+    }
+    await orders._fill_road_etas(view)
+    assert view["eta"]["driver_to_store_s"] == 90
+    assert view["eta"]["store_to_drop_s"] >= 100
+    assert len(srv.paths) == 1 and srv.paths[0].startswith("/route/v1/car/-97.74,30.27;")
+    await r.aclose()
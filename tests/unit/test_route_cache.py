@@ -0,0 +1,51 @@
+"""Two-tier route-time cache (L1 LRU over a shared L2)."""
+from packages.router.route_cache import RouteTimeCache, SQLiteL2
+
+
+A, B, C = (30.27001, -97.74001), (30.30, -97.70), (30.35, -97.65)
+
+
+class _FailingL2:
+    calls = 0
+
+    def get_many(self, keys):
+        self.calls += 1
+        raise ConnectionError("down")
+
+    def set_many(self, items, ttl_s):
+        self.calls += 1
+        raise ConnectionError("down")
+
+
+def test_l2_shared_between_processes(tmp_path):
+    path = str(tmp_path / "routes.db")
+    worker_a = RouteTimeCache(namespace="t", l2=SQLiteL2(path))
+    worker_b = RouteTimeCache(namespace="t", l2=SQLiteL2(path))
+
+    worker_a.set_many({(A, B): 321, (A, C): 654})
+    assert worker_b.get_many([(A, B), (A, C), (B, C)]) == {(A, B): 321, (A, C): 654}
+    s = worker_b.stats()
+    assert (s["l1_hits"], s["l2_hits"], s["misses"]) == (0, 2, 1)
+
+    # Promoted to L1: the second read does not touch L2.
+    assert worker_b.get(A, B) == 321
+    s = worker_b.stats()
+    assert s["l1_hits"] == 1 and s["l2_calls"] == 1
+    assert s["l2_avg_ms"] >= 0
+
+
+def test_keys_are_quantized_and_time_bucketed():
+    c = RouteTimeCache(namespace="t", precision=3, tod_bucket_min=60, tz="UTC")
+    assert c.key(A, B, bucket=0) == c.key((30.2704, -97.7396), B, bucket=0)
+    assert c.key(A, B, bucket=0) != c.key(A, B, bucket=1)
+    assert c.tod_bucket(0) == 0 and c.tod_bucket(3 * 3600 + 59) == 3
+
+
+def test_l2_errors_back_off():
+    l2 = _FailingL2()
+    c = RouteTimeCache(namespace="t", l2=l2, l2_cooldown_s=60)
+    c.set(A, B, 100)            # L2 write fails, L1 still written
+    assert c.get(A, B) == 100
+    assert c.get(A, C) is None  # cooldown: L2 not retried
+    assert l2.calls == 1
+    assert c.stats()["l2_errors"] == 1
@@ -51,3 +51,59 @@ def test_router_batch_matrix():
     # Off-diagonal should be positive
     assert matrix[0][1] > 0
     assert matrix[1][0] > 0
+
+
+def test_router_matrix_is_asymmetric_and_matches_route_times():
+    r = Router()
+    sources = [(30.27, -97.74), (30.30, -97.70)]
+    destinations = [(30.35, -97.65), (30.20, -97.80), (30.27, -97.74)]
+    m = r.matrix(sources, destinations)
+    assert len(m) == 2 and all(len(row) == 3 for row in m)
+    for i, a in enumerate(sources):
+        for j, b in enumerate(destinations):
+            assert abs(m[i][j] - r.route_time_latlng(a, b)) <= 1
+    assert r.matrix([], destinations) == []
+
+
+def test_osrm_matrix_requests_only_missing_cells(monkeypatch):
+    from packages.router import osrm
+    from packages.router.osrm import OSRMRouter
+
+    calls = []
+
+    def fake_table(self, sources, destinations):
+        calls.append((len(sources), len(destinations)))
+        return [[100 + i * 10 + j for j in range(len(destinations))] for i in range(len(sources))]
+
+    monkeypatch.setattr(OSRMRouter, "_table", fake_table)
+    monkeypatch.setattr(osrm, "MAX_TABLE_POINTS", 4)
+    r = OSRMRouter()
+    sources = [(30.27, -97.74), (30.30, -97.70), (30.31, -97.71)]
+    destinations = [(30.35, -97.65), (30.20, -97.80)]
+
+    first = r.matrix(sources, destinations)
+    assert all(s + d <= 4 for s, d in calls)
+    assert all(v >= 100 for row in first for v in row)
+
+    calls.clear()
+    again = r.matrix(sources, destinations)
+    assert again == first and calls == []
+    assert r.route_time_latlng(sources[0], destinations[1]) == first[0][1]
+
+    # One new source: only its row is requested.
+    calls.clear()
+    r.matrix(sources + [(30.40, -97.60)], destinations)
+    assert calls == [(1, 2)]
+
+
+def test_osrm_matrix_falls_back_for_failed_cells(monkeypatch):
+    from packages.router.osrm import OSRMRouter
+    from packages.router.router import haversine_time_matrix
+
+    monkeypatch.setattr(OSRMRouter, "_table", lambda self, s, d: None)
+    r = OSRMRouter()
+    sources = [(30.27, -97.74)]
+    destinations = [(30.35, -97.65), (30.20, -97.80)]
+    m = r.matrix(sources, destinations)
+    assert m == haversine_time_matrix(sources, destinations).tolist()
+    assert r.times.get(sources[0], destinations[0]) is None
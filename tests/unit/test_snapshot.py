@@ -0,0 +1,191 @@
+"""Unit tests for the set-based dispatch snapshot builder (in-memory SQLite)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from packages.db.base import Base
+from packages.db.models import Customer, CustomerAddress, DeliveryTask, Driver, Merchant, Order, Store
+from packages.dispatch.snapshot import build_dispatch_snapshot
+from packages.dispatch.snapshot_store import SnapshotStore
+from packages.geo.h3_index import DriverH3Index
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _seed(db, n_orders=3):
+    db.add(Merchant(id="m1", legal_name="M"))
+    db.add(Store(id="s1", merchant_id="m1", address="1 Main", lat="30.27", lng="-97.74"))
+    db.add(Store(id="s_nogeo", merchant_id="m1", address="2 Main"))
+    db.add(Customer(id="c1"))
+    db.add(CustomerAddress(id="a1", customer_id="c1", address="9 Elm", lat="30.30", lng="-97.70"))
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(n_orders):
+        db.add(Order(id=f"o{i}", customer_id="c1", store_id="s1", address_id="a1",
+                     status="PAYMENT_AUTHORIZED", disclosure_version="v1", total_cents=4000, created_at=created))
+    db.add(Order(id="o_nogeo", customer_id="c1", store_id="s_nogeo", address_id="a1",
+                 status="PAYMENT_AUTHORIZED", disclosure_version="v1"))
+    db.add(Order(id="o_done", customer_id="c1", store_id="s1", address_id="a1",
+                 status="DELIVERED", disclosure_version="v1"))
+    db.add(Driver(id="d_idle", status="IDLE", lat="30.28", lng="-97.73", zone_id="z1",
+                  insurance_verified=True, registration_verified=True))
+    db.add(Driver(id="d_zone2", status="IDLE", lat="30.28", lng="-97.73", zone_id="z2"))
+    db.add(Driver(id="d_off", status="OFFLINE", lat="30.28", lng="-97.73"))
+    db.add(Driver(id="d_nogeo", status="IDLE"))
+    db.add(DeliveryTask(id="t1", order_id="o0", status="OFFERED", offered_to_driver_id="d_idle"))
+    db.add(DeliveryTask(id="t2", order_id="o1", status="COMPLETED"))
+    db.commit()
+
+
+def test_snapshot_jobs_joined_and_filtered(db):
+    _seed(db)
+    snap = build_dispatch_snapshot(db, region_id="tx-dfw", now_ms=1)
+    job_ids = sorted(j["order_id"] for j in snap["jobs"])
+    assert job_ids == ["o0", "o1", "o2"]
+    j = snap["jobs"][0]
+    assert j["pickup_lat"] == pytest.approx(30.27)
+    assert j["drop_lng"] == pytest.approx(-97.70)
+    assert j["pricing"]["payout_cents_est"] == 1000
+    assert j["ready_at_ms"] - j["created_ms"] == 5 * 60 * 1000
+
+
+def test_snapshot_drivers_filtered_in_sql(db):
+    _seed(db)
+    snap = build_dispatch_snapshot(db, region_id="tx-dfw", now_ms=1)
+    assert sorted(d["driver_id"] for d in snap["drivers"]) == ["d_idle", "d_zone2"]
+    zoned = build_dispatch_snapshot(db, region_id="tx-dfw", now_ms=1, zone_ids=["z1"])
+    assert [d["driver_id"] for d in zoned["drivers"]] == ["d_idle"]
+    assert zoned["drivers"][0]["eligibility"]["insurance_verified"] is True
+
+
+def test_snapshot_tasks_and_stats(db):
+    _seed(db)
+    snap = build_dispatch_snapshot(db, region_id="tx-dfw", now_ms=1)
+    assert [t["task_id"] for t in snap["tasks"]] == ["t1"]
+    stats = snap["stats"]
+    assert stats["rows"] == {"drivers": 2, "tasks": 1, "orders": 3, "jobs": 3}
+    assert set(stats["timings_ms"]) == {"drivers", "tasks", "jobs", "total"}
+
+
+def test_snapshot_single_query_per_entity(db):
+    _seed(db, n_orders=25)
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", _count)
+    try:
+        build_dispatch_snapshot(db, region_id="tx-dfw", now_ms=1)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", _count)
+    assert len(statements) == 3
+
+
+# ── Incremental SnapshotStore ────────────────────────────────────────
+
+def _touch(db, obj, ts, **fields):
+    for k, v in fields.items():
+        setattr(obj, k, v)
+    obj.updated_at = ts
+    db.commit()
+
+
+def test_store_seed_matches_full_build(db):
+    _seed(db)
+    store = SnapshotStore(region_id="tx-dfw", overlap_s=0, driver_index=DriverH3Index())
+    snap = store.refresh(db, now_ms=1)
+    full = build_dispatch_snapshot(db, region_id="tx-dfw", now_ms=1)
+    assert snap["stats"]["mode"] == "full"
+    assert sorted(d["driver_id"] for d in snap["drivers"]) == sorted(d["driver_id"] for d in full["drivers"])
+    assert sorted(j["job_id"] for j in snap["jobs"]) == sorted(j["job_id"] for j in full["jobs"])
+
+
+def test_store_applies_deltas(db):
+    _seed(db)
+    store = SnapshotStore(region_id="tx-dfw", overlap_s=0, driver_index=DriverH3Index())
+    store.refresh(db, now_ms=1)
+    later = datetime.now() + timedelta(hours=1)
+
+    _touch(db, db.get(Driver, "d_off"), later, status="IDLE")
+    _touch(db, db.get(Driver, "d_idle"), later, lat="30.50")
+    _touch(db, db.get(Driver, "d_zone2"), later, status="OFFLINE")
+    _touch(db, db.get(Order, "o2"), later, status="DELIVERED")
+    db.add(Order(id="o_new", customer_id="c1", store_id="s1", address_id="a1",
+                 status="CREATED", disclosure_version="v1", updated_at=later))
+    db.add(DeliveryTask(id="t3", order_id="o1", status="OFFERED", updated_at=later))
+    _touch(db, db.get(DeliveryTask, "t1"), later, status="EXPIRED")
+
+    snap = store.refresh(db, now_ms=2)
+    assert snap["stats"]["mode"] == "delta"
+    drivers = {d["driver_id"]: d for d in snap["drivers"]}
+    assert sorted(drivers) == ["d_idle", "d_off"]
+    assert drivers["d_idle"]["lat"] == pytest.approx(30.50)
+    assert sorted(j["order_id"] for j in snap["jobs"]) == ["o0", "o1", "o_new"]
+    assert [t["task_id"] for t in snap["tasks"]] == ["t3"]
+    assert snap["driver_index"] is store.driver_index
+    if store.driver_index.available:
+        # Only d_idle is verified; the moved position is what the index returns.
+        assert [d["driver_id"] for d in store.driver_index.query_ring(30.50, -97.73, 0)] == ["d_idle"]
+
+    # Nothing changed since: the delta reads no rows.
+    snap = store.refresh(db, now_ms=3)
+    assert snap["stats"]["rows"]["drivers_changed"] == 0
+    assert snap["stats"]["rows"]["orders_changed"] == 0
+
+
+def test_store_reconciles_periodically(db):
+    _seed(db)
+    store = SnapshotStore(region_id="tx-dfw", reconcile_s=0, driver_index=DriverH3Index())
+    store.refresh(db, now_ms=1)
+    assert store.refresh(db, now_ms=2)["stats"]["mode"] == "full"
+    store.reconcile_s = 3600
+    assert store.refresh(db, now_ms=3)["stats"]["mode"] == "delta"
+    store.invalidate()
+    assert store.refresh(db, now_ms=4)["stats"]["mode"] == "full"
+
+
+def test_internal_tick_serializes_same_region(monkeypatch):
+    import threading
+    import time
+
+    from apps.api.routers import internal_dispatch
+
+    monkeypatch.delenv("INTERNAL_API_TOKEN", raising=False)
+    monkeypatch.setattr(internal_dispatch, "_snapshots", {})
+    active, peak = [0], [0]
+    guard = threading.Lock()
+
+    def fake_refresh(self, db):
+        with guard:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with guard:
+            active[0] -= 1
+        return {"drivers": [], "jobs": [], "tasks": []}
+
+    monkeypatch.setattr(SnapshotStore, "refresh", fake_refresh)
+    monkeypatch.setattr(internal_dispatch, "run_fast_tick", lambda snap: {})
+    threads = [
+        threading.Thread(target=internal_dispatch.dispatch_tick, kwargs={"region_id": "tx-dfw", "db": None,
+                                                                         "x_internal_token": None})
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 1
+    assert len(internal_dispatch._snapshots) == 1
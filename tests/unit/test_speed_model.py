@@ -0,0 +1,74 @@
+"""Zone x hour-of-week speed profiles."""
+import os
+
+os.environ["ROUTER_MODE"] = "HAVERSINE"
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from packages.router import speed_model as sm
+from packages.router.router import Router, _haversine_m
+
+DALLAS = (32.78, -96.78)
+FT_WORTH = (32.75, -97.33)
+
+
+def _samples(rng, origin, hours, speed, n):
+    lat = origin[0] + rng.uniform(-0.01, 0.01, n)
+    lng = origin[1] + rng.uniform(-0.01, 0.01, n)
+    dist = rng.uniform(1000, 8000, n)
+    return lat, lng, np.full(n, hours), dist, dist / speed
+
+
+def _model():
+    rng = np.random.default_rng(0)
+    parts = [
+        _samples(rng, DALLAS, 8, 6.0, 20),    # Monday 8am rush
+        _samples(rng, DALLAS, 3, 15.0, 20),   # Monday 3am
+        _samples(rng, FT_WORTH, 3, 12.0, 5),  # too few for its own zone
+    ]
+    cols = [np.concatenate(c) for c in zip(*parts)]
+    return sm.build_speed_model(*cols, min_samples=8)
+
+
+def test_default_model_matches_legacy_constants():
+    m = sm.SpeedModel()
+    legacy = (35.0 * 1609.34) / 3600.0 / 1.25
+    assert abs(m.speed_mps(*DALLAS) - legacy) < 1e-5
+    assert m.speeds.shape == (1, 168)
+
+
+def test_profiles_by_zone_and_hour():
+    m = _model()
+    assert len(m.keys) == 1
+    monday_8 = datetime(2024, 3, 4, 8, 30, tzinfo=ZoneInfo("America/Chicago")).timestamp()
+    monday_3 = datetime(2024, 3, 4, 3, 30, tzinfo=ZoneInfo("America/Chicago")).timestamp()
+    assert m.hour_of_week(monday_8) == 8
+    assert abs(m.speed_mps(*DALLAS, ts=monday_8) - 6.0) < 1e-4
+    assert abs(m.speed_mps(*DALLAS, ts=monday_3) - 15.0) < 1e-4
+    # Unseen zone uses the global profile; unseen hour falls back to the
+    # global median over all samples.
+    assert abs(m.speed_mps(*FT_WORTH, ts=monday_3) - 15.0) < 1e-4
+    tuesday_noon = monday_8 + 24 * 3600 + 4 * 3600
+    glob = float(m.speeds[-1, 0])
+    assert abs(m.speed_mps(*FT_WORTH, ts=tuesday_noon) - glob) < 1e-4
+    vec = m.speeds_mps([DALLAS[0], FT_WORTH[0]], [DALLAS[1], FT_WORTH[1]], monday_8)
+    assert vec[0] == m.speed_mps(*DALLAS, ts=monday_8)
+
+
+def test_save_load_and_shared_reload(tmp_path, monkeypatch):
+    path = str(tmp_path / "speed.npz")
+    m = _model()
+    m.save(path)
+    loaded = sm.SpeedModel.load(path)
+    assert np.array_equal(loaded.keys, m.keys)
+    assert np.array_equal(loaded.speeds, m.speeds)
+
+    monkeypatch.setattr(sm, "_shared", sm._SharedModel(path, check_s=0))
+    a, b = DALLAS, (DALLAS[0] + 0.05, DALLAS[1])
+    speed = sm.speed_model().speed_mps(*a)
+    r = Router()
+    assert r.route_time_latlng(a, b) == int(_haversine_m(*a, *b) / speed)
+    assert r.matrix([a], [b])[0][0] == r.route_time_latlng(a, b)
@@ -0,0 +1,121 @@
+"""Precomputed store travel-time tables (memory-mapped)."""
+import os
+
+os.environ["ROUTER_MODE"] = "HAVERSINE"
+
+import numpy as np
+
+from packages.router.router import Router
+from packages.router.store_tables import StoreTravelTimes, write_store_tables
+
+STORES = [
+    {"id": "s1", "lat": 32.78, "lng": -96.80},
+    {"id": "s2", "lat": 32.90, "lng": -97.05},
+]
+
+
+def _tables(tmp_path, **kw):
+    info = write_store_tables(STORES, directory=str(tmp_path), radius_m=5000, cell_m=250, **kw)
+    return info, StoreTravelTimes(str(tmp_path), check_s=0)
+
+
+def test_lookup_matches_router_within_a_cell(tmp_path):
+    info, tables = _tables(tmp_path)
+    assert info["stores"] == 2 and info["side"] == 41
+    r = Router()
+    rng = np.random.default_rng(0)
+    for s in STORES:
+        for _ in range(20):
+            lat = s["lat"] + rng.uniform(-0.04, 0.04)
+            lng = s["lng"] + rng.uniform(-0.04, 0.04)
+            t = tables.lookup(s["id"], s["lat"], s["lng"], lat, lng)
+            exact = r.route_time_latlng((s["lat"], s["lng"]), (lat, lng))
+            assert t is not None
+            # Grid cell is 250 m: at most ~half a diagonal of error at 35 mph * 1.25.
+            assert abs(t - exact) <= 15
+
+
+def test_lookup_misses_outside_grid_unknown_or_moved_store(tmp_path):
+    _, tables = _tables(tmp_path)
+    s = STORES[0]
+    out = tables.lookup_many(
+        ["s1", "nope", "s1", "s1"],
+        [s["lat"], s["lat"], s["lat"] + 0.01, s["lat"]],
+        [s["lng"], s["lng"], s["lng"], s["lng"]],
+        [s["lat"] + 0.5, s["lat"], s["lat"], s["lat"] + 0.001],
+        [s["lng"], s["lng"], s["lng"], s["lng"]],
+    )
+    assert out[:3].tolist() == [-1, -1, -1]
+    assert out[3] > 0
+
+
+def test_reader_picks_up_new_version(tmp_path):
+    _, tables = _tables(tmp_path)
+    assert tables.loaded
+    v1 = tables.version
+    write_store_tables(STORES[:1], directory=str(tmp_path), radius_m=5000, cell_m=250,
+                       matrix_fn=lambda src, dst: [[7] * len(dst)])
+    assert tables.lookup("s1", 32.78, -96.80, 32.781, -96.80) == 7
+    assert tables.version != v1
+    assert tables.lookup("s2", 32.90, -97.05, 32.90, -97.05) is None
+
+
+def test_refine_edges_uses_store_tables(tmp_path, monkeypatch):
+    from packages.dispatch import eta
+
+    _, tables = _tables(tmp_path)
+    calls = []
+
+    class _NoRouter:
+        mode = "HAVERSINE"
+
+        def matrix(self, sources, destinations):
+            calls.append((len(sources), len(destinations)))
+            return [[1] * len(destinations) for _ in sources]
+
+    monkeypatch.setattr(eta, "_store_tables", tables)
+    monkeypatch.setattr(eta, "_router", _NoRouter())
+    snap = {
+        "drivers": [{"driver_id": "d1", "lat": 32.79, "lng": -96.81}],
+        "jobs": [
+            {"job_id": "j1", "store_id": "s1", "pickup_lat": 32.78, "pickup_lng": -96.80,
+             "drop_lat": 32.76, "drop_lng": -96.79},
+            {"job_id": "j2", "store_id": "s1", "pickup_lat": 32.78, "pickup_lng": -96.80,
+             "drop_lat": 33.50, "drop_lng": -96.79},  # outside the grid
+        ],
+    }
+    edges = [{"driver_id": "d1", "job_id": "j1"}, {"driver_id": "d1", "job_id": "j2"}]
+    out = eta.refine_edges_with_router(snap, edges)
+    assert calls == [(1, 1)]  # only j2's drop leg needed the router
+    assert out[0]["eta_pu_s"] == tables.lookup("s1", 32.78, -96.80, 32.79, -96.81)
+    assert out[0]["eta_drop_s"] == tables.lookup("s1", 32.78, -96.80, 32.76, -96.79)
+    assert out[1]["eta_drop_s"] == 1
+
+
+def test_haversine_tables_only_serve_their_hour_bucket(tmp_path, monkeypatch):
+    from packages.router import store_tables
+
+    info, tables = _tables(tmp_path)
+    assert info["engine"] == "HAVERSINE"
+    s = STORES[0]
+    assert tables.lookup(s["id"], s["lat"], s["lng"], s["lat"] + 0.01, s["lng"]) is not None
+
+    hour = store_tables._hour_of_week()
+    monkeypatch.setattr(store_tables, "_hour_of_week", lambda ts=None: (hour + 1) % 168)
+    assert not tables.loaded
+    assert tables.lookup(s["id"], s["lat"], s["lng"], s["lat"] + 0.01, s["lng"]) is None
+    assert store_tables.tables_stale(str(tmp_path), max_age_s=3600)
+
+
+def test_road_engine_tables_survive_bucket_change(tmp_path, monkeypatch):
+    from packages.router import store_tables
+
+    write_store_tables(STORES[:1], directory=str(tmp_path), radius_m=5000, cell_m=250,
+                       matrix_fn=lambda src, dst: [[7] * len(dst)], engine="OSRM")
+    tables = StoreTravelTimes(str(tmp_path), check_s=0)
+    hour = store_tables._hour_of_week()
+    monkeypatch.setattr(store_tables, "_hour_of_week", lambda ts=None: (hour + 1) % 168)
+    assert tables.lookup("s1", 32.78, -96.80, 32.781, -96.80) == 7
+    assert not store_tables.tables_stale(str(tmp_path), max_age_s=3600)
+    assert store_tables.tables_stale(str(tmp_path), max_age_s=0)
+    assert store_tables.tables_stale(str(tmp_path / "missing"), max_age_s=3600)